@@ -0,0 +1,148 @@
+import collections
+import json
+import math
+import re
+import time
+import urllib.parse
+from typing import *
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Takes a token if there is one and returns 0, otherwise returns seconds until there is one."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full_at(self) -> float:
+        return self.updated + (self.burst - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Token bucket rate limits for incoming API requests, one bucket per API key + server + route.
+
+    Requested paths are mapped to the template of the route they hit, like `/media/{name}`, with
+    everything else sharing `unmatched`, so the number of buckets and labels stays bounded.
+    `budgets` maps route templates to `(rate, burst)`, requests per second and how many can arrive
+    at once, other routes get `default`. Everything is kept in memory so admitting a request never
+    touches the config. Rejected requests are tallied per server and route until `take_dropped()`.
+    """
+
+    UNMATCHED = "unmatched"
+
+    DEFAULT_BUDGET = (20, 100)
+    PRUNE_EVERY = 10000
+
+    def __init__(self, budgets: Optional[Dict[str, Tuple[float, float]]] = None, default=DEFAULT_BUDGET):
+        self.budgets = dict(budgets or {})
+        self.default = tuple(default)
+        self.buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self.dropped = collections.Counter()
+        self.checks_since_prune = 0
+        self.routes: List[Tuple[re.Pattern, str]] = []
+
+    def set_routes(self, routes: Iterable[Any]):
+        """Takes the routes to match paths against, anything with a `path_regex` and `path` like Starlette's."""
+        self.routes = [(route.path_regex, route.path) for route in routes]
+
+    def route(self, path: str) -> str:
+        for path_regex, template in self.routes:
+            if path_regex.match(path):
+                return template
+        return self.UNMATCHED
+
+    def set_budgets(self, budgets: Dict[str, Tuple[float, float]], default=None):
+        self.budgets = dict(budgets)
+        if default is not None:
+            self.default = tuple(default)
+        # buckets pick up new budgets when they are created again
+        self.buckets.clear()
+
+    def admit(self, identity: str, server: str, route: str, now: Optional[float] = None) -> float:
+        """Returns 0 if the request may go through, otherwise seconds until it could."""
+        now = time.monotonic() if now is None else now
+        key = (identity, server, route)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.budgets.get(route, self.default)
+            bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+        retry_after = bucket.take(now)
+        if retry_after:
+            self.dropped[(server, route)] += 1
+        self.checks_since_prune += 1
+        if self.checks_since_prune >= self.PRUNE_EVERY:
+            self.prune(now)
+        return retry_after
+
+    def prune(self, now: float):
+        """Forgets buckets that have refilled, they are the same as new ones."""
+        self.checks_since_prune = 0
+        for key in [key for key, bucket in self.buckets.items() if bucket.full_at() <= now]:
+            del self.buckets[key]
+
+    def take_dropped(self) -> Dict[Tuple[str, str], int]:
+        dropped = dict(self.dropped)
+        self.dropped.clear()
+        return dropped
+
+
+class AdmissionMiddleware:
+    """ASGI middleware answering requests over their budget with 429 and a Retry-After header.
+
+    Requests carrying a known `api_key` are identified by it and their `server_name`/`server`
+    query parameters, anything else by the client address alone, so made up keys or server names
+    don't get fresh buckets. No request body has to be read to decide.
+    """
+
+    def __init__(self, app, controller: AdmissionController, tokens, metrics=None):
+        self.app = app
+        self.controller = controller
+        self.tokens = tokens
+        self.rejected = None
+        if metrics is not None:
+            self.rejected = metrics.counter(
+                "generalapi_requests_rejected_total", "HTTP requests rejected by rate limits.", ("route",)
+            )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        api_key = query.get("api_key", [None])[0]
+        if self.tokens.known(api_key):
+            identity = api_key
+            server = query.get("server_name", query.get("server", [""]))[0]
+        else:
+            client = scope.get("client")
+            identity = client[0] if client else "unknown"
+            server = ""
+        route = self.controller.route(scope["path"])
+        retry_after = self.controller.admit(identity, server, route)
+        if not retry_after:
+            return await self.app(scope, receive, send)
+        if self.rejected is not None:
+            self.rejected.inc(route=route)
+        body = json.dumps({"status": "error", "errormsg": "Too many requests.", "error": 429}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(math.ceil(retry_after)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
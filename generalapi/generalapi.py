@@ -10,39 +10,85 @@ from redbot.core.bot import Red
 from typing import *
 import re
 import time
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, APIRouter, Request, Depends, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from uvicorn import Server, Config
 from redbot.core.data_manager import cog_data_path, bundled_data_path
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+from .tokens import TokenCache
+from .metrics import MetricsRegistry, MetricsMiddleware
+from .mediastore import MediaStore
+from .admission import AdmissionController, AdmissionMiddleware
+from redbot.core.utils.chat_formatting import pagify
+
+
+class CogApi:
+    """Stands in for the app in a cog's `register_to_general_api`.
+
+    Routes are added to a router of the cog's own, exception handlers are collected, so
+    GeneralApi knows exactly what to take out of the app again when the cog goes away.
+    """
+
+    def __init__(self):
+        self.router = APIRouter()
+        self.exception_handlers = {}
+
+    def exception_handler(self, exc_class):
+        def decorator(func):
+            self.exception_handlers[exc_class] = func
+            return func
+
+        return decorator
+
+    def __getattr__(self, name):
+        return getattr(self.router, name)
 
 
 class GeneralApi(commands.Cog):
+    DEFAULT_MEDIA_QUOTA = 2 * 1024 ** 3
+    DROPPED_REPORT_INTERVAL = 60
+
     def __init__(self, bot: Red):
         self.bot = bot
         self.server = None
+        self.tokens = TokenCache(bot)
+        self.cog_routes = {}
+        self.cog_routers = {}
+        self.cog_exception_handlers = {}
+        self.metrics = MetricsRegistry()
+        self.admission = AdmissionController()
+        self.dropped_report_task = None
         self.config = redbot.core.Config.get_conf(self, identifier=563126567942)
         self.config.register_global(
             port=None,
             host="0.0.0.0",
+            media_quota=self.DEFAULT_MEDIA_QUOTA,
+            rate_limits={},
+            default_rate_limit=list(AdmissionController.DEFAULT_BUDGET),
+            rate_limit_channel=None,
         )
 
         self.app = FastAPI()
 
+        # added innermost first, CORS has to wrap Admission so its 429s are readable by browsers
+        self.app.add_middleware(AdmissionMiddleware, controller=self.admission, tokens=self.tokens, metrics=self.metrics)
         self.app.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["Retry-After"],
         )
+        self.app.add_middleware(MetricsMiddleware, metrics=self.metrics)
 
         static_path = cog_data_path(self) / "static"
         static_path.mkdir(parents=True, exist_ok=True)
         self.static_path = static_path
+        self.media = MediaStore(cog_data_path(self) / "media", self.DEFAULT_MEDIA_QUOTA)
 
         self.rebuild_api_paths()
 
@@ -54,12 +100,76 @@ class GeneralApi(commands.Cog):
             return JSONResponse(content=content, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
     def rebuild_api_paths(self):
+        for cog_name in list(self.cog_routes):
+            self.remove_cog_routes(cog_name)
         self.app.router.routes.clear()
-        for cog in self.bot.cogs.values():
-            if hasattr(cog, "register_to_general_api"):
-                cog.register_to_general_api(self.app)
         self.sf = StaticFiles(directory=str(self.static_path))
         self.app.mount("/static", self.sf, name="static")
+        self.app.add_api_route("/media/{name}", self.media_endpoint, methods=["GET", "HEAD"])
+        self.app.add_api_route(
+            "/metrics",
+            self.metrics_endpoint,
+            response_class=PlainTextResponse,
+            dependencies=[Depends(self.tokens.require("generalapi"))],
+        )
+        for cog in self.bot.cogs.values():
+            if hasattr(cog, "register_to_general_api"):
+                self.add_cog_routes(cog)
+        self.api_changed()
+
+    async def media_endpoint(self, name: str, request: Request):
+        return self.media.response(name, request)
+
+    async def metrics_endpoint(self):
+        """Prometheus metrics of the API and of every cog implementing `collect_general_api_metrics`.
+
+        Scrapers authenticate with the `api_key` of the `generalapi` shared API tokens.
+        """
+        for cog in list(self.bot.cogs.values()):
+            if hasattr(cog, "collect_general_api_metrics"):
+                try:
+                    cog.collect_general_api_metrics(self.metrics)
+                except Exception:
+                    logging.exception(f"Collecting metrics of {cog.qualified_name} failed")
+        return self.metrics.render()
+
+    def api_changed(self):
+        # both are built lazily on the next request, the middleware stack holds the exception handlers
+        self.app.middleware_stack = None
+        self.app.openapi_schema = None
+        # included routers may be wrapped depending on the FastAPI version, so cog routes are taken from their own routers
+        self.admission.set_routes(
+            [route for route in self.app.router.routes if hasattr(route, "path_regex")]
+            + [route for router in self.cog_routers.values() for route in router.routes]
+        )
+
+    def add_cog_routes(self, cog: commands.Cog):
+        """Adds the routes of a cog, replacing the ones it registered before."""
+        self.remove_cog_routes(cog.qualified_name)
+        api = CogApi()
+        cog.register_to_general_api(api)
+        route_count = len(self.app.router.routes)
+        self.app.include_router(api.router)
+        self.cog_routes[cog.qualified_name] = self.app.router.routes[route_count:]
+        self.cog_routers[cog.qualified_name] = api.router
+        for exc_class, handler in api.exception_handlers.items():
+            self.app.add_exception_handler(exc_class, handler)
+        self.cog_exception_handlers[cog.qualified_name] = api.exception_handlers
+        self.api_changed()
+
+    def remove_cog_routes(self, cog_name: str):
+        routes = self.cog_routes.pop(cog_name, None)
+        self.cog_routers.pop(cog_name, None)
+        exception_handlers = self.cog_exception_handlers.pop(cog_name, {})
+        if routes is None and not exception_handlers:
+            return
+        if routes:
+            removed = set(map(id, routes))
+            self.app.router.routes[:] = [r for r in self.app.router.routes if id(r) not in removed]
+        for exc_class, handler in exception_handlers.items():
+            if self.app.exception_handlers.get(exc_class) is handler:
+                del self.app.exception_handlers[exc_class]
+        self.api_changed()
 
     @commands.command()
     @checks.is_owner()
@@ -68,6 +178,17 @@ class GeneralApi(commands.Cog):
         await self.config.port.set(port)
         await ctx.send("Host and port set, reload the cog to apply changes.")
 
+    @commands.command()
+    @checks.is_owner()
+    async def set_media_quota(self, ctx: commands.Context, megabytes: int):
+        """Sets how much disk space served media files may take, the least recently played ones are deleted first."""
+        await self.config.media_quota.set(megabytes * 1024 ** 2)
+        self.media.quota = megabytes * 1024 ** 2
+        self.media.evict()
+        await ctx.send(
+            f"Media quota set to {megabytes} MB, {len(self.media.files)} files use {self.media.total_size / 1024 ** 2:.0f} MB."
+        )
+
     async def start_api_server(self):
         tries_left = 5
         success = False
@@ -83,6 +204,11 @@ class GeneralApi(commands.Cog):
             await self.bot.send_to_owners("FastAPI server failed to start")
 
     async def init(self):
+        await self.tokens.load()
+        self.media.quota = await self.config.media_quota()
+        self.media.evict()
+        await self.load_rate_limits()
+        self.dropped_report_task = asyncio.create_task(self.report_dropped_loop())
         host = await self.config.host()
         port = await self.config.port()
         if not port:
@@ -99,13 +225,82 @@ class GeneralApi(commands.Cog):
     def cog_unload(self):
         if self.server:
             self.server.should_exit = True
+        self.media.close()
+        if self.dropped_report_task:
+            self.dropped_report_task.cancel()
+
+    async def load_rate_limits(self):
+        self.admission.set_budgets(
+            {path: tuple(budget) for path, budget in (await self.config.rate_limits()).items()},
+            await self.config.default_rate_limit(),
+        )
+
+    async def report_dropped_loop(self):
+        """Sums up the requests rejected by rate limits into one message per interval."""
+        while True:
+            await asyncio.sleep(self.DROPPED_REPORT_INTERVAL)
+            try:
+                await self.report_dropped()
+            except Exception:
+                logging.exception("Sending the rate limit report failed")
+
+    async def report_dropped(self):
+        dropped = self.admission.take_dropped()
+        channel_id = await self.config.rate_limit_channel()
+        if not dropped or channel_id is None:
+            return
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        lines = [f"Rate limited requests in the last {self.DROPPED_REPORT_INTERVAL} seconds:"]
+        for (server, route), count in sorted(dropped.items(), key=lambda item: -item[1]):
+            lines.append(f"`{route}` from {f'`{server}`' if server else 'unauthenticated callers'}: {count} dropped")
+        for page in pagify("\n".join(lines)):
+            await channel.send(page)
+
+    @commands.command()
+    @checks.is_owner()
+    async def set_rate_limit(self, ctx: commands.Context, path: str, rate: float, burst: int):
+        """Sets how many requests per second (and at once) one API key may send to a route per server.
+
+        The path is the route's template, like `/media/{name}`, or `unmatched` for paths without a route.
+        Use `default` as the path to change the budget of routes without their own.
+        """
+        if rate <= 0 or burst < 1:
+            return await ctx.send("Rate has to be positive and burst at least 1.")
+        if path == "default":
+            await self.config.default_rate_limit.set([rate, burst])
+        else:
+            async with self.config.rate_limits() as rate_limits:
+                rate_limits[path] = [rate, burst]
+        await self.load_rate_limits()
+        await ctx.send(f"`{path}` limited to {rate} requests per second, {burst} at once.")
+
+    @commands.command()
+    @checks.is_owner()
+    async def reset_rate_limit(self, ctx: commands.Context, path: str):
+        """Makes a path use the default rate limit again."""
+        async with self.config.rate_limits() as rate_limits:
+            rate_limits.pop(path, None)
+        await self.load_rate_limits()
+        await ctx.send(f"`{path}` uses the default rate limit.")
+
+    @commands.command()
+    @checks.is_owner()
+    async def set_rate_limit_channel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None):
+        """Sets where summaries of rate limited requests are posted, leave out the channel to stop them."""
+        await self.config.rate_limit_channel.set(channel.id if channel else None)
+        await ctx.send(f"Rate limit reports go to {channel.mention}." if channel else "Rate limit reports turned off.")
+
+    @commands.Cog.listener()
+    async def on_red_api_tokens_update(self, service_name: str, api_tokens: Mapping[str, str]):
+        self.tokens.update(service_name, api_tokens)
 
     @commands.Cog.listener()
     async def on_cog_add(self, cog: commands.Cog) -> None:
         if hasattr(cog, "register_to_general_api"):
-            #cog.register_to_general_api(self.app)
-            self.rebuild_api_paths()
-            self.app.openapi_schema = None
-            # self.server.should_exit = True
-            # self.init_app()
-            #await self.init()
+            self.add_cog_routes(cog)
+
+    @commands.Cog.listener()
+    async def on_cog_remove(self, cog: commands.Cog) -> None:
+        self.remove_cog_routes(cog.qualified_name)
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import pathlib
+import re
+import sqlite3
+import time
+from typing import *
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+
+class MediaFile(NamedTuple):
+    name: str
+    size: int
+    content_type: str
+    title: Optional[str]
+
+    @property
+    def etag(self) -> str:
+        return '"' + self.name.split(".")[0] + '"'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parses a `Range` header into an inclusive `(first, last)` byte range.
+
+    Returns `None` if the whole file should be sent instead, which is allowed for anything
+    we don't understand, multiple ranges included.
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":
+        suffix = int(match.group(2))
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else size - 1
+    if first >= size:
+        raise RangeNotSatisfiable()
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+class MediaStore:
+    """Files served to game clients from `/media`, named by the hash of their content.
+
+    Callers look files up by a key of their own (e.g. a YouTube video id) before producing
+    them again. The store is kept under `quota` bytes by deleting the files that were served
+    least recently. Files are immutable, so they are served with a strong ETag, a long
+    Cache-Control and support for range requests.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    # last served times are only written this often per file, seeking clients send a lot of requests
+    TOUCH_INTERVAL = 60
+    CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    def __init__(self, root: pathlib.Path, quota: int):
+        self.root = root
+        self.incoming = root / "incoming"
+        self.incoming.mkdir(parents=True, exist_ok=True)
+        self.quota = quota
+        self.db = sqlite3.connect(str(root / "media.sqlite3"))
+        with self.db:
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS media (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    content_type TEXT NOT NULL,
+                    title TEXT,
+                    last_served REAL NOT NULL
+                )"""
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS media_keys (key TEXT PRIMARY KEY, name TEXT NOT NULL)"
+            )
+        self.files: Dict[str, MediaFile] = {}
+        self.last_served: Dict[str, float] = {}
+        for name, size, content_type, title, last_served in self.db.execute("SELECT * FROM media"):
+            if (root / name).is_file():
+                self.files[name] = MediaFile(name, size, content_type, title)
+                self.last_served[name] = last_served
+            else:
+                self.forget(name)
+        self.total_size = sum(media.size for media in self.files.values())
+
+    def close(self):
+        self.db.close()
+
+    def get(self, key: str) -> Optional[MediaFile]:
+        row = self.db.execute("SELECT name FROM media_keys WHERE key = ?", (key,)).fetchone()
+        return self.files.get(row[0]) if row else None
+
+    def path_of(self, media: MediaFile) -> pathlib.Path:
+        return self.root / media.name
+
+    @staticmethod
+    def hash_file(path: pathlib.Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()[:32]
+
+    async def add_file(
+        self, path: pathlib.Path, key: Optional[str] = None, title: Optional[str] = None
+    ) -> MediaFile:
+        """Moves a finished file into the store and returns it. Put files being written in `incoming`."""
+        digest = await asyncio.get_running_loop().run_in_executor(None, self.hash_file, path)
+        name = digest + path.suffix.lower()
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        size = path.stat().st_size
+        os.replace(path, self.root / name)
+        previous = self.files.get(name)
+        if previous is not None:
+            self.total_size -= previous.size
+            title = title or previous.title
+        media = self.files[name] = MediaFile(name, size, content_type, title)
+        self.total_size += size
+        now = time.time()
+        self.last_served[name] = now
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?)", (name, size, content_type, title, now)
+            )
+            if key is not None:
+                self.db.execute("INSERT OR REPLACE INTO media_keys VALUES (?, ?)", (key, name))
+        self.evict(keep=name)
+        return media
+
+    def forget(self, name: str):
+        media = self.files.pop(name, None)
+        if media is not None:
+            self.total_size -= media.size
+        self.last_served.pop(name, None)
+        with self.db:
+            self.db.execute("DELETE FROM media WHERE name = ?", (name,))
+            self.db.execute("DELETE FROM media_keys WHERE name = ?", (name,))
+
+    def evict(self, keep: Optional[str] = None):
+        """Deletes the least recently served files until the store fits its quota."""
+        if self.total_size <= self.quota:
+            return
+        for name in sorted(self.last_served, key=self.last_served.get):
+            if self.total_size <= self.quota:
+                break
+            if name == keep:
+                continue
+            (self.root / name).unlink(missing_ok=True)
+            self.forget(name)
+
+    def touch(self, media: MediaFile):
+        now = time.time()
+        if now - self.last_served.get(media.name, 0) < self.TOUCH_INTERVAL:
+            return
+        self.last_served[media.name] = now
+        with self.db:
+            self.db.execute("UPDATE media SET last_served = ? WHERE name = ?", (now, media.name))
+
+    async def read_chunks(self, path: pathlib.Path, first: int, length: int) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        with open(path, "rb") as f:
+            f.seek(first)
+            while length > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(self.CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+    def response(self, name: str, request: Request) -> Response:
+        media = self.files.get(name)
+        if media is None:
+            return Response(status_code=404)
+        self.touch(media)
+        headers = {
+            "ETag": media.etag,
+            "Cache-Control": self.CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and (
+            if_none_match.strip() == "*" or media.etag in (tag.strip() for tag in if_none_match.split(","))
+        ):
+            return Response(status_code=304, headers=headers)
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header is not None and (if_range is None or if_range.strip() == media.etag):
+            try:
+                byte_range = parse_range(range_header, media.size)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{media.size}"
+                return Response(status_code=416, headers=headers)
+        if byte_range is None:
+            status_code, first, length = 200, 0, media.size
+        else:
+            first, last = byte_range
+            status_code, length = 206, last - first + 1
+            headers["Content-Range"] = f"bytes {first}-{last}/{media.size}"
+        headers["Content-Length"] = str(length)
+        if request.method == "HEAD":
+            return Response(status_code=status_code, headers=headers, media_type=media.content_type)
+        return StreamingResponse(
+            self.read_chunks(self.path_of(media), first, length),
+            status_code=status_code,
+            headers=headers,
+            media_type=media.content_type,
+        )
@@ -0,0 +1,57 @@
+import asyncio
+import secrets
+from typing import *
+from fastapi import HTTPException
+
+
+class TokenCache:
+    """In-memory copy of Red's shared API tokens for authenticating incoming API requests.
+
+    Loaded once with `load()` and kept current from Red's `on_red_api_tokens_update` event,
+    so checking a key is a dict lookup instead of a trip through the config driver.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.tokens: Dict[str, Dict[str, str]] = {}
+        self.known_tokens: Set[str] = set()
+        self.ready = asyncio.Event()
+
+    async def load(self):
+        self.tokens = {
+            service: dict(tokens)
+            for service, tokens in (await self.bot.get_shared_api_tokens()).items()
+        }
+        self.update_known()
+        self.ready.set()
+
+    def update(self, service: str, tokens: Mapping[str, str]):
+        self.tokens[service] = dict(tokens)
+        self.update_known()
+
+    def update_known(self):
+        self.known_tokens = {token for tokens in self.tokens.values() for token in tokens.values() if token}
+
+    def known(self, provided: Optional[str]) -> bool:
+        """Whether `provided` is any of the tokens, for telling callers apart rather than authenticating them."""
+        return provided is not None and provided in self.known_tokens
+
+    async def get(self, service: str, token_name: str) -> Optional[str]:
+        await self.ready.wait()
+        return self.tokens.get(service, {}).get(token_name)
+
+    async def check(self, service: str, provided: Optional[str], token_name: str = "api_key") -> bool:
+        """Whether `provided` matches the token, compared in constant time. Never matches an unset token."""
+        expected = await self.get(service, token_name)
+        if not expected or provided is None:
+            return False
+        return secrets.compare_digest(provided.encode(), expected.encode())
+
+    def require(self, service: str, token_name: str = "api_key"):
+        """FastAPI dependency rejecting requests whose `api_key` query parameter doesn't match the token."""
+
+        async def dependency(api_key: str):
+            if not await self.check(service, api_key, token_name):
+                raise HTTPException(status_code=403, detail="Invalid API key.")
+
+        return dependency
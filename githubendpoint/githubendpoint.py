@@ -40,10 +40,7 @@ class GithubEndpoint(commands.Cog):
 
         @app.post("/github/workflow_failed")
         async def workflow_failed(data: WorkflowFailedModel):
-            if (
-                data.api_key
-                != (await self.bot.get_shared_api_tokens("githubendpoint"))["api_key"]
-            ):
+            if not await self.bot.get_cog("GeneralApi").tokens.check("githubendpoint", data.api_key):
                 return
             channels = await self.channels_of_repo(data.repo)
             if not channels:
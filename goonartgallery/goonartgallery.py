@@ -35,7 +35,7 @@ class GoonArtGallery(commands.Cog):
         return goonservers_cog.resolve_server(server_id)
 
     async def server_dep(self, server: str, server_name: str, api_key: str):
-        if api_key != (await self.bot.get_shared_api_tokens("spacebee"))["api_key"]:
+        if not await self.bot.get_cog("GeneralApi").tokens.check("spacebee", api_key):
             raise self.SpacebeeError("Invalid API key.", 403)
         server = self.get_server(server_name) or self.get_server(server)
         if server is None:
@@ -12,7 +12,9 @@ async def setup(bot: Red):
     await bot.add_cog(cog)
     builds = GoonhubBuilds(cog)
     await bot.add_cog(builds)
+    builds.start_board()
     testmerges = GoonhubTestmerges(cog)
     await bot.add_cog(testmerges)
+    testmerges.start_mirror()
     notes = GoonhubNotes(cog)
     await bot.add_cog(notes)
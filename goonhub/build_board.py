@@ -0,0 +1,210 @@
+import asyncio
+import datetime
+import discord
+import logging
+from typing import *
+
+class BuildBoard():
+    """One live message per CI channel showing the state of every server's builds.
+
+    Finished builds come in through the `/wireci/build_finished` hook and are kept in the
+    `build_board` config value, so the board survives restarts. Running and queued builds are
+    picked up by polling `game-builds/status` every `POLL_INTERVAL` seconds. Only the last
+    `HISTORY_SIZE` commits are remembered. Edits are debounced by `DEBOUNCE` seconds so a
+    burst of hooks ends up as one edit per channel. The id of each channel's board message is
+    stored as the value of that channel in the `channels` config.
+    """
+
+    POLL_INTERVAL = 30
+    DEBOUNCE = 3
+    HISTORY_SIZE = 50
+    RECENT_COMMITS = 5
+    FIELD_LIMIT = 1024
+    STATUS_ICONS = {
+        'success': "\N{WHITE HEAVY CHECK MARK}",
+        'failed': "\N{CROSS MARK}",
+        'error': "\N{WARNING SIGN}",
+        'cancelled': "\N{NO ENTRY SIGN}",
+    }
+
+    def __init__(self, config, Goonhub):
+        self.config = config
+        self.Goonhub = Goonhub
+        self.servers: Dict[str, dict] = {}
+        self.commits: List[dict] = []
+        self.building: Dict[str, dict] = {}
+        self.queued: Dict[str, dict] = {}
+        self.loaded = asyncio.Event()
+        self.dirty = False
+        self.update_task = None
+
+    async def load(self):
+        state = await self.config.build_board()
+        self.servers = state.get('servers', {})
+        self.commits = state.get('commits', [])[-self.HISTORY_SIZE:]
+        self.loaded.set()
+
+    async def save(self):
+        await self.config.build_board.set({ 'servers': self.servers, 'commits': self.commits })
+
+    def commit(self, commit: str) -> Optional[dict]:
+        return next((entry for entry in reversed(self.commits) if entry['commit'] == commit), None)
+
+    async def record(self, server, status: str, data = None, quality: Optional[str] = None):
+        """Stores the result of a finished build, `data` being the hook's `BuildFinishedModel`."""
+        await self.loaded.wait()
+        key = str(server.tgs or server.short_name)
+        entry = {
+            'name': server.short_name,
+            'status': status,
+            'finished': datetime.datetime.utcnow().timestamp(),
+        }
+        if data is not None and data.commit:
+            entry |= { 'branch': data.branch, 'commit': data.commit, 'author': data.author }
+            commit = self.commit(data.commit)
+            if commit is None:
+                commit = {
+                    'commit': data.commit,
+                    'author': data.author,
+                    'message': data.message.split("\n")[0],
+                    'quality': quality,
+                    'results': {},
+                }
+                self.commits.append(commit)
+                del self.commits[:-self.HISTORY_SIZE]
+            commit['results'][server.short_name] = status
+        self.servers[key] = entry
+        self.building.pop(key, None)
+        await self.save()
+        self.schedule_update()
+
+    async def poll(self):
+        res = await self.Goonhub.client.get('game-builds/status')
+        res = res.get('data')
+        now = datetime.datetime.utcnow().timestamp()
+        building = {}
+        for item in res['current']:
+            server = item.get('server', {})
+            build = item.get('build', {})
+            building[str(server.get('server_id') or server['name'])] = {
+                'name': server['name'],
+                'author': self.admin_name(item.get('admin', {})),
+                'build': build['id'],
+                'started': round(now - build['duration']),
+            }
+        queued = {}
+        for item in res['queued']:
+            server = item.get('server', {})
+            queued[str(server.get('server_id') or server['name'])] = {
+                'name': server['name'],
+                'author': self.admin_name(item.get('admin', {})),
+            }
+        # start times drift by a second or so between polls, only the builds themselves matter
+        if { key: value['build'] for key, value in building.items() } != { key: value['build'] for key, value in self.building.items() } \
+            or queued != self.queued:
+            self.schedule_update()
+        self.building = building
+        self.queued = queued
+
+    @staticmethod
+    def admin_name(admin: dict) -> str:
+        return admin.get('name') or admin.get('ckey') or "unknown"
+
+    async def run(self):
+        await self.Goonhub.bot.wait_until_red_ready()
+        await self.load()
+        self.schedule_update()
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logging.exception("Polling build status failed")
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def schedule_update(self):
+        self.dirty = True
+        if self.update_task is None or self.update_task.done():
+            self.update_task = asyncio.create_task(self.update_later())
+
+    async def update_later(self):
+        while self.dirty:
+            await asyncio.sleep(self.DEBOUNCE)
+            self.dirty = False
+            try:
+                await self.update_boards()
+            except Exception:
+                logging.exception("Updating build boards failed")
+
+    def cancel(self):
+        if self.update_task:
+            self.update_task.cancel()
+
+    async def update_boards(self):
+        channels = await self.config.channels()
+        if not channels: return
+        embed = await self.render()
+        new_messages = {}
+        for channel_id, message_id in channels.items():
+            channel = self.Goonhub.bot.get_channel(int(channel_id))
+            if channel is None: continue
+            if message_id is not None:
+                try:
+                    await channel.get_partial_message(message_id).edit(embed = embed)
+                    continue
+                except discord.NotFound:
+                    pass
+            message = await channel.send(embed = embed)
+            new_messages[channel_id] = message.id
+        if new_messages:
+            async with self.config.channels() as channels:
+                for channel_id, message_id in new_messages.items():
+                    # the channel might have been removed while we were sending
+                    if channel_id in channels:
+                        channels[channel_id] = message_id
+
+    def join_field(self, lines: List[str]) -> str:
+        if not lines: return '_None_'
+        value = ''
+        for line in lines:
+            if len(value) + len(line) + 1 > self.FIELD_LIMIT: break
+            value += line + "\n"
+        return value
+
+    async def render(self) -> discord.Embed:
+        repo = await self.Goonhub.config.repo()
+        failing = any(server['status'] != 'success' for server in self.servers.values())
+        embed = discord.Embed(
+            title = "Build Board",
+            colour = discord.Colour.from_rgb(150, 60, 45) if failing else discord.Colour.from_rgb(60, 100, 45),
+            url = await self.Goonhub.build_url('admin/builds'),
+        )
+
+        lines = []
+        for build in sorted(self.building.values(), key = lambda build: build['name']):
+            url = await self.Goonhub.build_url(f"admin/builds/{build['build']}")
+            lines.append(f"[{build['name']}]({url}) by {build['author']}, started <t:{build['started']}:R>")
+        embed.add_field(name = "Currently Building", value = self.join_field(lines), inline = False)
+
+        lines = [f"{build['name']} by {build['author']}" for build in sorted(self.queued.values(), key = lambda build: build['name'])]
+        embed.add_field(name = "Queued Builds", value = self.join_field(lines), inline = False)
+
+        lines = []
+        for server in sorted(self.servers.values(), key = lambda server: server['name']):
+            line = f"{self.STATUS_ICONS[server['status']]} **{server['name']}**"
+            if server.get('commit'):
+                line += f" __{server['branch']}__ [`{server['commit'][:7]}`](https://github.com/{repo}/commit/{server['commit']})"
+            line += f" <t:{round(server['finished'])}:R>"
+            lines.append(line)
+        embed.add_field(name = "Last Builds", value = self.join_field(lines), inline = False)
+
+        lines = []
+        for commit in reversed(self.commits[-self.RECENT_COMMITS:]):
+            results = ", ".join(f"{name} {self.STATUS_ICONS[status]}" for name, status in commit['results'].items())
+            line = f"[`{commit['commit'][:7]}`](https://github.com/{repo}/commit/{commit['commit']}) by {commit['author']}: `{commit['message']}`\n  {results}"
+            if commit['quality']:
+                line += f"\n  _Code quality: {commit['quality']}_"
+            lines.append(line)
+        embed.add_field(name = "Recent Commits", value = self.join_field(lines), inline = False)
+
+        embed.timestamp = datetime.datetime.utcnow()
+        return embed
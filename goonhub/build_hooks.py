@@ -23,16 +23,15 @@ class BuildFinishedModel(BaseModel):
     mergeConflicts: Optional[list[dict]]
 
 class BuildHooks():
-    def __init__(self, config, Goonhub, app: FastAPI):
+    def __init__(self, config, Goonhub, app: FastAPI, board):
         self.config = config
         self.Goonhub = Goonhub
         self.app = app
+        self.board = board
         self.rnd = random.Random()
         self.funny_messages = open(
             bundled_data_path(self.Goonhub) / "code_quality.txt"
         ).readlines()
-        self.processed_successful_commits = {}
-        self.processed_failed_commits = set()
         self.build_finished_lock = asyncio.Lock()
 
         @app.post("/wireci/build_finished")
@@ -47,6 +46,7 @@ class BuildHooks():
                 goonservers = self.Goonhub.bot.get_cog("GoonServers")
                 server = goonservers.resolve_server(data.server)
                 if data.message is None:
+                    await self.board.record(server, 'error')
                     error_message = data.error
                     if error_message == True:
                         error_message = "unknown error"
@@ -61,102 +61,67 @@ class BuildHooks():
                 data.message = data.message.strip()
                 data.commit = data.commit.strip()
                 repo = await self.Goonhub.config.repo()
-                message = ""
-                embed = None
-                
+                seen = self.board.commit(data.commit)
+
+                # cancelled and clean builds only show up on the build board, anything else still
+                # gets its own message so people notice
                 if data.cancelled:
-                    commit_message = data.message
-                    if "\n" in commit_message:
-                        commit_message = commit_message.split("\n")[0]
-                    message = f"**CANCELLED** __{data.branch}__ on {server.short_name} \N{cross mark} `{data.commit[:7]}` by {data.author}: `{commit_message}`"
-                    success = False
-                elif clean_success:
-                    commit_message = data.message
-                    if "\n" in commit_message:
-                        commit_message = commit_message.split("\n")[0]
-                    guild = self.Goonhub.bot.get_channel(int(next(iter(channels)))).guild
-                    message_start = f"__{data.branch}__ on "
-                    message_end = f"{server.short_name} \N{white heavy check mark} `{data.commit[:7]}` by {data.author}: `{commit_message}`"
-                    message = message_start + message_end
-                    if data.commit not in self.processed_successful_commits:
-                        message += f"\nCode quality: {await self.funny_message(data.commit, guild)}"
-                    elif all(
-                        msg.channel.last_message_id == msg.id
-                        for msg in self.processed_successful_commits[data.commit]
-                    ):
-                        new_processed_commits = []
-                        for msg in self.processed_successful_commits[data.commit]:
-                            first_part, second_part = msg.content.split(
-                                "\N{WHITE HEAVY CHECK MARK}"
-                            )
-                            message = (
-                                first_part[:-1]
-                                + ", "
-                                + server.short_name
-                                + " \N{WHITE HEAVY CHECK MARK}"
-                                + second_part
-                            )
-                            new_processed_commits.append(await msg.edit(content=message))
-                        self.processed_successful_commits[data.commit] = new_processed_commits
-                        return
-                else:
-                    embed = discord.Embed()
-                    embed.title = f"`{data.branch}` on {server.short_name}: " + (
-                        "succeeded" if success else "failed"
-                    )
-                    embed.colour = (
-                        discord.Colour.from_rgb(60, 100, 45)
-                        if success
-                        else discord.Colour.from_rgb(150, 60, 45)
-                    )
-                    embed.description = f"```\n{data.last_compile}\n```"
-                    if not success:
-                        if data.error == True:
-                            pass
-                        elif "\n" in error_message.strip():
-                            embed.description += f"\nError:\n```{data.error}```"
-                        else:
-                            embed.description += f"\nError: `{data.error.strip()}`"
-                    embed.timestamp = datetime.datetime.utcnow()
-                    embed.set_image(
-                        url=f"https://opengraph.githubassets.com/1/{repo}/commit/{data.commit}"
-                    )
-                    embed.add_field(
-                        name="commit",
-                        value=f"[{data.commit[:7]}](https://github.com/{repo}/commit/{data.commit})",
-                    )
-                    embed.add_field(name="message", value=data.message)
-                    embed.add_field(name="author", value=data.author)
-                    if len(data.mergeConflicts) != 0:
-                        merge_conflict_text = "\n".join(f" - [{c['prId']}](https://github.com/{repo}/pull/{c['prId']}): {c['files']}" for c in data.mergeConflicts)
-                        embed.add_field(name="merge conflicts", value=merge_conflict_text)
-                    embed.set_footer(
-                        text="Code quality: " + await self.funny_message(data.commit)
-                    )
-                    if not success and data.commit not in self.processed_failed_commits:
-                        author_discord_id = None
-                        githubendpoint = self.Goonhub.bot.get_cog("GithubEndpoint")
-                        if githubendpoint:
-                            author_discord_id = await githubendpoint.config.custom(
-                                "contributors", data.author
-                            ).discord_id()
-                        if author_discord_id is not None:
-                            message = self.Goonhub.bot.get_user(author_discord_id).mention
-                            
-                succ_messages = []
-                if success:
-                    self.processed_successful_commits[data.commit] = succ_messages
-                else:
-                    self.processed_failed_commits.add(data.commit)
+                    return await self.board.record(server, 'cancelled', data)
+                if clean_success:
+                    quality = None
+                    if seen is None:
+                        guild = self.Goonhub.bot.get_channel(int(next(iter(channels)))).guild
+                        quality = await self.funny_message(data.commit, guild)
+                    return await self.board.record(server, 'success', data, quality)
+
+                message = ""
+                embed = discord.Embed()
+                embed.title = f"`{data.branch}` on {server.short_name}: " + (
+                    "succeeded" if success else "failed"
+                )
+                embed.colour = (
+                    discord.Colour.from_rgb(60, 100, 45)
+                    if success
+                    else discord.Colour.from_rgb(150, 60, 45)
+                )
+                embed.description = f"```\n{data.last_compile}\n```"
+                if not success:
+                    if data.error == True:
+                        pass
+                    elif "\n" in data.error.strip():
+                        embed.description += f"\nError:\n```{data.error}```"
+                    else:
+                        embed.description += f"\nError: `{data.error.strip()}`"
+                embed.timestamp = datetime.datetime.utcnow()
+                embed.set_image(
+                    url=f"https://opengraph.githubassets.com/1/{repo}/commit/{data.commit}"
+                )
+                embed.add_field(
+                    name="commit",
+                    value=f"[{data.commit[:7]}](https://github.com/{repo}/commit/{data.commit})",
+                )
+                embed.add_field(name="message", value=data.message)
+                embed.add_field(name="author", value=data.author)
+                if len(data.mergeConflicts) != 0:
+                    merge_conflict_text = "\n".join(f" - [{c['prId']}](https://github.com/{repo}/pull/{c['prId']}): {c['files']}" for c in data.mergeConflicts)
+                    embed.add_field(name="merge conflicts", value=merge_conflict_text)
+                quality = await self.funny_message(data.commit)
+                embed.set_footer(text="Code quality: " + quality)
+                already_failed = seen is not None and 'failed' in seen['results'].values()
+                if not success and not already_failed:
+                    author_discord_id = None
+                    githubendpoint = self.Goonhub.bot.get_cog("GithubEndpoint")
+                    if githubendpoint:
+                        author_discord_id = await githubendpoint.config.custom(
+                            "contributors", data.author
+                        ).discord_id()
+                    if author_discord_id is not None:
+                        message = self.Goonhub.bot.get_user(author_discord_id).mention
+                await self.board.record(server, 'success' if success else 'failed', data, quality if seen is None else None)
+
                 for channel_id in channels:
                     channel = self.Goonhub.bot.get_channel(int(channel_id))
-                    msg = None
-                    if embed:
-                        msg = await channel.send(message, embed=embed)
-                    else:
-                        msg = await channel.send(message)
-                    if success:
-                        succ_messages.append(msg)
+                    await channel.send(message, embed=embed)
         
     async def funny_message(self, seed, guild=None):
         self.rnd.seed(seed)
@@ -1,8 +1,9 @@
 from redbot.core import commands, checks, app_commands, Config
+import asyncio
 import discord
 from typing import *
 from .build_hooks import BuildHooks
-from .request import GoonhubRequest
+from .build_board import BuildBoard
 from .utilities import servers_autocomplete_all, servers_autocomplete, success_response
 import logging
 
@@ -10,10 +11,21 @@ class GoonhubBuilds(commands.Cog):
     def __init__(self, Goonhub):
         self.Goonhub = Goonhub
         self.config = Config.get_conf(self, 1482189223517)
-        self.config.register_global(channels={})
-        
+        self.config.register_global(channels={}, build_board={})
+        self.board = BuildBoard(self.config, Goonhub)
+        self.board_task = None
+
+    def start_board(self):
+        if self.board_task is None or self.board_task.done():
+            self.board_task = asyncio.create_task(self.board.run())
+
+    def cog_unload(self):
+        if self.board_task:
+            self.board_task.cancel()
+        self.board.cancel()
+
     def register_to_general_api(self, app):
-        BuildHooks(self.config, self.Goonhub, app)
+        BuildHooks(self.config, self.Goonhub, app, self.board)
 
     @commands.hybrid_group(name="ci")
     @checks.admin()
@@ -26,41 +38,10 @@ class GoonhubBuilds(commands.Cog):
     async def status(self, ctx: commands.Context):
         """Check status of CI builds."""
         await ctx.defer() if ctx.interaction else await ctx.typing()
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
         try:
-            res = await req.get('game-builds/status')
-            res = res.get('data')
-            current_builds = res['current']
-            queued_builds = res['queued']
-            embed = discord.Embed(
-                title = f"Build Status",
-                color = await ctx.embed_colour(),
-                url = await self.Goonhub.build_url('admin/builds')
-            )
-
-            field = []
-            for item in current_builds:
-                admin = item.get('admin', {})
-                server = item.get('server', {})
-                build = item.get('build', {})
-                url = await self.Goonhub.build_url(f"admin/builds/{build['id']}")
-                author = admin['name'] if admin['name'] else admin['ckey']
-                field.append(f"[{server['name']}]({url})")
-                field.append(f"  _Started by {author} {round(build['duration'])} seconds ago_")
-            if not field: field = ['_None_']
-            embed.add_field(name="Currently Building", value="\n".join(field), inline=False)
-
-            field = []
-            for item in queued_builds:
-                admin = item.get('admin', {})
-                server = item.get('server', {})
-                author = admin['name'] if admin['name'] else admin['ckey']
-                field.append(f"{server['name']}")
-                field.append(f"  _Queued by {author}_")
-            if not field: field = ['_None_']
-            embed.add_field(name="Queued Builds", value="\n".join(field), inline=False)
-
-            return await ctx.reply(embed=embed)
+            await self.board.poll()
+            await self.board.loaded.wait()
+            return await ctx.reply(embed=await self.board.render())
         except Exception as e:
             return await ctx.reply(f":warning: {e}")
 
@@ -71,7 +52,7 @@ class GoonhubBuilds(commands.Cog):
     async def build(self, ctx: commands.Context, server: str):
         """Build a server or group of servers."""
         await ctx.defer() if ctx.interaction else await ctx.typing()
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         
         spacebeecentcom = self.Goonhub.bot.get_cog("SpacebeeCentcom")
         author_ckey = await spacebeecentcom.get_ckey(ctx.author)
@@ -103,7 +84,7 @@ class GoonhubBuilds(commands.Cog):
     async def cancel(self, ctx: commands.Context, server: str):
         """Cancel a build or group of builds"""
         await ctx.defer() if ctx.interaction else await ctx.typing()
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         
         spacebeecentcom = self.Goonhub.bot.get_cog("SpacebeeCentcom")
         author_ckey = await spacebeecentcom.get_ckey(ctx.author)
@@ -139,7 +120,7 @@ class GoonhubBuilds(commands.Cog):
         if not servers: return await ctx.reply("Unknown server.")
         
         repo = await self.Goonhub.config.repo()
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         settings = None
         
         try:
@@ -179,11 +160,12 @@ class GoonhubBuilds(commands.Cog):
     @cigroup.command()
     @checks.admin()
     async def addchannel(self, ctx: commands.Context, channel: Optional[discord.TextChannel]):
-        """Subscribe a channel to receive CI build updates."""
+        """Subscribe a channel to receive CI build updates and a live build board."""
         if channel is None:
             channel = ctx.channel
         async with self.config.channels() as channels:
             channels[str(channel.id)] = None
+        self.board.schedule_update()
         await ctx.reply(
             f"Channel {channel.mention} will now receive notifications about builds."
         )
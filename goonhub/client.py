@@ -0,0 +1,167 @@
+import asyncio
+import collections
+import json
+import random
+import time
+import aiohttp
+from redbot.core.bot import Red
+from typing import *
+
+class ResponseStatusError(Exception):
+    pass
+
+class ResponseValidationError(Exception):
+    pass
+
+class CachedResponse(NamedTuple):
+    expires: float
+    etag: Optional[str]
+    body: str
+
+class GoonhubClient():
+    """Long-lived client for the Goonhub API, owned by the Goonhub cog.
+
+    Keeps one connection pool and the API tokens around between requests. Idempotent requests
+    are retried with jittered backoff on connection errors and gateway errors. GET responses
+    of paths in `CACHE_TTLS` are cached for that many seconds and revalidated with their ETag
+    afterwards, any other request to the same resource drops them.
+    """
+
+    MAX_RETRIES = 2
+    RETRY_BACKOFF = 0.5
+    RETRY_STATUSES = { 502, 503, 504 }
+    IDEMPOTENT_METHODS = { 'GET', 'PUT', 'DELETE' }
+    CACHE_TTLS = {
+        'game-build-settings': 60,
+        'game-builds/status': 5,
+        'players/notes': 30,
+    }
+    CACHE_SIZE = 512
+    LATENCY_SAMPLES = 256
+
+    def __init__(self, bot: Red):
+        self.bot = bot
+        self.session = aiohttp.ClientSession(
+            connector = aiohttp.TCPConnector(limit_per_host = 8, keepalive_timeout = 60, ttl_dns_cache = 300),
+            timeout = aiohttp.ClientTimeout(total = 30),
+        )
+        self.tokens = None
+        self.cache: Dict[Tuple[str, str], CachedResponse] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latencies = collections.deque(maxlen = self.LATENCY_SAMPLES)
+
+    async def close(self):
+        await self.session.close()
+
+    async def get_tokens(self) -> Mapping[str, str]:
+        if self.tokens is None:
+            self.tokens = await self.bot.get_shared_api_tokens('goonhub')
+        return self.tokens
+
+    def invalidate_tokens(self):
+        self.tokens = None
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else None
+
+    def latency_percentile(self, percent: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def cache_ttl(self, path: str) -> Optional[float]:
+        for prefix, ttl in self.CACHE_TTLS.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                return ttl
+        return None
+
+    def invalidate_cache(self, path: str):
+        resource = path.split('/')[0]
+        for key in [key for key in self.cache if key[0].split('/')[0] == resource]:
+            del self.cache[key]
+
+    async def headers(self) -> dict:
+        tokens = await self.get_tokens()
+        return {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'Authorization': f"Bearer {tokens['api_key']}"
+        }
+
+    def decode(self, status: int, body: str) -> dict:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        if status >= 500:
+            message = f"Error code {status} occured when querying the API"
+            if isinstance(data, dict) and 'message' in data: message += f": {data['message']}"
+            raise ResponseStatusError(message)
+        if data is None:
+            raise ResponseValidationError("Invalid response from API")
+        return data
+
+    async def send(self, method, url, headers, params, data) -> Tuple[int, Optional[str], str]:
+        attempts = self.MAX_RETRIES + 1 if method in self.IDEMPOTENT_METHODS else 1
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(self.RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            start = time.monotonic()
+            try:
+                async with self.session.request(method, url, headers = headers, params = params, json = data) as res:
+                    body = await res.text()
+                    self.latencies.append(time.monotonic() - start)
+                    if res.status in self.RETRY_STATUSES and attempt + 1 < attempts:
+                        continue
+                    return res.status, res.headers.get('ETag'), body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.latencies.append(time.monotonic() - start)
+                if attempt + 1 >= attempts:
+                    raise
+
+    async def run(self, method, path, params = {}, data = {}) -> dict:
+        tokens = await self.get_tokens()
+        url = f"{tokens['api_url']}/{path}"
+        headers = await self.headers()
+        ttl = self.cache_ttl(path) if method == 'GET' else None
+        if ttl is None:
+            if method != 'GET':
+                self.invalidate_cache(path)
+            status, _, body = await self.send(method, url, headers, params, data)
+            return self.decode(status, body)
+
+        key = (path, json.dumps(params, sort_keys = True))
+        cached = self.cache.get(key)
+        if cached is not None and cached.expires > time.monotonic():
+            self.cache_hits += 1
+            return self.decode(200, cached.body)
+        self.cache_misses += 1
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        status, etag, body = await self.send(method, url, headers, params, data)
+        if status == 304 and cached is not None:
+            self.cache[key] = cached._replace(expires = time.monotonic() + ttl)
+            return self.decode(200, cached.body)
+        result = self.decode(status, body)
+        if status == 200:
+            self.cache.pop(key, None)
+            self.cache[key] = CachedResponse(time.monotonic() + ttl, etag, body)
+            if len(self.cache) > self.CACHE_SIZE:
+                del self.cache[next(iter(self.cache))]
+        return result
+
+    async def get(self, path, params = {}) -> dict:
+        return await self.run('GET', path, params = params)
+
+    async def post(self, path, params = {}, data = {}) -> dict:
+        return await self.run('POST', path, params = params, data = data)
+
+    async def put(self, path, params = {}, data = {}) -> dict:
+        return await self.run('PUT', path, params = params, data = data)
+
+    async def delete(self, path, params = {}) -> dict:
+        return await self.run('DELETE', path, params = params)
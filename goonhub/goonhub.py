@@ -1,28 +1,43 @@
 import asyncio
-import aiohttp
 from redbot.core import commands, app_commands, checks, Config
 from redbot.core.bot import Red
-from .request import GoonhubRequest
+from .client import GoonhubClient
 from .utilities import servers_autocomplete, success_response
 import logging
 
 class Goonhub(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.client = GoonhubClient(bot)
         self.config = Config.get_conf(self, 1482189223515)
         self.config.register_global(repo=None)
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        asyncio.create_task(self.client.close())
 
     async def build_url(self, path):
-        tokens = await self.bot.get_shared_api_tokens('goonhub')
+        tokens = await self.client.get_tokens()
         return f"{tokens['url']}/{path}"
     
+    @commands.Cog.listener()
+    async def on_red_api_tokens_update(self, service_name, api_tokens):
+        if service_name == 'goonhub':
+            self.client.invalidate_tokens()
+
+    def collect_general_api_metrics(self, metrics):
+        lookups = metrics.counter('goonhub_cache_lookups_total', 'Goonhub API response cache lookups by result.', ('result',))
+        lookups.set(self.client.cache_hits, result = 'hit')
+        lookups.set(self.client.cache_misses, result = 'miss')
+        latency = metrics.gauge('goonhub_latency_seconds', 'Recent Goonhub API latency percentiles.', ('quantile',))
+        latency.clear()
+        for quantile in (50, 95):
+            value = self.client.latency_percentile(quantile)
+            if value is not None:
+                latency.set(value, quantile = quantile / 100)
+
     async def check_incoming_key(self, key):
-        tokens = await self.bot.get_shared_api_tokens('goonhub')
-        return key == tokens['incoming_api_key']
+        tokens = self.bot.get_cog("GeneralApi").tokens
+        return await tokens.check('goonhub', key, 'incoming_api_key')
     
     @commands.hybrid_group(name="goonhub", aliases=["hub"])
     @checks.admin()
@@ -45,7 +60,7 @@ class Goonhub(commands.Cog):
     async def restart(self, ctx: commands.Context, server: str):
         """Restart a game server."""
         await ctx.defer() if ctx.interaction else await ctx.typing()
-        req = await GoonhubRequest(self.bot, self.session)
+        req = self.client
         
         goonservers = self.bot.get_cog("GoonServers")
         server = goonservers.resolve_server(server)
@@ -56,3 +71,15 @@ class Goonhub(commands.Cog):
         except Exception as e:
             return await ctx.reply(f":warning: {e}")
         await success_response(ctx)
+
+    @ghgroup.command(name="apistats")
+    @checks.admin()
+    async def apistats(self, ctx: commands.Context):
+        """Show Goonhub API cache hit ratio and latency."""
+        client = self.client
+        ratio = client.cache_hit_ratio
+        lines = [f"Cache: {client.cache_hits} hits, {client.cache_misses} misses" + (f" ({ratio:.0%} hit ratio)" if ratio is not None else "")]
+        p50, p95 = client.latency_percentile(50), client.latency_percentile(95)
+        if p50 is not None:
+            lines.append(f"Latency: p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms over the last {len(client.latencies)} requests")
+        await ctx.reply("\n".join(lines))
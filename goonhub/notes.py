@@ -2,7 +2,6 @@ from redbot.core import commands, checks, app_commands, Config
 from typing import *
 from .utilities import ckeyify, success_response
 from .paginator import PaginatorView
-from .request import GoonhubRequest
 import logging
 
 class GoonhubNotes(commands.Cog):
@@ -92,7 +91,7 @@ class GoonhubNotes(commands.Cog):
     async def add(self, ctx: commands.Context, ckey: str, note: str):
         """Add a note to a player"""
         await ctx.defer() if ctx.interaction else await ctx.typing()
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         
         spacebeecentcom = self.Goonhub.bot.get_cog("SpacebeeCentcom")
         author_ckey = await spacebeecentcom.get_ckey(ctx.author)
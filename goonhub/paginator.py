@@ -1,7 +1,6 @@
 import discord
 import datetime
 from redbot.core.utils.chat_formatting import pagify
-from .request import GoonhubRequest
 from .utilities import timestampify
 import logging
 
@@ -143,6 +142,6 @@ class PaginatorView(discord.ui.View):
                 self.fields.append((field_size, _field_name, field_value))
         
     async def fetch_page(self, page) -> dict:
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         params = self.params | { 'page': page }
         return await req.get(self.path, params = params)
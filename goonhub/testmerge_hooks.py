@@ -9,24 +9,28 @@ class TestmergeChangeModel(BaseModel):
     commit: Optional[str] = ''
 
 class TestmergeHooks():
-    def __init__(self, config, Goonhub, app: FastAPI):
+    def __init__(self, config, Goonhub, app: FastAPI, mirror):
         self.config = config
         self.Goonhub = Goonhub
         self.app = app
+        self.mirror = mirror
 
         @app.post("/testmerges/added")
         async def added(data: TestmergeChangeModel):
             if await self.Goonhub.check_incoming_key(data.api_key) == False: return
+            self.mirror.schedule_refresh(data.pr)
             await self.announce(data, "\N{White Heavy Check Mark} **New** testmerge\n")
             
         @app.post("/testmerges/updated")
         async def updated(data: TestmergeChangeModel):
             if await self.Goonhub.check_incoming_key(data.api_key) == False: return
+            self.mirror.schedule_refresh(data.pr)
             await self.announce(data, "\N{CLOCKWISE RIGHTWARDS AND LEFTWARDS OPEN CIRCLE ARROWS} **Updated** testmerge\n")
             
         @app.post("/testmerges/removed")
         async def removed(data: TestmergeChangeModel):
             if await self.Goonhub.check_incoming_key(data.api_key) == False: return
+            self.mirror.schedule_refresh(data.pr)
             await self.announce(data, "\N{CROSS MARK} **Cancelled** testmerge\n")
                     
     async def announce(self, data: TestmergeChangeModel, msg: str):
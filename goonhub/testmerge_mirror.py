@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import logging
+from typing import *
+
+class TestmergeMirror():
+    """Local copy of the active testmerges on Goonhub.
+
+    Seeded with every page of `game-build-test-merges` and reseeded every `RECONCILE_INTERVAL`
+    seconds in case a webhook got lost. In between, the testmerges of a single PR are refetched
+    whenever a testmerge webhook or command touches that PR. Timestamps are parsed once here.
+    """
+
+    PER_PAGE = 100
+    RECONCILE_INTERVAL = 10 * 60
+    TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+    def __init__(self, client):
+        self.client = client
+        self.testmerges: Dict[int, dict] = {}
+        self.ready = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.refresh_tasks = set()
+
+    @classmethod
+    def parse(cls, testmerge: dict) -> dict:
+        for key in ('created_at', 'updated_at'):
+            if testmerge[key]:
+                testmerge[key] = datetime.datetime.strptime(testmerge[key], cls.TIMESTAMP_FORMAT)
+        return testmerge
+
+    async def fetch_all(self, params = {}) -> List[dict]:
+        testmerges = []
+        page = 1
+        while True:
+            res = await self.client.get('game-build-test-merges', params = params | { 'per_page': self.PER_PAGE, 'page': page })
+            testmerges += [self.parse(testmerge) for testmerge in res.get('data')]
+            last_page = res.get('meta', {}).get('last_page', page)
+            if page >= last_page:
+                return testmerges
+            page += 1
+
+    async def reseed(self):
+        async with self.lock:
+            testmerges = await self.fetch_all()
+            self.testmerges = { testmerge['id']: testmerge for testmerge in testmerges }
+            self.ready.set()
+
+    async def refresh_pr(self, pr: int):
+        async with self.lock:
+            testmerges = await self.fetch_all({ 'filters[pr]': pr })
+            for testmerge_id in [testmerge_id for testmerge_id, testmerge in self.testmerges.items() if testmerge['pr_id'] == pr]:
+                del self.testmerges[testmerge_id]
+            for testmerge in testmerges:
+                self.testmerges[testmerge['id']] = testmerge
+
+    def schedule_refresh(self, pr: int):
+        """Refreshes a PR in the background, so webhooks and commands don't wait for it."""
+        async def refresh():
+            try:
+                await self.refresh_pr(pr)
+            except Exception:
+                logging.exception(f"Refreshing testmerges of PR {pr} failed")
+        task = asyncio.create_task(refresh())
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    async def run(self):
+        while True:
+            try:
+                await self.reseed()
+            except Exception:
+                logging.exception("Reseeding testmerges failed")
+            await asyncio.sleep(self.RECONCILE_INTERVAL)
+
+    def rows(self, server_id: Optional[str] = None) -> List[dict]:
+        """Copies of the testmerges sorted by id, optionally only the ones applying to one server.
+
+        Testmerges without a server apply to all of them, so they are always included.
+        """
+        return [
+            dict(testmerge)
+            for _, testmerge in sorted(self.testmerges.items())
+            if server_id is None or testmerge['server_id'] is None or testmerge['server_id'] == server_id
+        ]
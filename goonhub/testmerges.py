@@ -1,11 +1,12 @@
 from redbot.core import commands, checks, app_commands, Config
 from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 import discord
+import asyncio
 import datetime
 from typing import *
-from .request import GoonhubRequest
 from .utilities import servers_autocomplete_all, servers_autocomplete
 from .testmerge_hooks import TestmergeHooks
+from .testmerge_mirror import TestmergeMirror
 import logging
 
 class GoonhubTestmerges(commands.Cog):
@@ -13,9 +14,19 @@ class GoonhubTestmerges(commands.Cog):
         self.Goonhub = Goonhub
         self.config = Config.get_conf(self, 1482189223516)
         self.config.register_global(testmerge_channels={})
-        
+        self.mirror = TestmergeMirror(Goonhub.client)
+        self.mirror_task = None
+
+    def start_mirror(self):
+        if self.mirror_task is None or self.mirror_task.done():
+            self.mirror_task = asyncio.create_task(self.mirror.run())
+
+    def cog_unload(self):
+        if self.mirror_task:
+            self.mirror_task.cancel()
+
     def register_to_general_api(self, app):
-        TestmergeHooks(self.config, self.Goonhub, app)
+        TestmergeHooks(self.config, self.Goonhub, app, self.mirror)
 
     @commands.hybrid_group(name="tm", aliases=["testmerge"])
     @checks.admin()
@@ -41,23 +52,21 @@ class GoonhubTestmerges(commands.Cog):
             if not server: return await ctx.reply("Unknown server.")
             server_id = server.tgs
 
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
-        res = None
-        try:
-            params = { 'per_page': 100 }
-            if server_id is not None:
-                params['filters[server]'] = server_id
-            res = await req.get('game-build-test-merges', params = params)
-            res = res.get('data')
-        except Exception as e:
-            return await ctx.reply(f":warning: {e}")
-        
+        if not self.mirror.ready.is_set():
+            try:
+                await self.mirror.reseed()
+            except Exception as e:
+                return await ctx.reply(f":warning: {e}")
+        res = self.mirror.rows(server_id)
+        ckeys = set()
+        for testmerge in res:
+            for key in ('added_by', 'updated_by'):
+                if testmerge[key]:
+                    ckeys.add(testmerge[key]['ckey'])
+        discord_ids = await spacebeecentcom.bulk_ckeys_to_discord(ckeys)
+
         data = []
         for testmerge in res:
-            if testmerge['created_at']:
-                testmerge['created_at'] = datetime.datetime.strptime(testmerge['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
-            if testmerge['updated_at']:
-                testmerge['updated_at'] = datetime.datetime.strptime(testmerge['updated_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
             def similar(a, b):
                 if isinstance(a, datetime.date) and isinstance(b, datetime.date):
                     return abs((a - b).total_seconds()) <= 60 * 30
@@ -91,7 +100,7 @@ class GoonhubTestmerges(commands.Cog):
             else:
                 text_to_add += " on all servers"
             if testmerge['added_by']:
-                text_to_add += f" by <@{await spacebeecentcom.ckey_to_discord(testmerge['added_by']['ckey'])}>"
+                text_to_add += f" by <@{discord_ids.get(testmerge['added_by']['ckey'])}>"
             if testmerge['created_at']:
                 text_to_add += f" on <t:{int(testmerge['created_at'].timestamp())}:f>"
             if testmerge['commit']:
@@ -101,7 +110,7 @@ class GoonhubTestmerges(commands.Cog):
                 text_to_add += "\N{No-Break Space}" * 5
                 text_to_add += "updated"
                 if testmerge['updated_by']:
-                    text_to_add += f" by <@{await spacebeecentcom.ckey_to_discord(testmerge['updated_by']['ckey'])}>"
+                    text_to_add += f" by <@{discord_ids.get(testmerge['updated_by']['ckey'])}>"
                 if testmerge['updated_at']:
                     text_to_add += f" on <t:{int(testmerge['updated_at'].timestamp())}:f>"
                 text_to_add += "\n"
@@ -157,7 +166,7 @@ class GoonhubTestmerges(commands.Cog):
         if commit and len(commit) != 40:
             return await ctx.reply(f":warning: That is not a full commit hash")
         
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         try:
             data = {
                 'game_admin_ckey': author_ckey,
@@ -168,6 +177,7 @@ class GoonhubTestmerges(commands.Cog):
             await req.post('game-build-test-merges', data = data)
         except Exception as e:
             return await ctx.reply(f":warning: {e}")
+        self.mirror.schedule_refresh(pr)
                     
         if ctx.interaction:
             await ctx.reply(f"\N{WHITE HEAVY CHECK MARK} Success - note that this does not retrigger a build")
@@ -200,7 +210,7 @@ class GoonhubTestmerges(commands.Cog):
         if commit and len(commit) != 40:
             return await ctx.reply(f":warning: That is not a full commit hash")
         
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
         
         existingTestMerges = []
         try:
@@ -240,6 +250,7 @@ class GoonhubTestmerges(commands.Cog):
             except Exception as e:
                 errors.append(f"[{testMerge['server_id']}] {e}")
                 continue
+        self.mirror.schedule_refresh(pr)
                         
         if ctx.interaction:
             await ctx.reply(f"\N{WHITE HEAVY CHECK MARK} Success - note that this does not retrigger a build")
@@ -268,7 +279,7 @@ class GoonhubTestmerges(commands.Cog):
             servers = goonservers.resolve_server_or_category(server)
             if not servers: return await ctx.reply("Unknown server.")
             
-        req = await GoonhubRequest(self.Goonhub.bot, self.Goonhub.session)
+        req = self.Goonhub.client
             
         existingTestMerges = []
         try:
@@ -306,6 +317,7 @@ class GoonhubTestmerges(commands.Cog):
             except Exception as e:
                 errors.append(f"[{testMerge['server_id']}] {e}")
                 continue
+        self.mirror.schedule_refresh(pr)
 
         if ctx.interaction:
             await ctx.reply(f"\N{WHITE HEAVY CHECK MARK} Success - note that this does not retrigger a build")
@@ -51,26 +51,11 @@ def get_server_choices(current: str = '', with_all: bool = False):
         import goonhub.settings as settings
         goonservers = settings.Bot.get_cog("GoonServers")
     
-    choices = []            
-    current = current.lower()
-    if with_all:
-        for category in goonservers.categories.keys():
-            add_choice = False
-            if not current or current and current in category.lower():
-                add_choice = True
-            if add_choice:
-                choices.append({ 'label': category.capitalize(), 'value': category })
-    
-    for server in goonservers.servers:
-        add_choice = False
-        if current:
-            for alias in server.aliases:
-                if current in alias.lower():
-                    add_choice = True
-                    break
+    choices = []
+    for label, server in goonservers.alias_index.complete(current, with_all):
+        if server is None:
+            choices.append({ 'label': label.capitalize(), 'value': label })
         else:
-            add_choice = True
-        if add_choice:
             choices.append({ 'label': server.short_name, 'value': server.tgs })
 
     return choices
@@ -6,3 +6,4 @@ async def setup(bot: Red):
     cog = GoonServers(bot)
     await bot.add_cog(cog)
     await cog.reload_config()
+    cog.start_polling()
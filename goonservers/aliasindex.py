@@ -0,0 +1,137 @@
+import bisect
+import collections
+from types import MappingProxyType
+from typing import *
+
+
+class AliasIndex:
+    """Immutable lookup tables from names to servers and categories, built once per config reload.
+
+    Names resolve by exact (case insensitive) alias first and then by alias with everything but
+    letters and digits stripped, so "goon 2", "Goon2" and "goon-2" all find the same server.
+    Autocompletion ranks exact matches over prefix matches over substring matches, substrings
+    are looked up through a trigram index instead of scanning every alias.
+
+    Category members that aren't configured servers are passed to `fallback`, which can make an
+    ad-hoc server out of them. Members neither resolves are skipped and listed in `unknown_members`.
+    """
+
+    NGRAM = 3
+    MAX_COMPLETIONS = 25
+
+    def __init__(
+        self,
+        servers,
+        categories: Mapping[str, Iterable[str]],
+        fallback: Optional[Callable[[str], Any]] = None,
+    ):
+        exact = {}
+        for server in servers:
+            for alias in server.aliases:
+                if alias in exact and exact[alias] is not server:
+                    raise ValueError(f"Alias collision on '{alias}'.")
+                exact[alias] = server
+        normalized = {}
+        ambiguous = set()
+        for alias, server in exact.items():
+            key = self.normalize(alias)
+            if not key:
+                continue
+            if key in normalized and normalized[key] is not server:
+                ambiguous.add(key)
+            normalized[key] = server
+        for key in ambiguous:
+            del normalized[key]
+        self.exact = MappingProxyType(exact)
+        self.normalized = MappingProxyType(normalized)
+
+        resolved_categories = {}
+        unknown_members = []
+        for name, members in categories.items():
+            category = []
+            for member in members:
+                server = self.resolve(member)
+                if server is None and fallback is not None:
+                    server = fallback(member)
+                if server is None:
+                    unknown_members.append((name, member))
+                else:
+                    category.append(server)
+            resolved_categories[name.lower()] = tuple(category)
+        self.categories = MappingProxyType(resolved_categories)
+        self.unknown_members = tuple(unknown_members)
+
+        # completion entries: (display name, server or None for categories, search keys)
+        entries = [(name, None, (name.lower(),)) for name in categories]
+        entries += [(server.short_name, server, tuple(server.aliases)) for server in servers]
+        self.entries = tuple(entries)
+        prefixes = []
+        keys_to_entries = collections.defaultdict(set)
+        ngrams = collections.defaultdict(set)
+        for i, (_, _, keys) in enumerate(self.entries):
+            for key in keys:
+                prefixes.append((key, i))
+                keys_to_entries[key].add(i)
+                for start in range(len(key) - self.NGRAM + 1):
+                    ngrams[key[start : start + self.NGRAM]].add(i)
+        self.prefixes = tuple(sorted(prefixes))
+        self.keys_to_entries = MappingProxyType({k: frozenset(v) for k, v in keys_to_entries.items()})
+        self.ngrams = MappingProxyType({k: frozenset(v) for k, v in ngrams.items()})
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return "".join(c for c in name.lower() if c.isalnum())
+
+    def resolve(self, name: str):
+        """Returns the configured server called `name`, `None` if there is none."""
+        name = name.lower()
+        server = self.exact.get(name)
+        if server is None:
+            server = self.normalized.get(self.normalize(name))
+        return server
+
+    def category(self, name: str) -> Optional[Tuple]:
+        return self.categories.get(name.lower())
+
+    def prefix_matches(self, query: str) -> Set[int]:
+        start = bisect.bisect_left(self.prefixes, (query,))
+        matches = set()
+        for key, i in self.prefixes[start:]:
+            if not key.startswith(query):
+                break
+            matches.add(i)
+        return matches
+
+    def substring_matches(self, query: str) -> Set[int]:
+        if len(query) < self.NGRAM:
+            candidates = range(len(self.entries))
+        else:
+            postings = [
+                self.ngrams.get(query[start : start + self.NGRAM], frozenset())
+                for start in range(len(query) - self.NGRAM + 1)
+            ]
+            candidates = frozenset.intersection(*sorted(postings, key=len))
+        return {i for i in candidates if any(query in key for key in self.entries[i][2])}
+
+    def complete(self, query: str, with_categories: bool = False, limit: int = MAX_COMPLETIONS):
+        """Returns up to `limit` `(display name, server)` pairs matching `query`, best matches first.
+
+        Categories come with `None` in place of the server and only if `with_categories` is set.
+        """
+        query = query.lower()
+        if not query:
+            ranked = range(len(self.entries))
+        else:
+            exact = self.keys_to_entries.get(query, frozenset())
+            prefix = self.prefix_matches(query) - exact
+            substring = self.substring_matches(query) - exact - prefix
+            ranked = sorted(exact) + sorted(prefix) + sorted(substring)
+        result = []
+        for i in ranked:
+            name, server, _ = self.entries[i]
+            if server is None and not with_categories:
+                continue
+            result.append((name, server))
+            if len(result) >= limit:
+                break
+        return result
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import discord
+from redbot.core.utils.chat_formatting import pagify
+from typing import *
+
+log = logging.getLogger("red.goon.goonservers")
+
+
+class MessageCoalescer:
+    """Per-channel queue of plain text relay lines, sent as few Discord messages as possible.
+
+    The first queued line of an idle channel starts a `WINDOW` second timer, every line queued
+    for that channel until it runs out is joined into the same message (split at 2000 chars).
+    Lines queued while a channel is being sent to go out in the next window, so order is kept.
+    Only meant for plain lines, anything with embeds, views or replies is sent directly.
+    `close()` stops the timers and sends whatever is still queued right away.
+    """
+
+    WINDOW = 0.5
+
+    def __init__(self, bot, window: float = WINDOW):
+        self.bot = bot
+        self.window = window
+        self.pending: Dict[int, List[str]] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.closed = False
+        self.final_flush = None
+        self.lines_queued = 0
+        self.lines_sent = 0
+        self.messages_sent = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(lines) for lines in self.pending.values())
+
+    @property
+    def coalescing_ratio(self) -> Optional[float]:
+        """Average number of relay lines per sent Discord message."""
+        if not self.messages_sent:
+            return None
+        return self.lines_sent / self.messages_sent
+
+    def queue(self, channel_id: int, line: str):
+        if self.closed:
+            log.warning(f"Dropping a relay line for channel {channel_id} queued after closing")
+            return
+        self.pending.setdefault(channel_id, []).append(line)
+        self.lines_queued += 1
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.create_task(self.drain(channel_id))
+
+    async def drain(self, channel_id: int):
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                lines = self.pending.pop(channel_id, None)
+                if not lines:
+                    break
+                await self.send(channel_id, lines)
+        finally:
+            del self.workers[channel_id]
+
+    async def send(self, channel_id: int, lines: List[str]):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            log.warning(f"Dropping {len(lines)} relay lines for unknown channel {channel_id}")
+            return
+        for page in pagify("\n".join(lines)):
+            try:
+                await channel.send(page)
+            except discord.HTTPException:
+                log.exception(f"Sending relay lines to channel {channel_id} failed")
+            self.messages_sent += 1
+        self.lines_sent += len(lines)
+
+    def close(self):
+        self.closed = True
+        for task in list(self.workers.values()):
+            task.cancel()
+        pending, self.pending = self.pending, {}
+        if pending:
+            self.final_flush = asyncio.create_task(self.send_all(pending))
+
+    async def send_all(self, pending: Dict[int, List[str]]):
+        for channel_id, lines in pending.items():
+            await self.send(channel_id, lines)
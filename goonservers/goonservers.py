@@ -1,7 +1,9 @@
 import asyncio
 import discord
 from redbot.core import commands, Config, checks
-from redbot.core.utils.chat_formatting import pagify
+from redbot.core.utils.chat_formatting import pagify, box
+from redbot.core.data_manager import cog_data_path
+from fastapi import HTTPException
 import discord.errors
 from redbot.core.bot import Red
 from typing import *
@@ -10,21 +12,56 @@ import re
 import datetime
 import random
 from collections import OrderedDict
-import functools
 import json
 import aiohttp
+import logging
+import time
+from types import MappingProxyType
+from .history import StatusHistory
+from .aliasindex import AliasIndex
+from .routing import RoutingTable
+from .coalescer import MessageCoalescer
+
+log = logging.getLogger("red.goon.goonservers")
 
 
 class UnknownServerError(Exception):
     pass
 
 
+class StatusSnapshot(NamedTuple):
+    """Immutable result of the most recent status poll of a single server.
+
+    `params` is the parsed response to the plain `status` topic, `status` is the
+    richest status data available (the JSON variant for servers that need it).
+    Both are read-only mappings, `None` if the poll failed with `error`.
+    """
+
+    params: Optional[Mapping[str, Any]]
+    status: Optional[Mapping[str, Any]]
+    error: Optional[BaseException]
+    timestamp: float
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+def channel_trans(named_channels, channels):
+    if isinstance(channels, int):
+        return channels
+    if isinstance(channels, str):
+        return named_channels[channels]
+    return [channel_trans(named_channels, ch) for ch in channels]
+
+
 class Subtype:
-    def __init__(self, name, data, cog):
+    def __init__(self, name, data, named_channels, coalescer=None):
         self.name = name
+        self.coalescer = coalescer
         self.channels = {}
         for name, channel_ids in data["channels"].items():
-            self.channels[name] = cog.channel_trans(channel_ids)
+            self.channels[name] = channel_trans(named_channels, channel_ids)
         self.servers = []
 
     async def send_to_channel(self, channel, content=None, *args, **kwargs):
@@ -35,8 +72,18 @@ class Subtype:
             await channel.send(content=content, *args, **kwargs)
 
     async def channel_broadcast(
-        self, bot, channel_type, *args, exception=None, **kwargs
+        self, bot, channel_type, *args, exception=None, coalesce=False, **kwargs
     ):
+        """Sends a message to all channels of `channel_type`.
+
+        With `coalesce` a plain text message is queued and may be merged with other lines sent
+        to the same channel shortly after, see `MessageCoalescer`.
+        """
+        if coalesce and self.coalescer and len(args) == 1 and isinstance(args[0], str) and not kwargs:
+            for ch in self.channels[channel_type]:
+                if ch != exception:
+                    self.coalescer.queue(ch, args[0])
+            return
         tasks = [
             self.send_to_channel(bot.get_channel(ch), *args, **kwargs)
             for ch in self.channels[channel_type]
@@ -46,14 +93,16 @@ class Subtype:
 
 
 class Server:
-    def __init__(self, data, cog):
+    def __init__(self, data, subtypes):
         self.host = data["host"]
         self.port = data["port"]
+        # optional IP address to connect to instead of resolving the host every time
+        self.address = data.get("address")
         self.full_name = data.get("full_name") or Server.host_to_full_name(self.host)
         self.type = data["type"]
         self.subtype = data.get("subtype")
         if self.subtype is not None:
-            self.subtype = cog.subtypes[self.subtype]
+            self.subtype = subtypes[self.subtype]
             self.subtype.servers.append(self)
         self.url = data.get("url")
         self.tgs = data.get("tgs")
@@ -71,12 +120,12 @@ class Server:
 
     @property
     def aliases(self):
-        aliases = self.names
+        aliases = list(self.names)
         if self.full_name:
             aliases.append(self.full_name)
         if self.short_name:
             aliases.append(self.short_name)
-        return [a.lower() for a in aliases]
+        return list(dict.fromkeys(a.lower() for a in aliases))
 
     @classmethod
     def host_to_full_name(cls, host):
@@ -106,7 +155,12 @@ class Server:
 
 class GoonServers(commands.Cog):
     INITIAL_CHECK_TIMEOUT = 0.2
+    FAN_OUT_CONCURRENCY = 16
     ALLOW_ADHOC = True
+    POLL_INTERVAL_MIN = 15
+    POLL_INTERVAL_MAX = 60
+    POLL_INTERVAL_BACKOFF = 1.5
+    SNAPSHOT_MAX_AGE = 90
     COLOR_GOON = discord.Colour.from_rgb(222, 190, 49)
     COLOR_OTHER = discord.Colour.from_rgb(130, 130, 222)
     COLOR_ERROR = discord.Colour.from_rgb(220, 150, 150)
@@ -117,67 +171,232 @@ class GoonServers(commands.Cog):
         self.config = Config.get_conf(self, identifier=66217843218752)
         self.config.register_global(servers=[], categories={}, channels={}, subtypes={})
 
-    @functools.lru_cache
-    def channel_to_subtypes(self, channel_id, usage):
-        return tuple(
-            subtype
-            for subtype in self.subtypes.values()
-            if channel_id in subtype.channels[usage]
+        self.status_snapshots = MappingProxyType({})
+        self.poll_intervals = {}
+        self.next_polls = {}
+        self.poll_task = None
+        self.history = StatusHistory(cog_data_path(self) / "history")
+        self.channels = {}
+        self.categories = {}
+        self.subtypes = {}
+        self.servers = []
+        self.alias_index = AliasIndex([], {})
+        self.routing = RoutingTable()
+        self.coalescer = MessageCoalescer(bot)
+
+    def cog_unload(self):
+        if self.poll_task:
+            self.poll_task.cancel()
+        self.coalescer.close()
+        self.history.flush_now()
+
+    def start_polling(self):
+        if self.poll_task is None or self.poll_task.done():
+            self.poll_task = asyncio.create_task(self.poll_loop())
+
+    async def poll_loop(self):
+        while True:
+            try:
+                keys = {(s.host, s.port) for s in self.servers}
+                for key in list(self.next_polls):
+                    if key not in keys:
+                        del self.next_polls[key]
+                        self.poll_intervals.pop(key, None)
+                now = time.monotonic()
+                due = [
+                    s
+                    for s in self.servers
+                    if self.next_polls.get((s.host, s.port), 0) <= now
+                ]
+                if due:
+                    await asyncio.gather(*(self.poll_server(s) for s in due))
+                if self.history.flush_due():
+                    await self.history.flush()
+                next_poll = min(
+                    self.next_polls.values(),
+                    default=time.monotonic() + self.POLL_INTERVAL_MIN,
+                )
+                await asyncio.sleep(max(1, next_poll - time.monotonic()))
+            except asyncio.CancelledError:
+                break
+            except:
+                log.exception("Error in GoonServers status poll loop")
+                await asyncio.sleep(self.POLL_INTERVAL_MIN)
+
+    def status_signature(self, status):
+        if status is None:
+            return None
+        elapsed = self.status_format_elapsed(status)
+        return (
+            status.get("players"),
+            status.get("map_name"),
+            status.get("mode"),
+            elapsed if elapsed in ["preround", "finished"] else None,
+            status.get("shuttle_time"),
         )
 
-    @functools.lru_cache
+    async def poll_server(self, server):
+        key = (server.host, server.port)
+        previous = self.status_snapshots.get(key)
+        worldtopic = self.bot.get_cog("WorldTopic")
+        snapshot = await self.refresh_status(server, priority=worldtopic.PRIORITY_BACKGROUND)
+        self.history.record(
+            StatusHistory.server_key(server.host, server.port),
+            snapshot.status if snapshot.error is None else None,
+        )
+        interval = self.poll_intervals.get(key, self.POLL_INTERVAL_MIN)
+        if snapshot.error is not None:
+            interval = self.POLL_INTERVAL_MAX
+        elif previous is None or self.status_signature(
+            previous.status
+        ) != self.status_signature(snapshot.status):
+            interval = self.POLL_INTERVAL_MIN
+        else:
+            interval = min(interval * self.POLL_INTERVAL_BACKOFF, self.POLL_INTERVAL_MAX)
+        self.poll_intervals[key] = interval
+        self.next_polls[key] = time.monotonic() + interval
+
+    def publish_snapshot(self, server, snapshot):
+        key = (server.host, server.port)
+        if not any((s.host, s.port) == key for s in self.servers):
+            return
+        snapshots = dict(self.status_snapshots)
+        snapshots[key] = snapshot
+        self.status_snapshots = MappingProxyType(snapshots)
+
+    async def fetch_status(self, server, priority=None):
+        """Queries the status topic of a server, returns `(params, status)`."""
+        worldtopic = self.bot.get_cog("WorldTopic")
+        response = await worldtopic.send(
+            (server.host, server.port), "status", priority=priority, address=server.address
+        )
+        if response is None:
+            return None, None
+        # most of the status (the player list mainly) is rarely read, decode it on demand
+        params = worldtopic.params_to_dict(response, lazy=True)
+        status = params
+        if len(response) < 20 or ("players" in params and len(params["players"]) > 5):
+            response = await worldtopic.send(
+                (server.host, server.port),
+                "status&format=json",
+                priority=priority,
+                address=server.address,
+            )
+            status = json.loads(response)
+        return params, status
+
+    async def refresh_status(self, server, priority=None):
+        """Polls a server's status right now and publishes the resulting snapshot."""
+        params, status, error = None, None, None
+        try:
+            params, status = await self.fetch_status(server, priority)
+        except Exception as e:
+            error = e
+        snapshot = StatusSnapshot(
+            MappingProxyType(params) if params is not None else None,
+            MappingProxyType(status) if isinstance(status, dict) else status,
+            error,
+            time.monotonic(),
+        )
+        self.publish_snapshot(server, snapshot)
+        return snapshot
+
+    async def get_status_snapshot(self, server, force_refresh=False):
+        """Returns the latest status snapshot of a server, polling it only if needed."""
+        if isinstance(server, str):
+            server = self.resolve_server(server)
+        if server is None:
+            raise UnknownServerError()
+        snapshot = self.status_snapshots.get((server.host, server.port))
+        if snapshot is not None and not force_refresh:
+            # errors are served like any other result, a dead server shouldn't cost a timeout per check
+            if snapshot.age <= self.SNAPSHOT_MAX_AGE:
+                return snapshot
+            worldtopic = self.bot.get_cog("WorldTopic")
+            if snapshot.error is not None and worldtopic.is_circuit_open((server.host, server.port)):
+                return snapshot
+        return await self.refresh_status(server)
+
+    async def get_status(self, server, force_refresh=False):
+        """Returns the parsed `status` topic response of a server, served from the poller when fresh."""
+        snapshot = await self.get_status_snapshot(server, force_refresh=force_refresh)
+        if snapshot.error is not None:
+            raise snapshot.error
+        return snapshot.params
+
+    def channel_to_subtypes(self, channel_id, usage):
+        return self.routing.subtypes_for(channel_id, usage)
+
     def channel_to_servers(self, channel_id, usage):
-        result = []
-        for subtype in self.channel_to_subtypes(channel_id, usage):
-            result.extend(subtype.servers)
-        return tuple(result)
+        return self.routing.servers_for(channel_id, usage)
+
+    @property
+    def valid_channels(self):
+        return self.routing.valid_channels
 
     def channel_trans(self, channels):
-        if isinstance(channels, int):
-            return channels
-        if isinstance(channels, str):
-            return self.channels[channels]
-        return [self.channel_trans(ch) for ch in channels]
+        return channel_trans(self.channels, channels)
 
     async def reload_config(self):
-        self.valid_channels = set()
-        self.channels = await self.config.channels()
-        self.categories = await self.config.categories()
-        self.subtypes = {}
-        for subtype_name, subtype_data in (await self.config.subtypes()).items():
-            self.subtypes[subtype_name] = Subtype(subtype_name, subtype_data, self)
-            for channel_type, channel_ids in self.subtypes[
-                subtype_name
-            ].channels.items():
-                self.valid_channels |= set(channel_ids)
-        self.servers = []
-        for server_data in await self.config.servers():
-            self.servers.append(Server(server_data, self))
-        self.aliases = {}
-        for server in self.servers:
-            for alias in server.aliases:
-                if alias in self.aliases and self.aliases[alias] != server:
-                    raise ValueError(f"Alias collision on '{alias}'.")
-                self.aliases[alias] = server
+        """Rebuilds servers, subtypes and routing from the config.
+
+        Everything is built on the side and swapped in at once, so nothing ever sees a half
+        loaded config and a broken config leaves the previous one in place.
+        """
+        channels = await self.config.channels()
+        categories = await self.config.categories()
+        subtypes_data = await self.config.subtypes()
+        servers_data = await self.config.servers()
+        subtypes = {}
+        for subtype_name, subtype_data in subtypes_data.items():
+            subtypes[subtype_name] = Subtype(subtype_name, subtype_data, channels, self.coalescer)
+        servers = [Server(server_data, subtypes) for server_data in servers_data]
+        alias_index = AliasIndex(
+            servers, categories, self.adhoc_server if self.ALLOW_ADHOC else None
+        )
+        for category, member in alias_index.unknown_members:
+            log.warning(f"Category {category} lists unknown server {member}, skipping it.")
+        routing = RoutingTable(subtypes.values(), self.routing.generation + 1)
+        self.channels = channels
+        self.categories = categories
+        self.subtypes = subtypes
+        self.servers = servers
+        self.alias_index = alias_index
+        self.routing = routing
+
+    @commands.command()
+    @checks.is_owner()
+    async def reloadservers(self, ctx: commands.Context):
+        """Reloads the server, subtype and channel config without reloading the cog."""
+        try:
+            await self.reload_config()
+        except (KeyError, ValueError) as e:
+            return await ctx.send(f"Config not reloaded, it is invalid: {e}")
+        await ctx.send(
+            f"Loaded {len(self.servers)} servers in {len(self.subtypes)} subtypes relaying to "
+            f"{len(self.valid_channels)} channels (generation {self.routing.generation})."
+        )
 
     def resolve_server(self, name):
-        name = name.lower()
-        if name in self.aliases:
-            return self.aliases[name]
+        server = self.alias_index.resolve(name)
+        if server is not None:
+            return server
         if self.ALLOW_ADHOC:
-            return Server.from_hostport(name)
+            return self.adhoc_server(name)
         return None
 
+    @staticmethod
+    def adhoc_server(name):
+        """Makes a server out of a `host:port` name that isn't configured, `None` for anything else."""
+        return Server.from_hostport(name.lower())
+
     def resolve_server_or_category(self, name):
-        name = name.lower()
         single_server = self.resolve_server(name)
         if single_server is not None:
             return [single_server]
-        if name not in self.categories:
-            return []
-        return [self.resolve_server(x) for x in self.categories[name]]
+        return list(self.alias_index.category(name) or [])
 
-    async def send_to_server(self, server, message, to_dict=False):
+    async def send_to_server(self, server, message, to_dict=False, priority=None):
         if isinstance(server, str):
             server = self.resolve_server(server)
         if server is None:
@@ -188,7 +407,9 @@ class GoonServers(commands.Cog):
                 tokens = await self.bot.get_shared_api_tokens("goonservers")
                 message["auth"] = tokens.get("auth_token")
             message = worldtopic.iterable_to_params(message)
-        result = await worldtopic.send((server.host, server.port), message)
+        result = await worldtopic.send(
+            (server.host, server.port), message, priority=priority, address=server.address
+        )
         if to_dict and isinstance(result, str):
             result = worldtopic.params_to_dict(result)
         return result
@@ -196,14 +417,25 @@ class GoonServers(commands.Cog):
     async def send_to_server_safe(
         self, server, message, messageable, to_dict=False, react_success=False
     ):
-        worldtopic = self.bot.get_cog("WorldTopic")
+        return await self.run_safe(
+            self.send_to_server(server, message, to_dict=to_dict),
+            messageable,
+            react_success=react_success,
+        )
+
+    async def get_status_safe(self, server, messageable, force_refresh=False):
+        return await self.run_safe(
+            self.get_status(server, force_refresh=force_refresh), messageable
+        )
+
+    async def run_safe(self, coro, messageable, react_success=False):
         error_fn = None
         if hasattr(messageable, "reply"):
             error_fn = messageable.reply
         elif hasattr(messageable, "send"):
             error_fn = messageable.send
         try:
-            result = await self.send_to_server(server, message, to_dict=to_dict)
+            result = await coro
         except UnknownServerError:
             await error_fn("Unknown server.")
         except ConnectionRefusedError:
@@ -218,6 +450,61 @@ class GoonServers(commands.Cog):
             return result
         return None
 
+    async def fan_out(self, servers, message, deadline=None, concurrency=None, to_dict=False, wakeup=None):
+        """Sends `message` to `servers` concurrently, yielding `(server, result)` as each completes.
+
+        `message` can also be a coroutine function called with each server instead of sending
+        a topic. Failures are yielded in place of the result as the raised exception. At most
+        `concurrency` servers are queried at once and any still pending `deadline` seconds in
+        are cancelled and yielded with an `asyncio.TimeoutError`. Stragglers are also cancelled
+        when the caller stops iterating early. If `wakeup` is set, `(None, None)` is yielded
+        once that many seconds in while servers are still pending.
+        """
+        if isinstance(servers, str):
+            servers = self.resolve_server_or_category(servers)
+        semaphore = asyncio.Semaphore(concurrency or self.FAN_OUT_CONCURRENCY)
+
+        async def run(server):
+            async with semaphore:
+                if callable(message):
+                    return await message(server)
+                return await self.send_to_server(server, message, to_dict=to_dict)
+
+        tasks = {asyncio.ensure_future(run(server)): server for server in servers}
+        pending = set(tasks)
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + deadline if deadline is not None else None
+        wakeup_time = loop.time() + wakeup if wakeup is not None else None
+        try:
+            while pending:
+                timeout = min(
+                    (max(0, t - loop.time()) for t in (end_time, wakeup_time) if t is not None),
+                    default=None,
+                )
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.cancelled():
+                        # e.g. a shared topic cancelled on behalf of someone else
+                        yield tasks[task], asyncio.CancelledError()
+                        continue
+                    error = task.exception()
+                    yield tasks[task], error if error is not None else task.result()
+                if wakeup_time is not None and loop.time() >= wakeup_time:
+                    wakeup_time = None
+                    if pending:
+                        yield None, None
+                if end_time is not None and loop.time() >= end_time:
+                    break
+            for task in pending:
+                task.cancel()
+                yield tasks[task], asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
     async def send_to_servers(self, servers, message, exception=None, to_dict=False):
         if isinstance(servers, str):
             servers = self.resolve_server_or_category(servers)
@@ -236,12 +523,120 @@ class GoonServers(commands.Cog):
             ]
         return results
 
+    @commands.command()
+    @checks.admin()
+    async def serverhealth(self, ctx: commands.Context, name: str = "all"):
+        """Shows the world topic circuit breaker state and latency of servers."""
+        worldtopic = self.bot.get_cog("WorldTopic")
+        servers = self.resolve_server_or_category(name)
+        if not servers:
+            return await ctx.send("Unknown server.")
+        lines = []
+        for server in servers:
+            health = worldtopic.health.get((server.host, server.port))
+            if health is None:
+                lines.append(f"{server.short_name}: no requests yet")
+                continue
+            line = f"{server.short_name}: {health.state}"
+            if health.state == health.OPEN:
+                line += f" (retrying in {health.retry_in:.0f}s)"
+            p50, p95 = health.percentile(50), health.percentile(95)
+            if p50 is not None:
+                line += f" | p50 {p50 * 1000:.0f}ms p95 {p95 * 1000:.0f}ms"
+            line += f" | status timeout {health.timeout('status', worldtopic.DEFAULT_TIMEOUT):.1f}s"
+            scheduler = worldtopic.schedulers.get((server.host, server.port))
+            if scheduler is not None:
+                line += f" | queued {scheduler.queue_depth}"
+                for priority, priority_name in scheduler.PRIORITY_NAMES.items():
+                    wait = scheduler.wait_percentile(95, priority)
+                    if wait is not None:
+                        line += f" | {priority_name} wait p95 {wait * 1000:.0f}ms"
+            lines.append(line)
+        line = f"Relay queue: {self.coalescer.queue_depth} lines pending"
+        ratio = self.coalescer.coalescing_ratio
+        if ratio is not None:
+            line += f" | {self.coalescer.lines_sent} lines in {self.coalescer.messages_sent} messages ({ratio:.1f} per message)"
+        lines.append(line)
+        for page in pagify("\n".join(lines)):
+            await ctx.send(page)
+
+    def collect_general_api_metrics(self, metrics):
+        metrics.gauge(
+            "goonservers_relay_queue_depth", "Relay lines waiting to be sent to Discord."
+        ).set(self.coalescer.queue_depth)
+        metrics.counter(
+            "goonservers_relay_lines_total", "Relay lines sent to Discord."
+        ).set(self.coalescer.lines_sent)
+        metrics.counter(
+            "goonservers_relay_messages_total", "Discord messages the relay lines were sent in."
+        ).set(self.coalescer.messages_sent)
+        snapshot_age = metrics.gauge(
+            "goonservers_status_age_seconds", "Age of the latest status poll of a server.", ("server",)
+        )
+        snapshot_age.clear()
+        for server in self.servers:
+            snapshot = self.status_snapshots.get((server.host, server.port))
+            if snapshot is not None:
+                snapshot_age.set(snapshot.age, server=server.short_name)
+
+    def register_to_general_api(self, app):
+        @app.get("/servers/{server}/history")
+        async def server_history(server: str, range: str = "24h"):
+            resolved = self.resolve_server(server)
+            if resolved is None or resolved not in self.servers:
+                raise HTTPException(status_code=404, detail="Unknown server.")
+            if range not in StatusHistory.RANGES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Range must be one of {', '.join(StatusHistory.RANGES)}.",
+                )
+            buckets = await self.history.query(
+                StatusHistory.server_key(resolved.host, resolved.port), range
+            )
+            return {
+                "server": resolved.short_name,
+                "range": range,
+                "buckets": [bucket._asdict() for bucket in buckets],
+            }
+
+    @commands.command()
+    async def serverhistory(self, ctx: commands.Context, name: str, range: str = "24h"):
+        """Shows the player count history of a server over the last 24h, 7d or 30d."""
+        server = self.resolve_server(name)
+        if server is None or server not in self.servers:
+            return await ctx.send("Unknown server.")
+        if range not in StatusHistory.RANGES:
+            return await ctx.send(f"Range must be one of {', '.join(StatusHistory.RANGES)}.")
+        buckets = await self.history.query(
+            StatusHistory.server_key(server.host, server.port), range
+        )
+        if not any(bucket.samples for bucket in buckets):
+            return await ctx.send("No history recorded for that server yet.")
+        peak = max((b.players_max for b in buckets if b.players_max is not None), default=None)
+        averages = [b.players_avg for b in buckets if b.players_avg is not None]
+        samples = sum(b.samples for b in buckets)
+        uptime = sum(b.online for b in buckets) / samples if samples else 0
+        maps = []
+        for bucket in buckets:
+            if bucket.map and (not maps or maps[-1] != bucket.map):
+                maps.append(bucket.map)
+        lines = [
+            f"{server.full_name}, last {range}",
+            StatusHistory.sparkline(b.players_avg for b in buckets),
+            f"peak {peak if peak is not None else '-'} players"
+            + (f", average {sum(averages) / len(averages):.1f}" if averages else "")
+            + f", up {uptime * 100:.0f}% of the time",
+        ]
+        if maps:
+            lines.append("maps: " + ", ".join(maps[-8:]))
+        await ctx.send(box("\n".join(lines)))
+
     def seconds_to_hhmmss(self, input_seconds):
         hours, remainder = divmod(input_seconds, 3600)
         minutes, seconds = divmod(remainder, 60)
         return "{:02}:{:02}:{:02}".format(int(hours), int(minutes), int(seconds))
 
-    def status_format_elapsed(self, status):
+    def status_format_elapsed(self, status, age=0):
         elapsed = (
             status.get("elapsed")
             or status.get("round_duration")
@@ -253,35 +648,45 @@ class GoonServers(commands.Cog):
             elapsed = "finished"
         elif elapsed is not None:
             try:
-                elapsed = self.seconds_to_hhmmss(int(elapsed))
+                elapsed = self.seconds_to_hhmmss(int(elapsed) + int(age))
             except ValueError:
                 pass
         return elapsed
 
-    async def get_status_info(self, server, worldtopic):
+    def base_status_info(self, server, error=None):
         result = OrderedDict()
         result["full_name"] = server.full_name
         result["url"] = server.url
         result["type"] = server.type
-        result["error"] = None
-        try:
-            response = await worldtopic.send((server.host, server.port), "status")
-        except (asyncio.exceptions.TimeoutError, TimeoutError) as e:
+        result["error"] = error
+        return result
+
+    async def get_status_info(self, server, worldtopic=None, force_refresh=False):
+        result = self.base_status_info(server)
+        snapshot = await self.get_status_snapshot(server, force_refresh=force_refresh)
+        error = snapshot.error
+        worldtopic = self.bot.get_cog("WorldTopic")
+        if error is not None and (
+            isinstance(error, worldtopic.CircuitOpenError)
+            or worldtopic.is_circuit_open((server.host, server.port))
+        ):
+            result["error"] = "Server offline (cached)."
+            return result
+        elif isinstance(error, (asyncio.exceptions.TimeoutError, TimeoutError)):
             result["error"] = "Server not responding."
             return result
-        except (socket.gaierror, ConnectionRefusedError) as e:
+        elif isinstance(error, (socket.gaierror, ConnectionRefusedError)):
             result["error"] = "Unable to connect."
             return result
-        except ConnectionResetError:
+        elif isinstance(error, ConnectionResetError):
             result["error"] = "Connection reset by server (possibly just restarted)."
             return result
-        if response is None:
+        elif error is not None:
+            raise error
+        status = snapshot.status
+        if status is None:
             result["error"] = "Invalid server response."
             return result
-        status = worldtopic.params_to_dict(response)
-        if len(response) < 20 or ("players" in status and len(status["players"]) > 5):
-            response = await worldtopic.send((server.host, server.port), "status&format=json")
-            status = json.loads(response)
         result["station_name"] = status.get("station_name")
         try:
             result["players"] = int(status["players"]) if "players" in status else None
@@ -289,7 +694,7 @@ class GoonServers(commands.Cog):
             result["players"] = None
         result["map"] = status.get("map_name")
         result["mode"] = status.get("mode")
-        result["time"] = self.status_format_elapsed(status)
+        result["time"] = self.status_format_elapsed(status, age=snapshot.age)
         result["shuttle"] = None
         result["shuttle_eta"] = None
         if "shuttle_time" in status and status["shuttle_time"] != "welp":
@@ -354,10 +759,11 @@ class GoonServers(commands.Cog):
     @commands.command()
     @commands.cooldown(1, 1)
     @commands.max_concurrency(10, wait=False)
-    async def checkclassic(self, ctx: commands.Context, name: str = "all"):
+    async def checkclassic(self, ctx: commands.Context, name: str = "all", refresh: bool = False):
         """
         Checks the status of a Goonstation server of servers.
         `name` can be either numeric server id, the server's name, a server category like "all" or even server address.
+        Status is served from the background poller, set `refresh` to `yes` to query the servers directly.
         """
 
         if name.lower() in self.CHECK_GIMMICKS:
@@ -370,37 +776,46 @@ class GoonServers(commands.Cog):
         servers = self.resolve_server_or_category(name)
         if not servers:
             return await ctx.send("Unknown server.")
-        futures = [asyncio.Task(self.get_status_info(s, worldtopic)) for s in servers]
-        done, pending = [], futures
+        results = {}
         message = None
+        message_text = None
+        start_time = time.monotonic()
         async with ctx.typing():
-            while pending:
-                when = asyncio.FIRST_COMPLETED if message else asyncio.ALL_COMPLETED
-                done, pending = await asyncio.wait(
-                    pending, timeout=self.INITIAL_CHECK_TIMEOUT, return_when=when
-                )
-                message_text = "\n".join(
-                    self.generate_status_text(f.result()) for f in futures if f.done()
-                )
-                if not done:
+            async for server, status_info in self.fan_out(
+                servers,
+                lambda s: self.get_status_info(s, worldtopic, force_refresh=refresh),
+                wakeup=self.INITIAL_CHECK_TIMEOUT,
+            ):
+                if isinstance(status_info, asyncio.CancelledError):
+                    status_info = self.base_status_info(server, "Status request was cancelled.")
+                elif isinstance(status_info, BaseException):
+                    raise status_info
+                if server is not None:
+                    results[server] = status_info
+                if not self.check_progress_ready(message, results, servers, start_time):
                     continue
+                new_text = "\n".join(
+                    self.generate_status_text(results[s]) for s in servers if s in results
+                )
                 if message is None:
-                    message = await ctx.send(message_text)
-                else:
-                    await message.edit(content=message_text)
+                    message = await ctx.send(new_text)
+                elif new_text != message_text:
+                    await message.edit(content=new_text)
+                message_text = new_text
 
     @commands.command()
     @commands.cooldown(1, 1)
     @commands.max_concurrency(10, wait=False)
-    async def check(self, ctx: commands.Context, name: str = "all"):
+    async def check(self, ctx: commands.Context, name: str = "all", refresh: bool = False):
         """Checks the status of a Goonstation server of servers.
         `name` can be either numeric server id, the server's name or a server category like "all".
+        Status is served from the background poller, set `refresh` to `yes` to query the servers directly.
         """
         if (
             isinstance(ctx.channel, discord.TextChannel)
             and not ctx.channel.permissions_for(ctx.channel.guild.me).embed_links
         ):
-            return await self.checkclassic(ctx, name)
+            return await self.checkclassic(ctx, name, refresh)
 
         embed = discord.Embed()
         embed.colour = self.COLOR_GOON
@@ -417,35 +832,50 @@ class GoonServers(commands.Cog):
         if not servers:
             return await ctx.send("Unknown server.")
         single_server_embed = len(servers) == 1
-        futures = [asyncio.Task(self.get_status_info(s, worldtopic)) for s in servers]
-        done, pending = [], futures
+        results = {}
         message = None
+        message_text = None
+        start_time = time.monotonic()
         all_goon = all(server.type == "goon" for server in servers)
         if not all_goon:
             embed.colour = self.COLOR_OTHER
         async with ctx.typing():
-            while pending:
-                when = asyncio.FIRST_COMPLETED if message else asyncio.ALL_COMPLETED
-                done, pending = await asyncio.wait(
-                    pending, timeout=self.INITIAL_CHECK_TIMEOUT, return_when=when
-                )
+            async for server, status_info in self.fan_out(
+                servers,
+                lambda s: self.get_status_info(s, worldtopic, force_refresh=refresh),
+                wakeup=self.INITIAL_CHECK_TIMEOUT,
+            ):
+                if isinstance(status_info, asyncio.CancelledError):
+                    status_info = self.base_status_info(server, "Status request was cancelled.")
+                elif isinstance(status_info, BaseException):
+                    raise status_info
+                if server is not None:
+                    results[server] = status_info
+                if not self.check_progress_ready(message, results, servers, start_time):
+                    continue
                 if not single_server_embed:
-                    message_text = "\n".join(
-                        self.generate_status_text(f.result(), embed_url=True)
-                        for f in futures
-                        if f.done()
+                    new_text = "\n".join(
+                        self.generate_status_text(results[s], embed_url=True)
+                        for s in servers
+                        if s in results
                     )
-                    embed.description = message_text
+                    embed.description = new_text
                 else:
-                    for f in futures:
-                        if f.done():
-                            embed = self.generate_status_embed(f.result(), embed)
-                if not done:
-                    continue
+                    new_text = None
+                    embed = self.generate_status_embed(next(iter(results.values())), embed)
                 if message is None:
                     message = await ctx.send(embed=embed)
-                else:
+                elif new_text != message_text:
                     await message.edit(embed=embed)
+                message_text = new_text
+
+    def check_progress_ready(self, message, results, servers, start_time):
+        """Whether a check command should post or edit its message after a new result or the wakeup arrived."""
+        if not results:
+            return False
+        if message is not None or len(results) >= len(set(servers)):
+            return True
+        return time.monotonic() - start_time >= self.INITIAL_CHECK_TIMEOUT
 
     async def _check_gimmick_oven(self, ctx: commands.Context):
         ts = int(datetime.datetime.now().timestamp())
@@ -0,0 +1,242 @@
+import asyncio
+import collections
+import datetime
+import json
+import pathlib
+import re
+import struct
+import threading
+import time
+from typing import *
+
+
+class HistoryBucket(NamedTuple):
+    start: int
+    end: int
+    samples: int
+    online: int
+    players_avg: Optional[float]
+    players_max: Optional[int]
+    map: Optional[str]
+    mode: Optional[str]
+
+
+class StatusHistory:
+    """Append-only store of status samples, one file of fixed size records per server per (UTC) day.
+
+    Samples are buffered in memory and appended to disk every `FLUSH_INTERVAL` seconds, day files
+    past `RETENTION_DAYS` are deleted once every `PRUNE_INTERVAL`. Map and mode names are stored
+    as indices into a shared string table. Queries downsample into buckets reading a single day
+    file at a time, so a month of history never has to be in memory at once. All file access
+    happens in the default executor, except for the last flush on unload.
+    """
+
+    # timestamp, elapsed round seconds, players, map string, mode string, flags
+    RECORD = struct.Struct("<IIHHHBx")
+    NO_VALUE_16 = 0xFFFF
+    NO_VALUE_32 = 0xFFFFFFFF
+    FLAG_ONLINE = 1
+    FLAG_PREROUND = 2
+    FLAG_FINISHED = 4
+
+    SAMPLE_INTERVAL = 30
+    FLUSH_INTERVAL = 300
+    PRUNE_INTERVAL = 24 * 3600
+    RETENTION_DAYS = 400
+    # range name: (seconds, number of buckets)
+    RANGES = {
+        "24h": (24 * 3600, 48),
+        "7d": (7 * 24 * 3600, 56),
+        "30d": (30 * 24 * 3600, 60),
+    }
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.strings_path = self.path / "strings.json"
+        self.strings = []
+        if self.strings_path.exists():
+            self.strings = json.loads(self.strings_path.read_text())
+        self.string_ids = {s: i for i, s in enumerate(self.strings)}
+        self.strings_dirty = False
+        self.pending = collections.defaultdict(bytearray)
+        self.last_sample = {}
+        self.last_flush = time.monotonic()
+        self.last_prune = 0
+        # flushes and queries take turns, so a query never sees samples both buffered and on disk
+        self.lock = asyncio.Lock()
+        # guards the files themselves, the flush on unload can overlap one still in the executor
+        self.write_lock = threading.Lock()
+
+    @staticmethod
+    def server_key(host: str, port: int) -> str:
+        return re.sub(r"[^A-Za-z0-9.\-]", "_", f"{host}_{port}")
+
+    @staticmethod
+    def day_of(timestamp: float) -> str:
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+    def day_file(self, key: str, day: str) -> pathlib.Path:
+        return self.path / key / f"{day}.bin"
+
+    def string_id(self, value: Optional[str]) -> int:
+        if value is None:
+            return self.NO_VALUE_16
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            if len(self.strings) >= self.NO_VALUE_16:
+                return self.NO_VALUE_16
+            string_id = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            self.strings_dirty = True
+        return string_id
+
+    def record(self, key: str, status: Optional[Mapping[str, Any]], timestamp: Optional[float] = None):
+        """Buffers a sample of a server, `status` is `None` if the server didn't respond."""
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self.last_sample.get(key, 0) < self.SAMPLE_INTERVAL:
+            return
+        self.last_sample[key] = timestamp
+        players = self.NO_VALUE_16
+        elapsed = self.NO_VALUE_32
+        map_id = mode_id = self.NO_VALUE_16
+        flags = 0
+        if status is not None:
+            flags |= self.FLAG_ONLINE
+            try:
+                players = min(int(status.get("players")), self.NO_VALUE_16 - 1)
+            except (TypeError, ValueError):
+                players = self.NO_VALUE_16
+            raw_elapsed = (
+                status.get("elapsed") or status.get("round_duration") or status.get("stationtime")
+            )
+            if raw_elapsed == "pre":
+                flags |= self.FLAG_PREROUND
+            elif raw_elapsed == "post":
+                flags |= self.FLAG_FINISHED
+            else:
+                try:
+                    elapsed = min(int(raw_elapsed), self.NO_VALUE_32 - 1)
+                except (TypeError, ValueError):
+                    pass
+            map_id = self.string_id(status.get("map_name"))
+            mode_id = self.string_id(status.get("mode"))
+        self.pending[(key, self.day_of(timestamp))] += self.RECORD.pack(
+            int(timestamp), elapsed, players, map_id, mode_id, flags
+        )
+
+    def flush_due(self) -> bool:
+        return time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL
+
+    def take_pending(self):
+        self.last_flush = time.monotonic()
+        strings = list(self.strings) if self.strings_dirty else None
+        self.strings_dirty = False
+        pending, self.pending = self.pending, collections.defaultdict(bytearray)
+        return pending, strings
+
+    async def flush(self):
+        async with self.lock:
+            pending, strings = self.take_pending()
+            prune = time.time() - self.last_prune >= self.PRUNE_INTERVAL
+            if prune:
+                self.last_prune = time.time()
+            await asyncio.get_running_loop().run_in_executor(None, self._flush, pending, strings, prune)
+
+    def flush_now(self):
+        """Flushes on the calling thread, for unloading where there is no later."""
+        self._flush(*self.take_pending(), False)
+
+    def _flush(self, pending, strings, prune=False):
+        with self.write_lock:
+            # the strings go first so a record never points at a string missing from disk
+            if strings is not None:
+                temp_path = self.strings_path.with_suffix(".tmp")
+                temp_path.write_text(json.dumps(strings))
+                temp_path.replace(self.strings_path)
+            for (key, day), records in pending.items():
+                path = self.day_file(key, day)
+                path.parent.mkdir(exist_ok=True)
+                with path.open("ab") as f:
+                    # drop a record cut short by a crash, it would misalign everything after it
+                    torn = f.tell() % self.RECORD.size
+                    if torn:
+                        f.truncate(f.tell() - torn)
+                    f.write(records)
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        cutoff = self.day_of(time.time() - self.RETENTION_DAYS * 24 * 3600)
+        for path in self.path.glob("*/*.bin"):
+            if path.stem < cutoff:
+                path.unlink()
+
+    async def query(self, key: str, range_name: str = "24h", now: Optional[float] = None):
+        """Returns the history of a server over one of `RANGES` as a list of `HistoryBucket`."""
+        duration, buckets = self.RANGES[range_name]
+        now = time.time() if now is None else now
+        async with self.lock:
+            pending = {day: bytes(records) for (k, day), records in self.pending.items() if k == key}
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._query, key, now - duration, now, buckets, pending, list(self.strings)
+            )
+
+    def _query(self, key, start, end, buckets, pending, strings):
+        bucket_length = (end - start) / buckets
+        samples = [0] * buckets
+        online = [0] * buckets
+        player_samples = [0] * buckets
+        player_sums = [0] * buckets
+        player_maxes = [None] * buckets
+        maps = [None] * buckets
+        modes = [None] * buckets
+        day = datetime.datetime.fromtimestamp(start, datetime.timezone.utc).date()
+        last_day = datetime.datetime.fromtimestamp(end, datetime.timezone.utc).date()
+        while day <= last_day:
+            day_name = day.strftime("%Y-%m-%d")
+            day += datetime.timedelta(days=1)
+            path = self.day_file(key, day_name)
+            data = path.read_bytes() if path.exists() else b""
+            data = data[: len(data) - len(data) % self.RECORD.size]
+            data += pending.get(day_name, b"")
+            for timestamp, _, players, map_id, mode_id, flags in self.RECORD.iter_unpack(data):
+                if not start <= timestamp < end:
+                    continue
+                i = min(buckets - 1, int((timestamp - start) / bucket_length))
+                samples[i] += 1
+                if not flags & self.FLAG_ONLINE:
+                    continue
+                online[i] += 1
+                if players != self.NO_VALUE_16:
+                    player_samples[i] += 1
+                    player_sums[i] += players
+                    if player_maxes[i] is None or players > player_maxes[i]:
+                        player_maxes[i] = players
+                if map_id < len(strings):
+                    maps[i] = strings[map_id]
+                if mode_id < len(strings):
+                    modes[i] = strings[mode_id]
+        return [
+            HistoryBucket(
+                int(start + i * bucket_length),
+                int(start + (i + 1) * bucket_length),
+                samples[i],
+                online[i],
+                player_sums[i] / player_samples[i] if player_samples[i] else None,
+                player_maxes[i],
+                maps[i],
+                modes[i],
+            )
+            for i in range(buckets)
+        ]
+
+    @staticmethod
+    def sparkline(values: Iterable[Optional[float]]) -> str:
+        values = list(values)
+        top = max((v for v in values if v is not None), default=0)
+        blocks = "▁▂▃▄▅▆▇█"
+        return "".join(
+            " " if v is None else blocks[int(v / top * (len(blocks) - 1)) if top else 0]
+            for v in values
+        )
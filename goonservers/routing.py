@@ -0,0 +1,42 @@
+import collections
+from types import MappingProxyType
+from typing import *
+
+
+class RoutingTable:
+    """Immutable map of Discord channels to the subtypes and servers they relay for.
+
+    A new table is built on every config reload and swapped in as a whole, code that needs
+    several lookups to agree with each other should fetch `GoonServers.routing` once and use
+    that. `generation` increases with every reload.
+    """
+
+    EMPTY_ROUTE = ((), ())
+
+    def __init__(self, subtypes: Iterable = (), generation: int = 0):
+        self.generation = generation
+        subtype_routes = collections.defaultdict(list)
+        usages = collections.defaultdict(set)
+        for subtype in subtypes:
+            for usage, channel_ids in subtype.channels.items():
+                for channel_id in channel_ids:
+                    if subtype not in subtype_routes[(channel_id, usage)]:
+                        subtype_routes[(channel_id, usage)].append(subtype)
+                    usages[channel_id].add(usage)
+        self.routes = MappingProxyType(
+            {
+                key: (tuple(route), tuple(s for subtype in route for s in subtype.servers))
+                for key, route in subtype_routes.items()
+            }
+        )
+        self.usages = MappingProxyType({k: frozenset(v) for k, v in usages.items()})
+        self.valid_channels = frozenset(usages)
+
+    def subtypes_for(self, channel_id: int, usage: str) -> Tuple:
+        return self.routes.get((channel_id, usage), self.EMPTY_ROUTE)[0]
+
+    def servers_for(self, channel_id: int, usage: str) -> Tuple:
+        return self.routes.get((channel_id, usage), self.EMPTY_ROUTE)[1]
+
+    def usages_for(self, channel_id: int) -> FrozenSet[str]:
+        return self.usages.get(channel_id, frozenset())
@@ -23,6 +23,29 @@ class NightshadeWhitelist(commands.Cog):
         self.config.init_custom("ckey", 1)
         self.config.register_user(ckey=None)
         self.config.register_custom("ckey", discord_id=None)
+        self.discord_by_ckey = None
+
+    async def get_discord_by_ckey(self):
+        if self.discord_by_ckey is None:
+            self.discord_by_ckey = {
+                ckey: int(data["discord_id"])
+                for ckey, data in (await self.config.custom("ckey").all()).items()
+                if data.get("discord_id")
+            }
+        return self.discord_by_ckey
+
+    async def set_ckey_discord(self, ckey, discord_id):
+        await self.config.custom("ckey", ckey).discord_id.set(discord_id)
+        discord_by_ckey = await self.get_discord_by_ckey()
+        if discord_id:
+            discord_by_ckey[ckey] = discord_id
+        else:
+            discord_by_ckey.pop(ckey, None)
+
+    async def bulk_ckeys_to_discord(self, ckeys):
+        """Maps ckeys to the ids of their whitelisted Discord accounts, `None` for unknown ones."""
+        discord_by_ckey = await self.get_discord_by_ckey()
+        return {ckey: discord_by_ckey.get(ckey) for ckey in ckeys}
 
     async def get_whitelist_txt(self):
         if self.cached_whitelist_txt is not None:
@@ -54,7 +77,7 @@ class NightshadeWhitelist(commands.Cog):
     async def nightshaderebuildinversedb(self, ctx: commands.Context):
         for user_id, data in (await self.config.all_users()).items():
             if data.get("ckey"):
-                await self.config.custom("ckey", data.get("ckey")).discord_id.set(int(user_id))
+                await self.set_ckey_discord(data.get("ckey"), int(user_id))
         await ctx.reply("done")
 
     @commands.command()
@@ -68,7 +91,7 @@ class NightshadeWhitelist(commands.Cog):
             return
         ckey = "".join(c.lower() for c in ckey if c.isalnum())
         await self.config.user(ctx.author).ckey.set(ckey)
-        await self.config.custom("ckey", ckey).discord_id.set(int(ctx.author.id))
+        await self.set_ckey_discord(ckey, int(ctx.author.id))
         self.invalidate_whitelist_cache()
         await ctx.send(f"You are now whitelisted as ckey '{ckey}'.")
         await self.send_to_nightshade(
@@ -86,7 +109,7 @@ class NightshadeWhitelist(commands.Cog):
         if current_ckey is None:
             await ctx.send(f"You don't have a ckey bound to your account.")
             return
-        await self.config.custom("ckey", current_ckey).discord_id.set(None)
+        await self.set_ckey_discord(current_ckey, None)
         await self.config.user(ctx.author).ckey.set(None)
         self.invalidate_whitelist_cache()
         await ctx.send(
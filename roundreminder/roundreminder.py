@@ -26,7 +26,7 @@ class RoundReminder(commands.Cog):
             self.error_code = error_code
 
     async def server_dep(self, server: str, server_name: str, api_key: str):
-        if api_key != (await self.bot.get_shared_api_tokens("spacebee"))["api_key"]:
+        if not await self.bot.get_cog("GeneralApi").tokens.check("spacebee", api_key):
             raise self.SpacebeeError("Invalid API key.", 403)
         goonservers = self.bot.get_cog("GoonServers")
         server = goonservers.resolve_server(server_name) or goonservers.resolve_server(
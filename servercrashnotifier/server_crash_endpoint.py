@@ -20,8 +20,8 @@ class ServerCrashEndpoint(commands.Cog):
     def register_to_general_api(self, app: FastAPI):
         @app.post("/server_crash")
         async def server_crash(data: ServerCrashModel):
-            tokens = await self.bot.get_shared_api_tokens("servercrashnotifier")
-            if data.api_key != tokens["api_key"]: return
+            tokens = self.bot.get_cog("GeneralApi").tokens
+            if not await tokens.check("servercrashnotifier", data.api_key): return
             channels = await self.config.channels()
             if not len(channels): return
             data.server = data.server.strip()
@@ -0,0 +1,118 @@
+import contextvars
+import json
+import time
+import urllib.parse
+from typing import *
+from fastapi import FastAPI
+
+# set while benchmarking, events are authenticated, validated and dispatched but not relayed
+dry_run_events = contextvars.ContextVar("dry_run_events", default=False)
+
+SAMPLE_EVENTS = [
+    {"type": "help", "key": "bench", "name": "Bench Mark", "msg": "the clown stole my shoes", "msgid": "bench-1"},
+    {"type": "pm", "key": "admin", "name": "Admin", "key2": "bench", "name2": "Bench Mark", "msg": "on it",
+     "msgid": "bench-2", "previous_msgid": "bench-1"},
+    {"type": "admin", "key": "bench", "name": "Bench Mark", "msg": "has toggled the singularity"},
+    {"type": "mentorhelp", "key": "bench", "name": "Bench Mark", "msg": "how do I cook", "msgid": "bench-3"},
+    {"type": "admin_debug", "msg": "runtime in code/bench.dm,42"},
+]
+
+
+class IngestResult(NamedTuple):
+    name: str
+    events: int
+    requests: int
+    errors: int
+    elapsed: float
+
+    @property
+    def throughput(self):
+        return self.events / self.elapsed if self.elapsed else 0
+
+
+async def asgi_request(app, method: str, path: str, query: Dict[str, Any], body: bytes = b"") -> int:
+    """Calls the ASGI `app` directly, without a socket, and returns the response status code."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urllib.parse.urlencode(query).encode(),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def benchmark_event_ingest(
+    cog, server_id: str, events: int = 500, batch_size: int = 25
+) -> List[IngestResult]:
+    """Pushes the same events through the per-event GET endpoints and through `/events/batch`.
+
+    Runs against a private app with only this cog's routes, nothing is relayed to Discord.
+    """
+    app = FastAPI()
+    cog.register_to_general_api(app)
+    api_key = await cog.bot.get_cog("GeneralApi").tokens.get("spacebee", "api_key")
+    auth = {"server": server_id, "server_name": server_id, "api_key": api_key}
+    sample = [SAMPLE_EVENTS[i % len(SAMPLE_EVENTS)] for i in range(events)]
+    token = dry_run_events.set(True)
+    try:
+        results = []
+
+        errors = 0
+        start = time.perf_counter()
+        for event in sample:
+            query = {key: value for key, value in event.items() if key != "type"}
+            if await asgi_request(app, "GET", f"/{event['type']}", {**auth, **query}) != 200:
+                errors += 1
+        results.append(IngestResult("GET per event", events, events, errors, time.perf_counter() - start))
+
+        errors = 0
+        requests = 0
+        start = time.perf_counter()
+        for i in range(0, events, batch_size):
+            body = json.dumps({"events": sample[i : i + batch_size]}).encode()
+            requests += 1
+            if await asgi_request(app, "POST", "/events/batch", auth, body) != 200:
+                errors += 1
+        results.append(
+            IngestResult(f"POST batch of {batch_size}", events, requests, errors, time.perf_counter() - start)
+        )
+        return results
+    finally:
+        dry_run_events.reset(token)
+
+
+def format_ingest_benchmark(results: Iterable[IngestResult]) -> str:
+    lines = [f"{'mode':<20} {'events':>7} {'requests':>9} {'errors':>7} {'events/s':>10}"]
+    for result in results:
+        lines.append(
+            f"{result.name:<20} {result.events:>7} {result.requests:>9} {result.errors:>7} {result.throughput:>10.0f}"
+        )
+    return "\n".join(lines)
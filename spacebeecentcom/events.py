@@ -0,0 +1,91 @@
+"""Payload schema of game server events relayed to Discord.
+
+Every event is an object with a `type` and the same fields as the query parameters of the
+GET endpoint of the same name (`/help`, `/pm`, `/asay`, ...). A batch is posted as
+
+    POST /events/batch?server=...&server_name=...&api_key=...
+    {"events": [{"type": "help", "key": "ckey", "name": "Name", "msg": "help me"}, ...]}
+
+and is answered with one result per event, in the same order:
+
+    {"status": "ok", "results": [{"status": "ok"}, {"status": "error", "errormsg": "..."}, ...]}
+
+Events of a batch are relayed one after another in the order they were sent, batches from the
+same server never overlap. A malformed event rejects the whole batch before anything is relayed.
+"""
+
+from typing import *
+from pydantic import BaseModel, Field
+
+
+class AsayEvent(BaseModel):
+    type: Literal["asay"]
+    key: str
+    name: str
+    msg: str
+
+
+class UncoolEvent(BaseModel):
+    type: Literal["uncool"]
+    key: str
+    name: str
+    msg: str
+    phrase: str
+    pos: int
+    server_key: str
+
+
+class BanEvent(BaseModel):
+    type: Literal["ban"]
+    key: str
+    key2: str
+    msg: str
+    time: str
+    # minutes since 2000-01-01 00:00 GMT, 0 for permanent bans, negative for until appeal
+    timestamp: Optional[float] = None
+
+
+class JobBanEvent(BaseModel):
+    type: Literal["job_ban", "job_unban"]
+    key: str
+    rank: str
+    akey: str
+    applicable_server: str = ""
+
+
+class HelpEvent(BaseModel):
+    type: Literal["help", "mentorhelp"]
+    key: str
+    name: str
+    msg: str
+    log_link: Optional[str] = None
+    msgid: Optional[str] = None
+    previous_msgid: Optional[str] = None
+
+
+class PmEvent(BaseModel):
+    type: Literal["pm", "mentorpm"]
+    key: str
+    name: str
+    key2: str
+    name2: str
+    msg: str
+    msgid: Optional[str] = None
+    previous_msgid: Optional[str] = None
+
+
+class AdminLogEvent(BaseModel):
+    type: Literal["admin", "admin_debug"]
+    msg: str
+    key: str = ""
+    name: str = ""
+
+
+Event = Annotated[
+    Union[AsayEvent, UncoolEvent, BanEvent, JobBanEvent, HelpEvent, PmEvent, AdminLogEvent],
+    Field(discriminator="type"),
+]
+
+
+class EventBatch(BaseModel):
+    events: List[Event]
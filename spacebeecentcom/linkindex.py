@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import *
+
+log = logging.getLogger("red.goon.spacebeecentcom")
+
+
+class LinkIndex:
+    """Both directions of the ckey <-> Discord account links, mirrored from Config into memory.
+
+    Loaded by `run()`, which retries until it works, after that every link change has to go
+    through `set_user_ckey` and `set_ckey_user` so the dicts and Config never disagree. Lookups
+    wait up to `LOAD_TIMEOUT` seconds for the load and read Config directly if it isn't there
+    by then or has failed before.
+    """
+
+    LOAD_TIMEOUT = 5
+    RETRY_DELAY = 30
+
+    def __init__(self, config, user_field: str):
+        self.config = config
+        self.user_field = user_field
+        self.ckey_by_user = {}
+        self.user_by_ckey = {}
+        self.ready = asyncio.Event()
+        self.load_failed = False
+        # keeps link changes from landing between the two halves of a load
+        self.lock = asyncio.Lock()
+
+    async def run(self):
+        while True:
+            try:
+                return await self.load()
+            except Exception:
+                self.load_failed = True
+                log.exception("Loading the account links failed, retrying later")
+            await asyncio.sleep(self.RETRY_DELAY)
+
+    async def load(self):
+        async with self.lock:
+            await self._load()
+
+    async def _load(self):
+        ckey_by_user = {}
+        for user_id, data in (await self.config.all_users()).items():
+            if data.get(self.user_field):
+                ckey_by_user[int(user_id)] = data[self.user_field]
+        user_by_ckey = {}
+        for ckey, data in (await self.config.custom("ckey").all()).items():
+            if data.get("discord_id"):
+                user_by_ckey[ckey] = int(data["discord_id"])
+        self.ckey_by_user = ckey_by_user
+        self.user_by_ckey = user_by_ckey
+        self.ready.set()
+
+    async def loaded(self) -> bool:
+        """Whether lookups can use the dicts, waits for the load unless it failed already."""
+        if self.ready.is_set():
+            return True
+        if self.load_failed:
+            return False
+        try:
+            await asyncio.wait_for(self.ready.wait(), self.LOAD_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def ckey_of(self, user_id: int) -> Optional[str]:
+        if await self.loaded():
+            return self.ckey_by_user.get(user_id)
+        return await self.config.user_from_id(user_id).get_attr(self.user_field)() or None
+
+    async def user_of(self, ckey: str) -> Optional[int]:
+        if await self.loaded():
+            return self.user_by_ckey.get(ckey)
+        user_id = await self.config.custom("ckey", ckey).discord_id()
+        return int(user_id) if user_id else None
+
+    async def bulk_users_to_ckeys(self, user_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        if await self.loaded():
+            return {user_id: self.ckey_by_user.get(user_id) for user_id in user_ids}
+        return {user_id: await self.ckey_of(user_id) for user_id in user_ids}
+
+    async def bulk_ckeys_to_users(self, ckeys: Iterable[str]) -> Dict[str, Optional[int]]:
+        if await self.loaded():
+            return {ckey: self.user_by_ckey.get(ckey) for ckey in ckeys}
+        return {ckey: await self.user_of(ckey) for ckey in ckeys}
+
+    async def set_user_ckey(self, user_id: int, ckey: Optional[str]):
+        async with self.lock:
+            await self.config.user_from_id(user_id).get_attr(self.user_field).set(ckey)
+            if ckey:
+                self.ckey_by_user[user_id] = ckey
+            else:
+                self.ckey_by_user.pop(user_id, None)
+
+    async def set_ckey_user(self, ckey: str, user_id: Optional[int]):
+        async with self.lock:
+            await self.config.custom("ckey", ckey).discord_id.set(user_id)
+            if user_id:
+                self.user_by_ckey[ckey] = user_id
+            else:
+                self.user_by_ckey.pop(ckey, None)
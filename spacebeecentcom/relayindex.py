@@ -0,0 +1,112 @@
+import collections
+import pathlib
+import sqlite3
+import time
+from typing import *
+
+
+class RelayedMessage(NamedTuple):
+    channel_id: int
+    message_id: int
+    initiating: bool
+
+
+class RelayIndex:
+    """Persistent two-way map between relayed message ids (`msgid`) and the Discord messages carrying them.
+
+    Rows live in an SQLite database in WAL mode so reply threading survives restarts, only the
+    `CACHE_SIZE` most recently used entries of each direction are kept in memory. Rows older
+    than `RETENTION` seconds are pruned.
+    """
+
+    CACHE_SIZE = 2000
+    RETENTION = 30 * 24 * 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: pathlib.Path):
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS relay_messages (
+                    message_id INTEGER PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    msgid TEXT NOT NULL,
+                    initiating INTEGER NOT NULL,
+                    created REAL NOT NULL
+                )"""
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS relay_messages_msgid ON relay_messages (msgid)"
+            )
+        self.by_msgid = collections.OrderedDict()
+        self.by_message = collections.OrderedDict()
+        self.adds_since_prune = 0
+        self.hits = 0
+        self.misses = 0
+        self.prune()
+
+    def close(self):
+        self.db.close()
+
+    def cache(self, cache: collections.OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.CACHE_SIZE:
+            cache.popitem(last=False)
+
+    def add(self, msgid: str, messages: Iterable[RelayedMessage]):
+        """Records that `messages` carry `msgid`, in addition to the ones already recorded."""
+        messages = list(messages)
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO relay_messages VALUES (?, ?, ?, ?, ?)",
+                [(m.message_id, m.channel_id, msgid, int(m.initiating), now) for m in messages],
+            )
+        # reloaded from the database on the next lookup, with the new messages included
+        self.by_msgid.pop(msgid, None)
+        for message in messages:
+            self.cache(self.by_message, message.message_id, msgid)
+        self.adds_since_prune += 1
+        if self.adds_since_prune >= self.PRUNE_EVERY:
+            self.prune()
+
+    def messages_for(self, msgid: str) -> Tuple[RelayedMessage, ...]:
+        messages = self.by_msgid.get(msgid)
+        if messages is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            messages = tuple(
+                RelayedMessage(channel_id, message_id, bool(initiating))
+                for channel_id, message_id, initiating in self.db.execute(
+                    "SELECT channel_id, message_id, initiating FROM relay_messages WHERE msgid = ?",
+                    (msgid,),
+                )
+            )
+        self.cache(self.by_msgid, msgid, messages)
+        return messages
+
+    def msgid_for(self, message_id: int) -> Optional[str]:
+        if message_id in self.by_message:
+            self.hits += 1
+            msgid = self.by_message[message_id]
+        else:
+            self.misses += 1
+            row = self.db.execute(
+                "SELECT msgid FROM relay_messages WHERE message_id = ?", (message_id,)
+            ).fetchone()
+            msgid = row[0] if row else None
+        self.cache(self.by_message, message_id, msgid)
+        return msgid
+
+    def prune(self):
+        self.adds_since_prune = 0
+        with self.db:
+            self.db.execute(
+                "DELETE FROM relay_messages WHERE created < ?", (time.time() - self.RETENTION,)
+            )
+        self.by_msgid.clear()
+        self.by_message.clear()
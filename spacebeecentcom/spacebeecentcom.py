@@ -1,20 +1,36 @@
 import asyncio
 import discord
-import datetime
 from redbot.core import commands, Config, checks, app_commands
-from redbot.core.utils.chat_formatting import pagify
+from redbot.core.utils.chat_formatting import pagify, box
 import discord.errors
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 from typing import *
 from fastapi import Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from github import Github
-from collections import OrderedDict
 import logging
 import re
 import secrets
 import itertools
+import collections
 import discord.ui as ui
+from .relayindex import RelayIndex, RelayedMessage
+from .tickets import TicketTracker
+from .linkindex import LinkIndex
+from .events import (
+    AsayEvent,
+    UncoolEvent,
+    BanEvent,
+    JobBanEvent,
+    HelpEvent,
+    PmEvent,
+    AdminLogEvent,
+    EventBatch,
+)
+from .eventbench import dry_run_events, benchmark_event_ingest, format_ingest_benchmark
+
+log = logging.getLogger("red.goon.spacebeecentcom")
 
 PLAYER_ROLE_ID = 182284445837950977
 GUILD_ID = 182249960895545344
@@ -28,7 +44,6 @@ class SpacebeeCentcom(commands.Cog):
         "linked_ckey": None,
         "link_verification": None,
     }
-    MAX_CACHE_LENGTH = 2000
     REPLIED_TO_EMOJI = "\N{CLOSED MAILBOX WITH LOWERED FLAG}"
 
     def __init__(self, bot: Red):
@@ -39,11 +54,19 @@ class SpacebeeCentcom(commands.Cog):
         self.config.register_user(**self.default_user_settings)
         self.config.register_custom("ckey", discord_id=None)
         self.gh = None
-        self.id_to_messages = OrderedDict()
-        self.message_to_id = OrderedDict()
-        self.initiating_messages = OrderedDict()
+        self.links = LinkIndex(self.config, "linked_ckey")
+        self.links_task = None
+        self.relay_index = RelayIndex(cog_data_path(self) / "relay_index.sqlite3")
+        self.tickets = TicketTracker(self.relay_index.db)
+        self.event_locks = collections.defaultdict(asyncio.Lock)
+
+    def cog_unload(self):
+        self.relay_index.close()
+        if self.links_task:
+            self.links_task.cancel()
 
     async def init(self):
+        self.links_task = asyncio.create_task(self.links.run())
         self.gh = Github((await self.bot.get_shared_api_tokens("github")).get("token"))
 
     class SpacebeeError(Exception):
@@ -94,8 +117,7 @@ class SpacebeeCentcom(commands.Cog):
 
     async def mark_initiating_message_reply(self, message: discord.Message):
         await message.add_reaction(self.REPLIED_TO_EMOJI)
-        if message.id in self.initiating_messages:
-            del self.initiating_messages[message.id]
+        self.tickets.close(message.id)
 
     async def discord_broadcast(self,
             channels,
@@ -107,15 +129,26 @@ class SpacebeeCentcom(commands.Cog):
             **kwargs
         ):
         channel_to_reply_message = {}
-        if reply_message_id is not None and reply_message_id in self.id_to_messages:
-            reply_message_list = self.id_to_messages[reply_message_id]
+        initiating_reply_messages = set()
+        if reply_message_id is not None:
+            for relayed in self.relay_index.messages_for(reply_message_id):
+                channel = self.bot.get_channel(relayed.channel_id)
+                if channel is None:
+                    continue
+                channel_to_reply_message[relayed.channel_id] = channel.get_partial_message(
+                    relayed.message_id
+                )
+                if relayed.initiating:
+                    initiating_reply_messages.add(relayed.message_id)
         if reply_message_list is not None:
             for message in reply_message_list:
                 channel_to_reply_message[message.channel.id] = message
+                if await self.is_initiating_message(message):
+                    initiating_reply_messages.add(message.id)
         async def task(ch):
             reply_message = channel_to_reply_message.get(ch, None)
             result_msg = await self.bot.get_channel(ch).send(*args, **kwargs, reference=reply_message)
-            if reply_message and await self.is_initiating_message(reply_message):
+            if reply_message and reply_message.id in initiating_reply_messages:
                 await self.mark_initiating_message_reply(reply_message)
             return result_msg
         tasks = [
@@ -125,22 +158,20 @@ class SpacebeeCentcom(commands.Cog):
         ]
         messages = await asyncio.gather(*tasks)
         if msgid:
-            self.id_to_messages[msgid] = list(messages)
+            relayed = []
             for message in messages:
-                self.message_to_id[message] = msgid
-                if await self.is_initiating_message(message):
-                    self.initiating_messages[message.id] = message
-            if len(self.id_to_messages) > self.MAX_CACHE_LENGTH:
-                new_size = self.MAX_CACHE_LENGTH // 2
-                for _ in range(new_size):
-                    self.id_to_messages.popitem(last=False)
-                new_message_to_id_size = len(self.message_to_id) // 2
-                for _ in range(new_message_to_id_size):
-                    self.message_to_id.popitem(last=False)
-            if len(self.initiating_messages) > self.MAX_CACHE_LENGTH:
-                new_size = self.MAX_CACHE_LENGTH // 2
-                for _ in range(new_size):
-                    self.initiating_messages.popitem(last=False)
+                initiating = await self.is_initiating_message(message)
+                relayed.append(RelayedMessage(message.channel.id, message.id, initiating))
+                if initiating:
+                    embed = message.embeds[0]
+                    self.tickets.open(
+                        message.channel.id,
+                        message.id,
+                        msgid,
+                        message.created_at.timestamp(),
+                        embed.description or "",
+                    )
+            self.relay_index.add(msgid, relayed)
         return messages
 
     async def discord_broadcast_ahelp(
@@ -229,7 +260,10 @@ class SpacebeeCentcom(commands.Cog):
             await self.discord_broadcast(channels, embed=embed, exception=exception)
         else:
             out_msg = f"\N{LARGE PURPLE SQUARE} [{source}] __{from_key}__: {msg}"
-            await self.discord_broadcast(channels, out_msg, exception=exception)
+            coalescer = self.bot.get_cog("GoonServers").coalescer
+            for ch in channels:
+                if ch != exception:
+                    coalescer.queue(ch, out_msg)
 
     async def game_broadcast_asay(
         self, servers, from_key, from_name, source, msg, exception=None
@@ -242,14 +276,133 @@ class SpacebeeCentcom(commands.Cog):
         }
         await goonservers.send_to_servers(servers, send_data, exception=exception)
 
+    EVENT_HANDLERS = {
+        "asay": "relay_asay_event",
+        "uncool": "relay_uncool_event",
+        "ban": "relay_ban_event",
+        "job_ban": "relay_job_ban_event",
+        "job_unban": "relay_job_ban_event",
+        "help": "relay_help_event",
+        "mentorhelp": "relay_help_event",
+        "pm": "relay_pm_event",
+        "mentorpm": "relay_pm_event",
+        "admin": "relay_admin_log_event",
+        "admin_debug": "relay_admin_log_event",
+    }
+
+    async def dispatch_event(self, server, event):
+        """Relays one event sent by a game server, shared by the GET endpoints and `/events/batch`."""
+        handler = getattr(self, self.EVENT_HANDLERS[event.type])
+        if dry_run_events.get():
+            return
+        await handler(server, event)
+
+    async def relay_asay_event(self, server, event: AsayEvent):
+        await self.discord_broadcast_asay(
+            server.subtype, server.full_name, event.key, event.name, server.short_name, event.msg
+        )
+        await self.game_broadcast_asay(
+            server.subtype.servers,
+            event.key,
+            event.name,
+            server.short_name,
+            event.msg,
+            exception=server,
+        )
+
+    async def relay_uncool_event(self, server, event: UncoolEvent):
+        words = event.phrase.split('**')
+        char_positions = list(itertools.accumulate(len(word) + 2 for word in words))
+        word = None
+        for i, pos2 in enumerate(char_positions):
+            if event.pos < pos2:
+                word = words[i]
+                break
+        await self.discord_broadcast_uncool(
+            server.subtype, server.full_name, event.key, event.name, event.msg, event.phrase, word, event.server_key
+        )
+
+    async def relay_ban_event(self, server, event: BanEvent):
+        timestamp = event.timestamp
+        embed = discord.Embed()
+        embed.title = f"{event.key} banned {event.key2}"
+        embed.description = event.msg
+        if timestamp is None:
+            embed.add_field(name="expires", value=f"in {event.time}")
+        elif timestamp > 0:
+            timestamp = (
+                int(timestamp) * 60 + 946684800
+            )  # timestamp is send in minutes since 2000-01-01 00:00 GMT
+            embed.add_field(
+                name="expires", value=f"<t:{timestamp}:F>\n(<t:{timestamp}:R>)"
+            )
+        elif timestamp == 0:
+            embed.add_field(name="expires", value="permanent")
+        else:
+            embed.add_field(name="expires", value="until appeal")
+        embed.colour = discord.Colour.red()
+        embed.set_footer(text=f"{server.full_name} BAN")
+        for channel_id in server.subtype.channels["ban"]:
+            await self.bot.get_channel(channel_id).send(embed=embed)
+
+    async def relay_job_ban_event(self, server, event: JobBanEvent):
+        embed = discord.Embed()
+        if event.type == "job_ban":
+            embed.title = f"{event.akey} jobbanned {event.key} from {event.rank}"
+        else:
+            embed.title = f"{event.akey} jobUNbanned {event.key} from {event.rank}"
+        applicable_server = event.applicable_server or "all"
+        embed.description = f"server `{applicable_server}`"
+        embed.colour = discord.Colour.from_rgb(200, 100, 100)
+        embed.set_footer(text=f"{server.full_name} {event.type.replace('_', '').upper()}")
+        for channel_id in server.subtype.channels["ban"]:
+            await self.bot.get_channel(channel_id).send(embed=embed)
+
+    async def relay_help_event(self, server, event: HelpEvent):
+        if event.type == "help":
+            await self.discord_broadcast_ahelp(
+                server.subtype, server.full_name, event.key, event.name, event.msg,
+                url=event.log_link, msgid=event.msgid, reply_message_id=event.previous_msgid
+            )
+        else:
+            await self.discord_broadcast_mhelp(
+                server.subtype, server.full_name, event.key, event.name, event.msg,
+                msgid=event.msgid, reply_message_id=event.previous_msgid
+            )
+
+    async def relay_pm_event(self, server, event: PmEvent):
+        broadcast = self.discord_broadcast_ahelp if event.type == "pm" else self.discord_broadcast_mhelp
+        await broadcast(
+            server.subtype, server.full_name, event.key, event.name, event.msg, event.key2, event.name2,
+            msgid=event.msgid, reply_message_id=event.previous_msgid
+        )
+
+    async def relay_admin_log_event(self, server, event: AdminLogEvent):
+        out = f"[{server.full_name}] "
+        if event.key or event.name:
+            out += f"{event.name} ({event.key}) "
+        out += event.msg
+        channel_type = "admin_misc" if event.type == "admin" else "debug"
+        await server.subtype.channel_broadcast(self.bot, channel_type, out, coalesce=True)
+
     async def server_dep(self, server: str, server_name: str, api_key: str):
-        if api_key != (await self.bot.get_shared_api_tokens("spacebee"))["api_key"]:
+        if not await self.bot.get_cog("GeneralApi").tokens.check("spacebee", api_key):
             raise self.SpacebeeError("Invalid API key.", 403)
         server = self.get_server(server_name) or self.get_server(server)
         if server is None:
             raise self.SpacebeeError("Unknown server.", 404)
         return server
 
+    def collect_general_api_metrics(self, metrics):
+        lookups = metrics.counter(
+            "spacebee_relay_index_lookups_total", "Relay index lookups by cache result.", ("result",)
+        )
+        lookups.set(self.relay_index.hits, result="hit")
+        lookups.set(self.relay_index.misses, result="miss")
+        metrics.gauge(
+            "spacebee_open_tickets", "Unanswered ahelps and mhelps, per channel they were relayed to."
+        ).set(sum(len(tickets) for tickets in self.tickets.by_channel.values()))
+
     def register_to_general_api(self, app):
         @app.exception_handler(self.SpacebeeError)
         async def invalid_api_key_error_handler(
@@ -268,33 +421,18 @@ class SpacebeeCentcom(commands.Cog):
         async def adminsay(
             key: str, name: str, msg: str, server=Depends(self.server_dep)
         ):
-            await self.discord_broadcast_asay(
-                server.subtype, server.full_name, key, name, server.short_name, msg
-            )
-            await self.game_broadcast_asay(
-                server.subtype.servers,
-                key,
-                name,
-                server.short_name,
-                msg,
-                exception=server,
-            )
+            await self.dispatch_event(server, AsayEvent(type="asay", key=key, name=name, msg=msg))
             return self.SUCCESS_REPLY
 
         @app.get("/uncool")
-        async def adminsay(
+        async def uncool(
             key: str, name: str, msg: str, phrase: str, pos: int, server_key: str, server=Depends(self.server_dep)
         ):
-            words = phrase.split('**')
-            char_positions = list(itertools.accumulate(len(word) + 2 for word in words))
-            word = None
-            for i, pos2 in enumerate(char_positions):
-                if pos < pos2:
-                    word = words[i]
-                    break
-
-            await self.discord_broadcast_uncool(
-                server.subtype, server.full_name, key, name, msg, phrase, word, server_key
+            await self.dispatch_event(
+                server,
+                UncoolEvent(
+                    type="uncool", key=key, name=name, msg=msg, phrase=phrase, pos=pos, server_key=server_key
+                ),
             )
             return self.SUCCESS_REPLY
 
@@ -307,26 +445,9 @@ class SpacebeeCentcom(commands.Cog):
             timestamp: Optional[float],
             server=Depends(self.server_dep),
         ):
-            embed = discord.Embed()
-            embed.title = f"{key} banned {key2}"
-            embed.description = msg
-            if timestamp is None:
-                embed.add_field(name="expires", value=f"in {time}")
-            if timestamp > 0:
-                timestamp = (
-                    int(timestamp) * 60 + 946684800
-                )  # timestamp is send in minutes since 2000-01-01 00:00 GMT
-                embed.add_field(
-                    name="expires", value=f"<t:{timestamp}:F>\n(<t:{timestamp}:R>)"
-                )
-            elif timestamp == 0:
-                embed.add_field(name="expires", value="permanent")
-            else:
-                embed.add_field(name="expires", value="until appeal")
-            embed.colour = discord.Colour.red()
-            embed.set_footer(text=f"{server.full_name} BAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            await self.dispatch_event(
+                server, BanEvent(type="ban", key=key, key2=key2, msg=msg, time=time, timestamp=timestamp)
+            )
             return self.SUCCESS_REPLY
 
         @app.get("/job_ban")
@@ -337,14 +458,10 @@ class SpacebeeCentcom(commands.Cog):
             applicable_server: str,
             server=Depends(self.server_dep),
         ):
-            embed = discord.Embed()
-            embed.title = f"{akey} jobbanned {key} from {rank}"
-            applicable_server = applicable_server or "all"
-            embed.description = f"server `{applicable_server}`"
-            embed.colour = discord.Colour.from_rgb(200, 100, 100)
-            embed.set_footer(text=f"{server.full_name} JOBBAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            await self.dispatch_event(
+                server,
+                JobBanEvent(type="job_ban", key=key, rank=rank, akey=akey, applicable_server=applicable_server),
+            )
             return self.SUCCESS_REPLY
 
         @app.get("/job_unban")
@@ -355,14 +472,10 @@ class SpacebeeCentcom(commands.Cog):
             applicable_server: str,
             server=Depends(self.server_dep),
         ):
-            embed = discord.Embed()
-            embed.title = f"{akey} jobUNbanned {key} from {rank}"
-            applicable_server = applicable_server or "all"
-            embed.description = f"server `{applicable_server}`"
-            embed.colour = discord.Colour.from_rgb(200, 100, 100)
-            embed.set_footer(text=f"{server.full_name} JOBUNBAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            await self.dispatch_event(
+                server,
+                JobBanEvent(type="job_unban", key=key, rank=rank, akey=akey, applicable_server=applicable_server),
+            )
             return self.SUCCESS_REPLY
 
         @app.get("/help")
@@ -375,8 +488,11 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_ahelp(
-                server.subtype, server.full_name, key, name, msg, url=log_link, msgid=msgid, reply_message_id=previous_msgid
+            await self.dispatch_event(
+                server,
+                HelpEvent(
+                    type="help", key=key, name=name, msg=msg, log_link=log_link, msgid=msgid, previous_msgid=previous_msgid
+                ),
             )
             return self.SUCCESS_REPLY
 
@@ -391,8 +507,11 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_ahelp(
-                server.subtype, server.full_name, key, name, msg, key2, name2, msgid=msgid, reply_message_id=previous_msgid
+            await self.dispatch_event(
+                server,
+                PmEvent(
+                    type="pm", key=key, name=name, key2=key2, name2=name2, msg=msg, msgid=msgid, previous_msgid=previous_msgid
+                ),
             )
             return self.SUCCESS_REPLY
 
@@ -405,8 +524,9 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep)
         ):
-            await self.discord_broadcast_mhelp(
-                server.subtype, server.full_name, key, name, msg, msgid=msgid, reply_message_id=previous_msgid
+            await self.dispatch_event(
+                server,
+                HelpEvent(type="mentorhelp", key=key, name=name, msg=msg, msgid=msgid, previous_msgid=previous_msgid),
             )
             return self.SUCCESS_REPLY
 
@@ -421,8 +541,11 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_mhelp(
-                server.subtype, server.full_name, key, name, msg, key2, name2, msgid=msgid, reply_message_id=previous_msgid
+            await self.dispatch_event(
+                server,
+                PmEvent(
+                    type="mentorpm", key=key, name=name, key2=key2, name2=name2, msg=msg, msgid=msgid, previous_msgid=previous_msgid
+                ),
             )
             return self.SUCCESS_REPLY
 
@@ -430,24 +553,31 @@ class SpacebeeCentcom(commands.Cog):
         async def admin(
             msg: str, key: str = "", name: str = "", server=Depends(self.server_dep)
         ):
-            out = f"[{server.full_name}] "
-            if key or name:
-                out += f"{name} ({key}) "
-            out += msg
-            await server.subtype.channel_broadcast(self.bot, "admin_misc", out)
+            await self.dispatch_event(server, AdminLogEvent(type="admin", msg=msg, key=key, name=name))
             return self.SUCCESS_REPLY
 
         @app.get("/admin_debug")
         async def admin_debug(
             msg: str, key: str = "", name: str = "", server=Depends(self.server_dep)
         ):
-            out = f"[{server.full_name}] "
-            if key or name:
-                out += f"{name} ({key}) "
-            out += msg
-            await server.subtype.channel_broadcast(self.bot, "debug", out)
+            await self.dispatch_event(server, AdminLogEvent(type="admin_debug", msg=msg, key=key, name=name))
             return self.SUCCESS_REPLY
 
+        @app.post("/events/batch")
+        async def events_batch(batch: EventBatch, server=Depends(self.server_dep)):
+            """Relays several events of one server in order, see `events.py` for the payload."""
+            results = []
+            async with self.event_locks[server.full_name]:
+                for event in batch.events:
+                    try:
+                        await self.dispatch_event(server, event)
+                    except Exception as e:
+                        log.exception(f"Relaying {event.type} event of {server.full_name} failed")
+                        results.append({"status": "error", "errormsg": str(e) or type(e).__name__})
+                    else:
+                        results.append(self.SUCCESS_REPLY)
+            return {"status": "ok", "results": results}
+
         @app.get("/issue")
         async def admin_debug(
             title: str, body: str, secret: bool, server=Depends(self.server_dep)
@@ -461,6 +591,15 @@ class SpacebeeCentcom(commands.Cog):
             repo.create_issue(title, body)
             return self.SUCCESS_REPLY
 
+        @app.get("/unanswered")
+        async def unanswered(server=Depends(self.server_dep)):
+            channels = server.subtype.channels
+            return {
+                "status": "ok",
+                "ahelp": self.tickets.count(channels.get("ahelp", [])),
+                "mhelp": self.tickets.count(channels.get("mhelp", [])),
+            }
+
         @app.get("/link")
         async def link(key: str, ckey: str, code: str, server=Depends(self.server_dep)):
             if "-" not in code:
@@ -474,7 +613,7 @@ class SpacebeeCentcom(commands.Cog):
             target_verif = await self.config.user(user).link_verification()
             if target_verif != verification:
                 return {"status": "error", "response": "Wrong link verification code", "errormsg": f"Invalid link code verification '{code}'"}
-            ckeys_linked_account = await self.config.custom("ckey", ckey).discord_id()
+            ckeys_linked_account = await self.links.user_of(ckey)
             if ckeys_linked_account:
                 try:
                     await user.send(
@@ -484,8 +623,8 @@ class SpacebeeCentcom(commands.Cog):
                     pass
                 return {"status": "error", "response": "Your byond account is already linked to an account", "errormsg": f"User already linked"}
             await self.config.user(user).link_verification.set(None)
-            await self.config.user(user).linked_ckey.set(ckey)
-            await self.config.custom("ckey", ckey).discord_id.set(user_id)
+            await self.links.set_user_ckey(user_id, ckey)
+            await self.links.set_ckey_user(ckey, user_id)
             try:
                 await user.send(f"Account successfully linked to ckey `{ckey}`.")
             except:
@@ -503,12 +642,12 @@ class SpacebeeCentcom(commands.Cog):
         return "".join(c.lower() for c in text if c.isalnum())
 
     async def get_ckey(self, member: discord.Member):
-        return await self.config.user(member).linked_ckey()
+        return await self.links.ckey_of(member.id)
 
     @commands.command()
     async def link(self, ctx: commands.Context):
         """Links your Discord account with your BYOND username and gives you the Player role."""
-        current_ckey = await self.config.user(ctx.author).linked_ckey()
+        current_ckey = await self.links.ckey_of(ctx.author.id)
         if current_ckey:
             await ctx.send(
                 f"You are already linked to username `{current_ckey}`. If you wish to unlink please contact an administrator (ideally using the /report command)."
@@ -526,7 +665,7 @@ class SpacebeeCentcom(commands.Cog):
     @app_commands.command(name="link")
     async def slash_link(self, interaction: discord.Interaction):
         """Links your Discord account with your BYOND username and gives you the Player role."""
-        current_ckey = await self.config.user(interaction.user).linked_ckey()
+        current_ckey = await self.links.ckey_of(interaction.user.id)
         if current_ckey:
             await interaction.response.send_message(
                 f"You are already linked to username `{current_ckey}`. If you wish to unlink please contact an administrator (ideally using the /report command).",
@@ -543,7 +682,7 @@ class SpacebeeCentcom(commands.Cog):
     async def on_member_join(self, member: discord.Member):
         if member.guild.id != GUILD_ID:
             return
-        current_ckey = await self.config.user(member).linked_ckey()
+        current_ckey = await self.links.ckey_of(member.id)
         if current_ckey:
             rolestuff_cog = self.bot.get_cog("RoleStuff")
             player_added = False
@@ -558,10 +697,10 @@ class SpacebeeCentcom(commands.Cog):
     @checks.admin()
     async def unlinkother(self, ctx: commands.Context, target: discord.User):
         """Unlinks a Discord user from their ckey."""
-        current_ckey = await self.config.user(target).linked_ckey()
+        current_ckey = await self.links.ckey_of(target.id)
         if current_ckey:
-            await self.config.user(target).linked_ckey.set(None)
-            await self.config.custom("ckey", current_ckey).discord_id.set(None)
+            await self.links.set_user_ckey(target.id, None)
+            await self.links.set_ckey_user(current_ckey, None)
             await ctx.send(f"Unlinked ckey `{current_ckey}` from {target.mention}")
             guild = self.bot.get_guild(GUILD_ID)
             member = guild.get_member(target.id)
@@ -575,10 +714,10 @@ class SpacebeeCentcom(commands.Cog):
     async def unlinkotherckey(self, ctx: commands.Context, ckey: str):
         """Unlinks a ckey from their Discord account."""
         ckey = self.ckeyify(ckey)
-        user_id = await self.config.custom("ckey", ckey).discord_id()
+        user_id = await self.links.user_of(ckey)
         if user_id:
-            await self.config.user_from_id(user_id).linked_ckey.set(None)
-            await self.config.custom("ckey", ckey).discord_id.set(None)
+            await self.links.set_user_ckey(user_id, None)
+            await self.links.set_ckey_user(ckey, None)
             await ctx.send(f"Unlinked ckey `{ckey}` from {self.userid_mention(user_id)}")
         else:
             await ctx.send("They have no linked Discord account")
@@ -590,20 +729,20 @@ class SpacebeeCentcom(commands.Cog):
     ):
         """Directly links a Discord user to a BYOND ckey."""
         ckey = self.ckeyify(ckey)
-        current_ckey = await self.config.user(target).linked_ckey()
+        current_ckey = await self.links.ckey_of(target.id)
         if current_ckey:
             await ctx.send(
                 f"That user is already linked to a ckey `{current_ckey}`. Unlink it first."
             )
             return
-        ckeys_linked_account = await self.config.custom("ckey", ckey).discord_id()
+        ckeys_linked_account = await self.links.user_of(ckey)
         if ckeys_linked_account:
             await ctx.send(
                 f"That ckey is already linked to user <@{ckeys_linked_account}>."
             )
             return
-        await self.config.user(target).linked_ckey.set(ckey)
-        await self.config.custom("ckey", ckey).discord_id.set(target.id)
+        await self.links.set_user_ckey(target.id, ckey)
+        await self.links.set_ckey_user(ckey, target.id)
         msg = f"Linked ckey `{ckey}` to {target.mention}"
         if current_ckey:
             msg += f" (Their previous ckey was `{current_ckey}`)"
@@ -614,24 +753,34 @@ class SpacebeeCentcom(commands.Cog):
         await ctx.send(msg)
 
     async def user_to_ckey(self, user):
-        return await self.config.user(user).linked_ckey()
+        return await self.links.ckey_of(user.id)
     
     async def ckey_to_discord(self, ckey):
-        return await self.config.custom("ckey", ckey).discord_id()
+        return await self.links.user_of(ckey)
+
+    async def bulk_users_to_ckeys(self, users):
+        """Maps Discord users (or their ids) to their linked ckeys, `None` for unlinked ones."""
+        return await self.links.bulk_users_to_ckeys(
+            user if isinstance(user, int) else user.id for user in users
+        )
+
+    async def bulk_ckeys_to_discord(self, ckeys):
+        """Maps ckeys to the ids of their linked Discord accounts, `None` for unlinked ones."""
+        return await self.links.bulk_ckeys_to_users(ckeys)
 
     @commands.command()
     @checks.admin()
     async def checklink(self, ctx: commands.Context, target: Union[discord.User, str]):
         """Checks linked account of a Discord user."""
         if not isinstance(target, str):
-            current_ckey = await self.config.user(target).linked_ckey()
+            current_ckey = await self.links.ckey_of(target.id)
             if current_ckey:
                 await ctx.send(f"{target.mention}'s ckey is `{current_ckey}`")
             else:
                 await ctx.send(f"{target.mention} has not linked their account")
         else:
             ckey = self.ckeyify(target)
-            user_id = await self.config.custom("ckey", ckey).discord_id()
+            user_id = await self.links.user_of(ckey)
             if user_id:
                 await ctx.send(
                     f"`{ckey}`'s Discord account is {self.userid_mention(user_id)}"
@@ -657,7 +806,9 @@ class SpacebeeCentcom(commands.Cog):
         msgid = "Discord " + str(message.id)
         if type in ["ahelp", "mhelp"]:
             data["msgid"] = msgid
-        previous_msgid = self.message_to_id.get(replied_to_msg, None)
+        previous_msgid = None
+        if replied_to_msg is not None:
+            previous_msgid = self.relay_index.msgid_for(replied_to_msg.id)
         response = await goonservers.send_to_server_safe(
             server, data, message, to_dict=True
         )
@@ -703,8 +854,9 @@ class SpacebeeCentcom(commands.Cog):
                     exception=message.channel.id,
                 )
             if type in ["ahelp", "mhelp"]:
-                self.message_to_id[message] = msgid
-                self.id_to_messages[msgid].append(message)
+                self.relay_index.add(
+                    msgid, [RelayedMessage(message.channel.id, message.id, False)]
+                )
             return True
         return False
 
@@ -783,7 +935,7 @@ class SpacebeeCentcom(commands.Cog):
             await message.reply("Your account needs to be linked to use this")
             return
         msg = message.clean_content[1:].strip()
-        asay_servers = goonservers.channel_to_servers(message.channel.id, "asay")
+        asay_servers = goonservers.routing.servers_for(message.channel.id, "asay")
         target_channels = set()
         for server in asay_servers:
             target_channels |= set(server.subtype.channels["asay"])
@@ -802,13 +954,26 @@ class SpacebeeCentcom(commands.Cog):
         )
         return True
 
+    @commands.command()
+    @checks.is_owner()
+    async def benchmark_events(
+        self, ctx: commands.Context, server_id: str, events: int = 500, batch_size: int = 25
+    ):
+        """Compares relaying events one GET at a time with `/events/batch`, without sending anything to Discord."""
+        if self.get_server(server_id) is None:
+            await ctx.send("Unknown server.")
+            return
+        async with ctx.typing():
+            results = await benchmark_event_ingest(self, server_id, events, batch_size)
+        await ctx.send(box(format_ingest_benchmark(results)))
+
     @commands.command()
     async def unanswered(self, ctx: commands.Context):
         """
         Lists unanswered messages in this channel in reverse chronological order.
 
         You can react with \N{CLOSED MAILBOX WITH LOWERED FLAG} manually to a message to mark
-        it as resolved. Only messages from last 24 hours or since last bot restart are displayed.
+        it as resolved. Only messages from last 24 hours are displayed.
         """
         author_ckey = await self.get_ckey(ctx.author)
         if author_ckey is None:
@@ -818,25 +983,13 @@ class SpacebeeCentcom(commands.Cog):
         if ctx.channel.id not in goonservers.valid_channels:
             await ctx.reply("Wrong channel.")
             return False
-        unanswered_list = []
-        for msg in reversed(self.initiating_messages.values()):
-            if (datetime.datetime.now().replace(tzinfo=None) - msg.created_at.replace(tzinfo=None)) > datetime.timedelta(days = 1):
-                break
-            if await self.is_initiating_message(msg) and \
-                    not any(react.emoji == self.REPLIED_TO_EMOJI for react in msg.reactions) and \
-                    msg.channel == ctx.channel:
-                unanswered_list.append(msg)
-        def format_msg(msg):
-            msg_text = ""
-            if len(msg.embeds) > 0 and msg.embeds[0].description:
-                msg_text = msg.embeds[0].description
-                if len(msg_text) > 100:
-                    msg_text = msg_text[:97] + "..."
-            return msg.jump_url + " " + msg_text
+        unanswered_list = self.tickets.newest(ctx.channel.id)
+        def format_ticket(ticket):
+            return ctx.channel.get_partial_message(ticket.message_id).jump_url + " " + ticket.summary
         if len(unanswered_list) == 0:
             await ctx.reply("No unanswered messages!")
         else:
-            for page in pagify("\n".join(format_msg(msg) for msg in unanswered_list)):
+            for page in pagify("\n".join(format_ticket(ticket) for ticket in unanswered_list)):
                 await ctx.reply(page)
 
     async def process_discord_replies(self, message: discord.Message):
@@ -934,8 +1087,8 @@ class SpacebeeCentcom(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent) -> None:
-        if str(payload.emoji) == self.REPLIED_TO_EMOJI and payload.message_id in self.initiating_messages:
-            del self.initiating_messages[payload.message_id]
+        if str(payload.emoji) == self.REPLIED_TO_EMOJI:
+            self.tickets.close(payload.message_id)
 
 class UncoolHandlerView(ui.View):
     def __init__(self, bot, key, word, phrase, server_key):
@@ -1065,7 +1218,7 @@ async def check_link(interaction: discord.Interaction, target: discord.Member):
         await interaction.response.send_message("Something went horribly wrong oh no!", ephemeral=True)
         return
 
-    current_ckey = await cog.config.user(target).linked_ckey()
+    current_ckey = await cog.links.ckey_of(target.id)
     if not current_ckey:
         await interaction.response.send_message(f"{target.mention} has not linked their account", ephemeral=True)
     else:
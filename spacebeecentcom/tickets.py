@@ -0,0 +1,108 @@
+import collections
+import sqlite3
+import time
+from typing import *
+
+
+class Ticket(NamedTuple):
+    channel_id: int
+    message_id: int
+    msgid: Optional[str]
+    created: float
+    summary: str
+
+
+class TicketTracker:
+    """Open ADMINHELP/MENTORHELP messages per channel, kept up to date as they are sent and answered.
+
+    Tickets of a channel are kept in the order they were opened, so listing the newest ones
+    stops as soon as enough are found or an expired one is reached. Tickets older than
+    `MAX_AGE` seconds are dropped. The open tickets are stored in the given database too.
+    """
+
+    MAX_AGE = 24 * 3600
+    SUMMARY_LENGTH = 100
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        with self.db:
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS open_tickets (
+                    message_id INTEGER PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    msgid TEXT,
+                    created REAL NOT NULL,
+                    summary TEXT NOT NULL
+                )"""
+            )
+            self.db.execute("DELETE FROM open_tickets WHERE created < ?", (self.cutoff(),))
+        self.by_channel = collections.defaultdict(collections.OrderedDict)
+        self.channel_of = {}
+        rows = self.db.execute(
+            "SELECT channel_id, message_id, msgid, created, summary FROM open_tickets ORDER BY created"
+        )
+        for row in rows:
+            self.track(Ticket(*row))
+
+    def cutoff(self) -> float:
+        return time.time() - self.MAX_AGE
+
+    def track(self, ticket: Ticket):
+        self.by_channel[ticket.channel_id][ticket.message_id] = ticket
+        self.channel_of[ticket.message_id] = ticket.channel_id
+
+    def open(self, channel_id: int, message_id: int, msgid: Optional[str], created: float, summary: str):
+        if len(summary) > self.SUMMARY_LENGTH:
+            summary = summary[: self.SUMMARY_LENGTH - 3] + "..."
+        ticket = Ticket(channel_id, message_id, msgid, created, summary)
+        self.track(ticket)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO open_tickets VALUES (?, ?, ?, ?, ?)",
+                (message_id, channel_id, msgid, created, summary),
+            )
+        self.expire(channel_id)
+
+    def close(self, message_id: int) -> bool:
+        """Marks the ticket opened by a message as answered, returns whether it was open."""
+        channel_id = self.channel_of.pop(message_id, None)
+        if channel_id is None:
+            return False
+        del self.by_channel[channel_id][message_id]
+        with self.db:
+            self.db.execute("DELETE FROM open_tickets WHERE message_id = ?", (message_id,))
+        return True
+
+    def expire(self, channel_id: int):
+        tickets = self.by_channel[channel_id]
+        cutoff = self.cutoff()
+        expired = []
+        while tickets:
+            ticket = next(iter(tickets.values()))
+            if ticket.created >= cutoff:
+                break
+            tickets.popitem(last=False)
+            del self.channel_of[ticket.message_id]
+            expired.append((ticket.message_id,))
+        if expired:
+            with self.db:
+                self.db.executemany("DELETE FROM open_tickets WHERE message_id = ?", expired)
+
+    def newest(self, channel_id: int, limit: Optional[int] = None) -> List[Ticket]:
+        """Returns the open tickets of a channel, newest first."""
+        self.expire(channel_id)
+        result = []
+        for ticket in reversed(self.by_channel[channel_id].values()):
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(ticket)
+        return result
+
+    def count(self, channel_ids: Iterable[int]) -> int:
+        """Number of distinct open tickets across channels, a ticket relayed to several of them counts once."""
+        keys = set()
+        for channel_id in channel_ids:
+            self.expire(channel_id)
+            for ticket in self.by_channel[channel_id].values():
+                keys.add(ticket.msgid or ticket.message_id)
+        return len(keys)
@@ -26,9 +26,6 @@ import yt_dlp
 import base64
 from PIL import Image
 import contextlib
-import os
-if os.name != 'nt':
-    import xattr
 
 @contextlib.asynccontextmanager
 async def empty_context_manager():
@@ -98,34 +95,33 @@ class SpacebeeCommands(commands.Cog):
         """Locates a ckey on all servers."""
         who = self.ckeyify(who)
         goonservers = self.bot.get_cog("GoonServers")
+        worldtopic = self.bot.get_cog("WorldTopic")
         servers = [s for s in goonservers.servers if s.type == "goon"]
-        futures = [
-            asyncio.Task(goonservers.send_to_server(s, "status", to_dict=True))
-            for s in servers
-        ]
+        results = {}
         message = None
-        done, pending = [], futures
         old_text = None
-        while pending:
-            when = asyncio.FIRST_COMPLETED if message else asyncio.ALL_COMPLETED
-            done, pending = await asyncio.wait(pending, timeout=0.2, return_when=when)
-            if not done:
+        async for server, result in goonservers.fan_out(servers, goonservers.get_status):
+            if isinstance(result, BaseException) or result is None:
+                continue
+            try:
+                results[server] = worldtopic.indexed_values(result, "player")
+            except (KeyError, ValueError):
                 continue
             lines = []
-            for server, f in zip(servers, futures):
-                if f.done() and f.exception() is None:
-                    result = f.result()
-                    server_found = []
-                    for k, v in result.items():
-                        if k.startswith("player") and who in self.ckeyify(v):
-                            server_found.append(v)
-                    if not server_found:
-                        continue
-                    if len(server_found) == 1:
-                        lines.append(f"{server.full_name}: **{server_found[0]}**")
-                    else:
-                        lines.append(f"{server.full_name}:")
-                        lines.extend(f"\t**{p}**" for p in server_found)
+            for server in servers:
+                if server not in results:
+                    continue
+                server_found = []
+                for player in results[server]:
+                    if who in self.ckeyify(player):
+                        server_found.append(player)
+                if not server_found:
+                    continue
+                if len(server_found) == 1:
+                    lines.append(f"{server.full_name}: **{server_found[0]}**")
+                else:
+                    lines.append(f"{server.full_name}:")
+                    lines.extend(f"\t**{p}**" for p in server_found)
             if not lines:
                 continue
             text = "\n".join(lines)
@@ -159,19 +155,18 @@ class SpacebeeCommands(commands.Cog):
             await ctx.send(page)
 
     @commands.command()
-    async def players(self, ctx: commands.Context, server_id: str):
+    async def players(self, ctx: commands.Context, server_id: str, refresh: bool = False):
         """Lists players on a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id, "status", ctx.message, to_dict=True
+        response = await goonservers.get_status_safe(
+            server_id, ctx.message, force_refresh=refresh
         )
         if response is None:
             return
-        players = []
+        worldtopic = self.bot.get_cog("WorldTopic")
         try:
-            for i in range(int(response["players"])):
-                players.append(response[f"player{i}"])
-        except KeyError:
+            players = worldtopic.indexed_values(response, "player")
+        except (KeyError, ValueError):
             await ctx.message.reply("That server is not responding correctly.")
             return
         players.sort()
@@ -182,30 +177,31 @@ class SpacebeeCommands(commands.Cog):
 
     @checks.admin()
     @commands.command()
-    async def playermentions(self, ctx: commands.Context, server_id: str):
+    async def playermentions(self, ctx: commands.Context, server_id: str, refresh: bool = False):
         """Lists Discord mentions of players on a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
         spacebeecentcom = self.bot.get_cog("SpacebeeCentcom")
         nightshadewhitelist = self.bot.get_cog("NightshadeWhitelist")
-        response = await goonservers.send_to_server_safe(
-            server_id, "status", ctx.message, to_dict=True
+        response = await goonservers.get_status_safe(
+            server_id, ctx.message, force_refresh=refresh
         )
         if response is None:
             return
-        players = []
+        worldtopic = self.bot.get_cog("WorldTopic")
         try:
-            for i in range(int(response["players"])):
-                players.append(response[f"player{i}"])
-        except KeyError:
+            players = worldtopic.indexed_values(response, "player")
+        except (KeyError, ValueError):
             await ctx.message.reply("That server is not responding correctly.")
             return
         players.sort()
         if not players:
             await ctx.message.reply("No players.")
+        user_ids = await spacebeecentcom.bulk_ckeys_to_discord(players)
+        ns_user_ids = await nightshadewhitelist.bulk_ckeys_to_discord(players)
         output = []
         for player in players:
-            user_id = await spacebeecentcom.config.custom("ckey", player).discord_id()
-            ns_user_id = await nightshadewhitelist.config.custom("ckey", player).discord_id()
+            user_id = user_ids[player]
+            ns_user_id = ns_user_ids[player]
             if user_id and ns_user_id and ns_user_id == user_id:
                 output.append(f"{player} - <@{user_id}> (NS & G)")
             elif user_id and ns_user_id and ns_user_id != user_id:
@@ -509,21 +505,18 @@ RTT: {elapsed * 1000:.2f}ms"""
 
     async def youtube_play(self, ctx: commands.Context, url: str, server_id: str):
         url = url.lstrip("<").rstrip(">")
-        generalapi = self.bot.get_cog("GeneralApi")
-        file_folder = generalapi.static_path / "youtube"
-        file_folder.mkdir(exist_ok=True)
+        media_store = self.bot.get_cog("GeneralApi").media
         file_name = url
         if "watch?v=" in file_name:
             file_name = file_name.split("watch?v=")[1]
         else:
             file_name = self.ckeyify(file_name)
-        tmp_file_name = file_name + ".webm"
-        play_file_name = file_name + ".mp3"
-        tmp_file_path = file_folder / tmp_file_name
-        play_file_path = file_folder / play_file_name
-        alt_play_file_path = file_folder / (tmp_file_name + ".mp3")
-        info = None
-        if not play_file_path.is_file():
+        media_key = f"youtube:{file_name}"
+        media = media_store.get(media_key)
+        if media is None:
+            tmp_file_path = media_store.incoming / (file_name + ".webm")
+            play_file_path = media_store.incoming / (file_name + ".mp3")
+            alt_play_file_path = media_store.incoming / (file_name + ".webm.mp3")
             postprocessors = [
                 {
                     "key": "FFmpegExtractAudio",
@@ -531,9 +524,6 @@ RTT: {elapsed * 1000:.2f}ms"""
                     "preferredquality": "8",
                     "nopostoverwrites": False,
                 },
-                {
-                    "key": "XAttrMetadata",
-                }
             ]
             ydl_opts = {
                 "format": "worstaudio/worst",
@@ -555,18 +545,12 @@ RTT: {elapsed * 1000:.2f}ms"""
                 await asyncio.get_running_loop().run_in_executor(
                     self.executor, ydl.download, [url]
                 )
-        if alt_play_file_path.is_file():
-            os.rename(alt_play_file_path, play_file_path)
-        if not play_file_path.is_file():
-            return None
-        title = info["title"] if info else None
-        if title is None and os.name != 'nt':
-            try:
-                title = xattr.getxattr(str(play_file_path), "user.dublincore.title").decode("utf8")
-            except:
-                title = file_name
-        else:
-            title = file_name
+            if alt_play_file_path.is_file():
+                os.rename(alt_play_file_path, play_file_path)
+            if not play_file_path.is_file():
+                return None
+            media = await media_store.add_file(play_file_path, key=media_key, title=info.get("title"))
+        title = media.title or file_name
         goonservers = self.bot.get_cog("GoonServers")
         response = await goonservers.send_to_server_safe(
             server_id,
@@ -575,7 +559,7 @@ RTT: {elapsed * 1000:.2f}ms"""
                 "data": json.dumps(
                     {
                         "key": ctx.message.author.name + " (Discord)",
-                        "file": f"https://medass.pali.link/static/youtube/{play_file_name}",
+                        "file": f"https://medass.pali.link/media/{media.name}",
                         "duration": "?",
                         "title": title,
                     }
@@ -647,21 +631,22 @@ RTT: {elapsed * 1000:.2f}ms"""
     @commands.command()
     async def medspeech(self, ctx: commands.Context, server_id: str, *, text: str):
         """Speech synthesis on a given Goonstation server."""
-        generalapi = self.bot.get_cog("GeneralApi")
-        speech_folder = generalapi.static_path / "speech"
-        speech_folder.mkdir(exist_ok=True)
-        file_name = f"{self.ckeyify(text)[:128]}.mp3"
-        file_path = speech_folder / file_name
-        if not file_path.is_file():
+        media_store = self.bot.get_cog("GeneralApi").media
+        file_name = self.ckeyify(text)[:128]
+        media_key = f"speech:{file_name}"
+        media = media_store.get(media_key)
+        if media is None:
+            file_path = media_store.incoming / f"{file_name}.mp3"
             p = await asyncio.create_subprocess_shell(
-                "text2wave -scale 3 | ffmpeg -i - -vn -ar 44100 -ac 2 -b:a 64k "
+                "text2wave -scale 3 | ffmpeg -y -i - -vn -ar 44100 -ac 2 -b:a 64k "
                 + str(file_path),
                 stdin=asyncio.subprocess.PIPE,
             )
             await p.communicate(text.encode("utf8"))
-        if not file_path.is_file():
-            await ctx.send("Could not generate sound.")
-            return
+            if not file_path.is_file():
+                await ctx.send("Could not generate sound.")
+                return
+            media = await media_store.add_file(file_path, key=media_key, title=text)
         goonservers = self.bot.get_cog("GoonServers")
         response = await goonservers.send_to_server_safe(
             server_id,
@@ -670,7 +655,7 @@ RTT: {elapsed * 1000:.2f}ms"""
                 "data": json.dumps(
                     {
                         "key": ctx.message.author.name + " (Discord)",
-                        "file": f"http://medass.pali.link/static/speech/{file_name}",
+                        "file": f"http://medass.pali.link/media/{media.name}",
                         "duration": "?",
                         "title": text,
                     }
@@ -693,14 +678,14 @@ RTT: {elapsed * 1000:.2f}ms"""
         )
         if response is None:
             return
-        admins = []
+        worldtopic = self.bot.get_cog("WorldTopic")
         try:
-            for i in range(int(response["admins"])):
-                admin = response[f"admin{i}"]
-                if admin.startswith("~"):
-                    continue
-                admins.append(admin)
-        except KeyError:
+            admins = [
+                admin
+                for admin in worldtopic.indexed_values(response, "admin")
+                if not admin.startswith("~")
+            ]
+        except (KeyError, ValueError):
             await ctx.message.reply("That server is not responding correctly.")
             return
         admins.sort()
@@ -719,12 +704,10 @@ RTT: {elapsed * 1000:.2f}ms"""
         )
         if response is None:
             return
-        mentors = []
+        worldtopic = self.bot.get_cog("WorldTopic")
         try:
-            for i in range(int(response["mentors"])):
-                mentor = response[f"mentor{i}"]
-                mentors.append(mentor)
-        except KeyError:
+            mentors = worldtopic.indexed_values(response, "mentor")
+        except (KeyError, ValueError):
             await ctx.message.reply("That server is not responding correctly.")
             return
         mentors.sort()
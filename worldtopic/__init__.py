@@ -3,4 +3,6 @@ from .worldtopic import WorldTopic
 
 
 async def setup(bot: Red):
-    await bot.add_cog(WorldTopic(bot))
+    cog = WorldTopic(bot)
+    await bot.add_cog(cog)
+    await cog.init()
@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import time
+import urllib.parse
+from collections import OrderedDict
+from typing import *
+from .fakebyond import FakeByondServer
+from .loadtest import fake_status
+from .params import parse_params, encode_params, indexed_values
+
+# a string frame carries its type byte and a null terminator besides the text itself
+FRAME_BENCHMARK_SIZES = (1024, 16 * 1024, 0xFFFF)
+
+
+async def legacy_send(worldtopic, addr_port: Tuple[str, int], msg: str) -> str:
+    """The old bytes-concatenating response reader, kept only as a benchmark baseline."""
+    reader, writer = await asyncio.open_connection(*addr_port)
+    writer.write(worldtopic.encode_packet(msg))
+    await writer.drain()
+    response = b""
+    target_length = 0
+    while len(response) < 4 or len(response) < target_length:
+        new_bytes = await reader.read(0xFFFF)
+        if not new_bytes:
+            raise TimeoutError("Connection closed before the full response was received.")
+        response += new_bytes
+        if not target_length and len(response) >= 4:
+            target_length = int.from_bytes(response[2:4], byteorder="big") + 4
+    writer.close()
+    await writer.wait_closed()
+    return response[5:].strip(b"\x00").decode("utf8")
+
+
+async def benchmark_frame_reader(worldtopic, iterations: int = 100, sizes=FRAME_BENCHMARK_SIZES):
+    """Returns `(frame size, framed reader bytes/s, legacy reader bytes/s)` for each size."""
+    results = []
+    for size in sizes:
+        text = "x" * (size - 2)
+        server = FakeByondServer(lambda msg: text)
+        addr_port = await server.start()
+        try:
+            throughputs = []
+            for send in (worldtopic._send, functools.partial(legacy_send, worldtopic)):
+                start_time = time.perf_counter()
+                for _ in range(iterations):
+                    response = await send(addr_port, "status")
+                    if len(response) != len(text):
+                        raise ValueError(f"Truncated response of {len(response)} bytes.")
+                elapsed = time.perf_counter() - start_time
+                throughputs.append(size * iterations / elapsed)
+            results.append((size, *throughputs))
+        finally:
+            await server.close()
+    return results
+
+
+def format_frame_benchmark(results) -> str:
+    lines = [f"{'size':>8} {'framed':>12} {'legacy':>12} {'speedup':>8}"]
+    for size, framed, legacy in results:
+        lines.append(
+            f"{size:>8} {framed / 2**20:>9.1f}MB/s {legacy / 2**20:>9.1f}MB/s {framed / legacy:>7.2f}x"
+        )
+    return "\n".join(lines)
+
+
+def legacy_params_to_dict(params: str):
+    """The old params parser, kept only as a benchmark baseline."""
+    result = OrderedDict()
+    for pair in params.split("&"):
+        key, *rest = pair.split("=")
+        value = urllib.parse.unquote_plus(rest[0]) if rest else None
+        result[key] = value
+    return result
+
+
+def legacy_iterable_to_params(iterable):
+    """The old params encoder, kept only as a benchmark baseline."""
+    if isinstance(iterable, (str, int, float)):
+        return iterable
+    result_parts = []
+    for key in iterable:
+        value = None
+        if not isinstance(key, int):
+            try:
+                value = iterable[key]
+            except (KeyError, IndexError, TypeError):
+                pass
+        part = urllib.parse.quote_plus(str(key))
+        if value is not None:
+            part += "=" + urllib.parse.quote_plus(str(value))
+        result_parts.append(part)
+    return "&".join(result_parts)
+
+
+def legacy_player_list(params):
+    return [params[f"player{i}"] for i in range(int(params["players"]))]
+
+
+def benchmark_params_codec(iterations: int = 1000, players: int = 80):
+    """Returns `(case, new codec seconds per call, legacy seconds per call)` for each case."""
+    status = fake_status(players)
+    outgoing = {"type": "pm", "nick": "Some Admin", "msg": "hello there", "target": "somebody", "auth": "0123abcd"}
+    cases = [
+        ("parse status", lambda: parse_params(status), lambda: legacy_params_to_dict(status)),
+        (
+            "parse lazy + count",
+            lambda: parse_params(status, lazy=True)["players"],
+            lambda: legacy_params_to_dict(status)["players"],
+        ),
+        (
+            "player list",
+            lambda: indexed_values(parse_params(status), "player"),
+            lambda: legacy_player_list(legacy_params_to_dict(status)),
+        ),
+        ("encode pm", lambda: encode_params(outgoing), lambda: legacy_iterable_to_params(outgoing)),
+    ]
+    if parse_params(status) != legacy_params_to_dict(status):
+        raise ValueError("Codec output differs from the legacy parser.")
+    if encode_params(outgoing) != legacy_iterable_to_params(outgoing):
+        raise ValueError("Codec output differs from the legacy encoder.")
+    results = []
+    for name, new, legacy in cases:
+        timings = []
+        for function in (new, legacy):
+            start_time = time.perf_counter()
+            for _ in range(iterations):
+                function()
+            timings.append((time.perf_counter() - start_time) / iterations)
+        results.append((name, *timings))
+    return results
+
+
+def format_params_benchmark(results) -> str:
+    lines = [f"{'case':<20} {'codec':>10} {'legacy':>10} {'speedup':>8}"]
+    for name, new, legacy in results:
+        lines.append(
+            f"{name:<20} {new * 1e6:>8.1f}us {legacy * 1e6:>8.1f}us {legacy / new:>7.2f}x"
+        )
+    return "\n".join(lines)
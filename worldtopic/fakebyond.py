@@ -0,0 +1,85 @@
+import asyncio
+import struct
+from typing import *
+
+
+class ByondVariant(str):
+    """A string response sent in the 0x04 variant frame format instead of a plain string."""
+
+
+class FakeByondServer:
+    """Local stand-in for a DreamDaemon /world/Topic() listener, used for benchmarking.
+
+    `handler` gets the topic string (without the leading "?") and returns the
+    response: a `str`, a `ByondVariant`, a `float`, `None` or already encoded frame `bytes`.
+
+    `behavior` makes the server misbehave the way real ones do: `SLOW` answers after
+    `delay` seconds, `HALF_OPEN` accepts connections and never answers and `RESET`
+    aborts every connection without answering.
+    """
+
+    NORMAL = "normal"
+    SLOW = "slow"
+    HALF_OPEN = "half-open"
+    RESET = "reset"
+    VARIANT_HEADER_LENGTH = 13
+
+    def __init__(
+        self, handler: Callable[[str], Any], behavior: str = NORMAL, delay: float = 0
+    ):
+        self.handler = handler
+        self.behavior = behavior
+        self.delay = delay
+        self.server = None
+        self.requests = 0
+
+    @classmethod
+    def encode_response(cls, value) -> bytes:
+        if isinstance(value, bytes):
+            payload = value
+        elif value is None:
+            payload = b"\x00"
+        elif isinstance(value, (int, float)):
+            payload = b"\x2a" + struct.pack("f", value)
+        elif isinstance(value, ByondVariant):
+            payload = (
+                b"\x04"
+                + b"\x00" * (cls.VARIANT_HEADER_LENGTH - 1)
+                + str(value).encode("utf8")
+                + b"\x00"
+            )
+        else:
+            payload = b"\x06" + str(value).encode("utf8") + b"\x00"
+        return b"\x00\x83" + len(payload).to_bytes(2, byteorder="big") + payload
+
+    async def handle_connection(self, reader, writer):
+        try:
+            header = await reader.readexactly(4)
+            length = int.from_bytes(header[2:4], byteorder="big")
+            body = await reader.readexactly(length)
+            self.requests += 1
+            if self.behavior == self.RESET:
+                writer.transport.abort()
+                return
+            if self.behavior == self.HALF_OPEN:
+                await reader.read()  # until the client gives up
+                return
+            if self.behavior == self.SLOW:
+                await asyncio.sleep(self.delay)
+            msg = body.strip(b"\x00").decode("utf8").lstrip("?")
+            writer.write(self.encode_response(self.handler(msg)))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,98 @@
+import collections
+import time
+from typing import *
+
+
+class CircuitOpenError(ConnectionRefusedError):
+    """Raised without connecting when the circuit breaker of a server is open."""
+
+
+class ServerHealth:
+    """Rolling latency statistics and circuit breaker state of a single (host, port).
+
+    The breaker opens after `FAILURE_THRESHOLD` consecutive connection failures and
+    rejects requests for `open_duration` seconds, after which a single probe request
+    is let through (half-open). A successful probe closes the breaker again, a failed
+    one reopens it for twice as long.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    FAILURE_THRESHOLD = 3
+    OPEN_DURATION = 30
+    OPEN_DURATION_MAX = 300
+    LATENCY_SAMPLES = 64
+    MIN_LATENCY_SAMPLES = 8
+    MIN_TIMEOUT = 2
+    TIMEOUT_PERCENTILE = 95
+    TIMEOUT_LATENCY_FACTOR = 4
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.LATENCY_SAMPLES)
+        )
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.open_duration = self.OPEN_DURATION
+        self.probe_in_flight = False
+
+    def percentile(self, percent: float, topic_type: Optional[str] = None) -> Optional[float]:
+        if topic_type is None:
+            samples = sorted(l for ls in self.latencies.values() for l in ls)
+        else:
+            samples = sorted(self.latencies.get(topic_type, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[index]
+
+    def timeout(self, topic_type: Optional[str], default: float) -> float:
+        """Timeout derived from the latency history of this kind of topic, at most `default`."""
+        if len(self.latencies.get(topic_type, ())) < self.MIN_LATENCY_SAMPLES:
+            return default
+        latency = self.percentile(self.TIMEOUT_PERCENTILE, topic_type)
+        return min(default, max(self.MIN_TIMEOUT, latency * self.TIMEOUT_LATENCY_FACTOR))
+
+    @property
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0
+        return max(0, self.opened_at + self.open_duration - time.monotonic())
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self.retry_in <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, topic_type: Optional[str] = None, latency: Optional[float] = None):
+        if latency is not None:
+            self.latencies[topic_type].append(latency)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_duration = self.OPEN_DURATION
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            self.open(min(self.open_duration * 2, self.OPEN_DURATION_MAX))
+        elif self.consecutive_failures >= self.FAILURE_THRESHOLD:
+            self.open(self.OPEN_DURATION)
+
+    def record_abandoned(self):
+        """The request neither succeeded nor failed (e.g. it was cancelled)."""
+        self.probe_in_flight = False
+
+    def open(self, duration: float):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.open_duration = duration
+        self.probe_in_flight = False
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from typing import *
+from .fakebyond import FakeByondServer, ByondVariant
+
+LOAD_TEST_PLAYERS = 80
+LOAD_TEST_FAILURE_TIMEOUT = 0.5
+
+
+class LoadResult(NamedTuple):
+    name: str
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def fake_status(players: int = LOAD_TEST_PLAYERS) -> str:
+    """A `status` topic response shaped like a busy Goonstation server's."""
+    parts = [
+        "version=Goonstation+13+%28r12345%29",
+        "mode=secret",
+        "respawn=0",
+        "enter=1",
+        "ai=1",
+        "host=",
+        "station_name=Space+Station+13",
+        "map_name=Cogmap+2",
+        "elapsed=3723",
+        "shuttle_time=360",
+        f"players={players}",
+    ]
+    parts += [f"player{i}=Player+{i}" for i in range(players)]
+    return "&".join(parts)
+
+
+async def run_load(
+    name: str, request: Callable[[], Awaitable], requests: int, concurrency: int
+) -> LoadResult:
+    """Awaits `request()` `requests` times with at most `concurrency` requests in flight.
+
+    Latency is recorded for failed requests too, a request that times out is slow after all.
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start_time = time.perf_counter()
+            try:
+                result = await request()
+            except Exception:
+                errors += 1
+            else:
+                if isinstance(result, list):
+                    errors += sum(isinstance(r, Exception) for r in result)
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, requests))])
+    return LoadResult(name, requests, errors, time.perf_counter() - start_time, latencies)
+
+
+def forget_servers(worldtopic, addr_ports):
+    """Drops the per-server state WorldTopic collected about the fake servers."""
+    for addr_port in addr_ports:
+        worldtopic.health.pop(tuple(addr_port), None)
+        worldtopic.schedulers.pop(tuple(addr_port), None)
+
+
+async def load_test_world_topic(worldtopic, requests: int = 200, concurrency: int = 16):
+    """Drives `WorldTopic.send` against fake servers of every response type and failure mode."""
+    scenarios = [
+        ("string", FakeByondServer(lambda msg: fake_status()), "status", None),
+        ("variant", FakeByondServer(lambda msg: ByondVariant(fake_status())), "status", None),
+        ("float", FakeByondServer(lambda msg: 42.0), "ping", None),
+        ("null", FakeByondServer(lambda msg: None), "ping", None),
+        ("pm", FakeByondServer(lambda msg: 1.0), "type=pm&msg=hello", None),
+        (
+            "slow",
+            FakeByondServer(lambda msg: fake_status(), FakeByondServer.SLOW, delay=0.05),
+            "status",
+            None,
+        ),
+        (
+            "half-open",
+            FakeByondServer(lambda msg: None, FakeByondServer.HALF_OPEN),
+            "ping",
+            LOAD_TEST_FAILURE_TIMEOUT,
+        ),
+        ("reset", FakeByondServer(lambda msg: None, FakeByondServer.RESET), "ping", None),
+    ]
+    results = []
+    for name, server, msg, timeout in scenarios:
+        addr_port = await server.start()
+        try:
+            results.append(
+                await run_load(
+                    name,
+                    lambda: worldtopic.send(addr_port, msg, timeout=timeout),
+                    requests,
+                    concurrency,
+                )
+            )
+        finally:
+            forget_servers(worldtopic, [addr_port])
+            await server.close()
+    return results
+
+
+async def load_test_goonservers(
+    goonservers, worldtopic, requests: int = 200, concurrency: int = 16, servers: int = 8
+):
+    """Drives the GoonServers fan-out and status paths against a group of ad-hoc fake servers."""
+    fake_servers = [FakeByondServer(lambda msg: fake_status()) for _ in range(servers)]
+    addr_ports = [await server.start() for server in fake_servers]
+    targets = [goonservers.resolve_server(f"{addr}:{port}") for addr, port in addr_ports]
+    try:
+        return [
+            await run_load(
+                f"send_to_servers x{servers}",
+                lambda: goonservers.send_to_servers(targets, "ping"),
+                requests,
+                concurrency,
+            ),
+            await run_load(
+                "get_status_info",
+                lambda: goonservers.get_status_info(targets[0], force_refresh=True),
+                requests,
+                concurrency,
+            ),
+        ]
+    finally:
+        forget_servers(worldtopic, addr_ports)
+        for server in fake_servers:
+            await server.close()
+
+
+def format_load_results(results: Iterable[LoadResult]) -> str:
+    def ms(value):
+        return f"{value * 1000:.1f}" if value is not None else "-"
+
+    lines = [
+        f"{'scenario':<20} {'reqs':>5} {'errs':>5} {'req/s':>8} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result.name:<20} {result.requests:>5} {result.errors:>5} {result.throughput:>8.1f}"
+            f" {ms(result.percentile(50)):>7} {ms(result.percentile(95)):>7} {ms(result.percentile(99)):>7}"
+        )
+    return "\n".join(lines)
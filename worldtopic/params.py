@@ -0,0 +1,114 @@
+import functools
+import re
+import urllib.parse
+from typing import *
+
+# characters quote_plus leaves alone, strings made only of these need no encoding
+_SAFE_RE = re.compile(r"[A-Za-z0-9_.\-~]*")
+
+
+def decode_value(value: str) -> str:
+    if "%" in value or "+" in value:
+        return urllib.parse.unquote_plus(value)
+    return value
+
+
+@functools.lru_cache(maxsize=1024)
+def encode_key(key: str) -> str:
+    """Keys repeat across requests (`type`, `msg`, `auth`, ...) so their encoding is cached."""
+    return encode_value(key)
+
+
+def encode_value(value: str) -> str:
+    if _SAFE_RE.fullmatch(value):
+        return value
+    return urllib.parse.quote_plus(value)
+
+
+class LazyParams(Mapping[str, Optional[str]]):
+    """Parsed topic params whose values are only unquoted when first read."""
+
+    __slots__ = ("raw", "decoded")
+
+    def __init__(self, raw: Dict[str, Optional[str]]):
+        self.raw = raw
+        self.decoded = {}
+
+    def __getitem__(self, key):
+        try:
+            return self.decoded[key]
+        except KeyError:
+            pass
+        value = self.raw[key]
+        if value is not None:
+            value = decode_value(value)
+        self.decoded[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def __repr__(self):
+        return f"LazyParams({dict(self)!r})"
+
+
+def parse_params(params: str, lazy: bool = False) -> Mapping[str, Optional[str]]:
+    """Parses a topic query string in one pass, keys without `=` map to `None`.
+
+    Keys are kept as sent, values are unquoted (only the ones that contain `%` or `+`
+    need it). With `lazy` the unquoting is deferred until a value is read.
+    """
+    result = {}
+    for pair in params.split("&"):
+        key, separator, value = pair.partition("=")
+        result[key] = value if separator else None
+    if lazy:
+        return LazyParams(result)
+    for key, value in result.items():
+        if value is not None and ("%" in value or "+" in value):
+            result[key] = urllib.parse.unquote_plus(value)
+    return result
+
+
+def encode_params(iterable):
+    """Encodes a mapping (or an iterable of keys) as a topic query string.
+
+    Strings and numbers are passed through as they are.
+    """
+    if isinstance(iterable, (str, int, float)):
+        return iterable
+    result_parts = []
+    for key in iterable:
+        value = None
+        if not isinstance(key, int):
+            try:
+                value = iterable[key]
+            except (KeyError, IndexError, TypeError):
+                pass
+        part = encode_key(str(key))
+        if value is not None:
+            part += "=" + encode_value(str(value))
+        result_parts.append(part)
+    return "&".join(result_parts)
+
+
+def indexed_values(params: Mapping[str, Optional[str]], prefix: str, count_key: Optional[str] = None):
+    """Returns the list a topic sends as `<count_key>=N&<prefix>0=...&<prefix>N-1=...`.
+
+    `count_key` defaults to the plural of `prefix` (`players` for `player`). Raises
+    `KeyError` or `ValueError` if the response is malformed, including keys sent without a value.
+    """
+    count_key = count_key or prefix + "s"
+    count = params[count_key]
+    if count is None:
+        raise ValueError(f"{count_key} sent without a value.")
+    values = [params[f"{prefix}{i}"] for i in range(int(count))]
+    if None in values:
+        raise ValueError(f"{prefix}{values.index(None)} sent without a value.")
+    return values
@@ -0,0 +1,123 @@
+import asyncio
+import errno
+import ipaddress
+import socket
+import time
+from typing import *
+
+
+class CachedAddress(NamedTuple):
+    address: Optional[str]
+    error: Optional[socket.gaierror]
+    expires: float
+    stale_until: float
+
+
+class AddressCache:
+    """Caches hostname lookups so topics don't go through the system resolver every time.
+
+    Successful lookups are kept for `TTL` seconds, failed ones for `NEGATIVE_TTL`. An expired
+    address is still used for up to `STALE_GRACE` more seconds while it is looked up again in
+    the background, so a slow or flaky resolver never delays a topic that has worked before.
+
+    Failed connections only drop an address when the error says it is unreachable. Refused
+    connections and timeouts usually mean the server is down, so the address is only looked up
+    again in the background after `FAILURES_BEFORE_REFRESH` of them in a row.
+    """
+
+    TTL = 300
+    NEGATIVE_TTL = 30
+    STALE_GRACE = 3600
+    FAILURES_BEFORE_REFRESH = 5
+    WRONG_ADDRESS_ERRNOS = frozenset([errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EADDRNOTAVAIL])
+
+    def __init__(self):
+        self.entries = {}
+        self.failures = {}
+        self.lookups = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_ip_address(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return True
+
+    async def resolve(self, host: str, port: int) -> str:
+        if self.is_ip_address(host):
+            return host
+        entry = self.entries.get(host)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.expires:
+                self.hits += 1
+                if entry.error is not None:
+                    raise entry.error
+                return entry.address
+            if entry.address is not None and now < entry.stale_until:
+                self.hits += 1
+                self.lookup(host, port)
+                return entry.address
+        self.misses += 1
+        return await asyncio.shield(self.lookup(host, port))
+
+    def lookup(self, host: str, port: int) -> asyncio.Task:
+        """Starts a lookup of `host` unless one is already running."""
+        task = self.lookups.get(host)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(host, port))
+            self.lookups[host] = task
+
+            def done_callback(task):
+                if self.lookups.get(host) is task:
+                    del self.lookups[host]
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(done_callback)
+        return task
+
+    async def _lookup(self, host: str, port: int) -> str:
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            previous = self.entries.get(host)
+            if previous is not None and previous.address is not None and now < previous.stale_until:
+                # keep using the last known address rather than failing outright
+                self.entries[host] = previous._replace(expires=now + self.NEGATIVE_TTL)
+                return previous.address
+            self.entries[host] = CachedAddress(None, e, now + self.NEGATIVE_TTL, now)
+            raise
+        address = infos[0][4][0]
+        self.entries[host] = CachedAddress(
+            address, None, now + self.TTL, now + self.TTL + self.STALE_GRACE
+        )
+        return address
+
+    def invalidate(self, host: str):
+        """Forgets the address of `host`, the next topic waits for a fresh lookup."""
+        self.entries.pop(host, None)
+        self.failures.pop(host, None)
+
+    def connect_failed(self, host: str, error: OSError):
+        if self.is_ip_address(host):
+            return
+        if error.errno in self.WRONG_ADDRESS_ERRNOS:
+            return self.invalidate(host)
+        failures = self.failures[host] = self.failures.get(host, 0) + 1
+        if failures < self.FAILURES_BEFORE_REFRESH:
+            return
+        del self.failures[host]
+        entry = self.entries.get(host)
+        now = time.monotonic()
+        if entry is not None and entry.address is not None and now < entry.expires:
+            # expiring it keeps the address usable while resolve() looks it up in the background
+            self.entries[host] = entry._replace(expires=now)
+
+    def connect_succeeded(self, host: str):
+        self.failures.pop(host, None)
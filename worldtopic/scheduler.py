@@ -0,0 +1,104 @@
+import asyncio
+import collections
+import contextlib
+import heapq
+import itertools
+import time
+from typing import *
+
+
+class SlotRequest:
+    """A request for a slot whose priority can still be raised while it is queued."""
+
+    __slots__ = ("priority", "scheduler", "future")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.scheduler = None
+        self.future = None
+
+    def raise_priority(self, priority: int):
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        if self.future is not None and not self.future.done():
+            self.scheduler.requeue(self.future, priority)
+
+
+class TopicScheduler:
+    """Outbound request gate of a single server.
+
+    DreamDaemon handles topics one at a time, so at most `max_concurrency` requests are
+    let through at once and whenever a slot frees up it goes to the waiting request with
+    the highest priority (lowest number), oldest first within the same priority.
+    """
+
+    INTERACTIVE = 0
+    COMMAND = 1
+    BACKGROUND = 2
+    PRIORITY_NAMES = {INTERACTIVE: "interactive", COMMAND: "command", BACKGROUND: "background"}
+    WAIT_SAMPLES = 256
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.wait_times = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.WAIT_SAMPLES)
+        )
+        self.total_requests = collections.Counter()
+
+    @property
+    def queue_depth(self) -> int:
+        # requeued requests have more than one entry
+        return len({id(future) for _, _, future in self.waiters if not future.done()})
+
+    def wait_percentile(self, percent: float, priority: Optional[int] = None) -> Optional[float]:
+        if priority is None:
+            samples = sorted(w for ws in self.wait_times.values() for w in ws)
+        else:
+            samples = sorted(self.wait_times.get(priority, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    async def acquire(self, request: SlotRequest):
+        start_time = time.monotonic()
+        if self.active < self.max_concurrency and not self.waiters:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (request.priority, next(self.counter), future))
+            request.scheduler = self
+            request.future = future
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was handed to us right as we got cancelled, pass it on
+                    self.release()
+                raise
+        self.wait_times[request.priority].append(time.monotonic() - start_time)
+        self.total_requests[request.priority] += 1
+
+    def requeue(self, future: asyncio.Future, priority: int):
+        # the old entry stays behind, release() skips it once the future is done
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Union[int, SlotRequest]):
+        """Holds a slot for the duration, pass a `SlotRequest` to be able to raise its priority meanwhile."""
+        await self.acquire(priority if isinstance(priority, SlotRequest) else SlotRequest(priority))
+        try:
+            yield
+        finally:
+            self.release()
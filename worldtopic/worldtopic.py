@@ -1,6 +1,5 @@
 import asyncio
-import urllib
-from collections import OrderedDict
+import urllib.parse
 import struct
 import discord
 from redbot.core import commands, Config, checks
@@ -10,26 +9,270 @@ from typing import *
 import re
 import time
 from redbot.core.utils.chat_formatting import pagify, box
+from .benchmark import (
+    benchmark_frame_reader,
+    format_frame_benchmark,
+    benchmark_params_codec,
+    format_params_benchmark,
+)
+from .params import parse_params, encode_params, indexed_values
+from .loadtest import load_test_world_topic, load_test_goonservers, format_load_results
+from .health import ServerHealth, CircuitOpenError
+from .scheduler import TopicScheduler, SlotRequest
+from .resolver import AddressCache
 
 
 class WorldTopic(commands.Cog):
+    FRAME_HEADER_LENGTH = 4
     RESPONSE_HEADER_LENGTH = 5
     MAGIC_STRING = 0x06
     MAGIC_STRING = 0x06
     MAGIC_FLOAT = 0x2A
     MAGIC_NULL = 0x00
-    MAX_RECEIVE_TRIES = 10
+    DEFAULT_TIMEOUT = 5
+    CircuitOpenError = CircuitOpenError
+    # the frame length field is 16 bits wide, this is the most BYOND can ever send
+    PROTOCOL_MAX_FRAME_SIZE = 0xFFFF
+    # DreamDaemon answers topics one at a time, more connections than this just queue up there
+    MAX_CONCURRENT_PER_SERVER = 2
+    PRIORITY_INTERACTIVE = TopicScheduler.INTERACTIVE
+    PRIORITY_COMMAND = TopicScheduler.COMMAND
+    PRIORITY_BACKGROUND = TopicScheduler.BACKGROUND
+    # topics relaying something a person is waiting on, sent ahead of everything else
+    INTERACTIVE_TOPIC_TYPES = frozenset(["pm", "mentorpm", "asay", "ooc", "help", "mentorhelp"])
+    # read-only topics whose concurrent identical requests can share a single connection
+    COALESCED_TOPIC_TYPES = frozenset(
+        [
+            "status",
+            "admins",
+            "mentors",
+            "health",
+            "rev",
+            "version",
+            "antags",
+            "ailaws",
+            "whois",
+            "getPlayerStats",
+            "persistent_canvases",
+            "lazy_canvas_list",
+            "lazy_canvas_get",
+        ]
+    )
 
     def __init__(self, bot: Red):
         self.bot = bot
+        self.in_flight = {}
+        self.health = {}
+        self.schedulers = {}
+        self.addresses = AddressCache()
+        self.max_frame_size = self.PROTOCOL_MAX_FRAME_SIZE
+        self.config = Config.get_conf(self, identifier=77310564201)
+        self.config.register_global(max_frame_size=self.PROTOCOL_MAX_FRAME_SIZE)
 
-    async def send(self, addr_port: Tuple[str, int], msg: str, timeout: int = 5) -> str:
-        future = self._send(addr_port, msg)
-        return await asyncio.wait_for(future, timeout=timeout)
+    async def init(self):
+        self.max_frame_size = await self.config.max_frame_size()
 
-    async def _send(self, addr_port: Tuple[str, int], msg: str) -> str:
+    def topic_type(self, msg: str) -> Optional[str]:
+        pairs = [pair.partition("=") for pair in msg.lstrip("?").split("&") if pair]
+        for key, _, value in pairs:
+            if key == "type":
+                return urllib.parse.unquote_plus(value)
+        for key, separator, _ in pairs:
+            if not separator:
+                return key
+        return pairs[0][0] if pairs else None
+
+    def coalescing_key(self, addr_port: Tuple[str, int], msg: str):
+        """Key identifying requests that can be merged, `None` for topics that must always be sent."""
+        if self.topic_type(msg) not in self.COALESCED_TOPIC_TYPES:
+            return None
+        normalized = "&".join(sorted(pair for pair in msg.lstrip("?").split("&") if pair))
+        return (addr_port[0], addr_port[1], normalized)
+
+    def health_of(self, addr_port: Tuple[str, int]) -> ServerHealth:
+        health = self.health.get(addr_port)
+        if health is None:
+            health = self.health[addr_port] = ServerHealth()
+        return health
+
+    def scheduler_of(self, addr_port: Tuple[str, int]) -> TopicScheduler:
+        scheduler = self.schedulers.get(addr_port)
+        if scheduler is None:
+            scheduler = self.schedulers[addr_port] = TopicScheduler(
+                self.MAX_CONCURRENT_PER_SERVER
+            )
+        return scheduler
+
+    def default_priority(self, topic_type: Optional[str]) -> int:
+        if topic_type in self.INTERACTIVE_TOPIC_TYPES:
+            return self.PRIORITY_INTERACTIVE
+        return self.PRIORITY_COMMAND
+
+    def circuit_open_error(self, addr_port: Tuple[str, int], health: ServerHealth):
+        return CircuitOpenError(
+            f"{addr_port[0]}:{addr_port[1]} is failing, retrying in {health.retry_in:.0f}s."
+        )
+
+    def is_circuit_open(self, addr_port: Tuple[str, int]) -> bool:
+        health = self.health.get(tuple(addr_port))
+        return health is not None and health.state == health.OPEN and health.retry_in > 0
+
+    def collect_general_api_metrics(self, metrics):
+        latency = metrics.gauge(
+            "worldtopic_latency_seconds", "Recent world topic latency percentiles.", ("server", "quantile")
+        )
+        circuit_open = metrics.gauge(
+            "worldtopic_circuit_open", "Whether topics to a server are currently rejected.", ("server",)
+        )
+        queue_depth = metrics.gauge(
+            "worldtopic_queue_depth", "World topics waiting for a connection slot.", ("server",)
+        )
+        requests = metrics.counter(
+            "worldtopic_requests_total", "World topics sent, by priority lane.", ("server", "priority")
+        )
+        for metric in (latency, circuit_open, queue_depth):
+            metric.clear()
+        for (host, port), health in self.health.items():
+            server = f"{host}:{port}"
+            for quantile in (50, 95):
+                value = health.percentile(quantile)
+                if value is not None:
+                    latency.set(value, server=server, quantile=quantile / 100)
+            circuit_open.set(int(self.is_circuit_open((host, port))), server=server)
+        for (host, port), scheduler in self.schedulers.items():
+            server = f"{host}:{port}"
+            queue_depth.set(scheduler.queue_depth, server=server)
+            for priority, count in scheduler.total_requests.items():
+                requests.set(count, server=server, priority=scheduler.PRIORITY_NAMES[priority])
+        lookups = metrics.counter(
+            "worldtopic_address_cache_lookups_total", "Hostname lookups by address cache result.", ("result",)
+        )
+        lookups.set(self.addresses.hits, result="hit")
+        lookups.set(self.addresses.misses, result="miss")
+
+    async def send(
+        self,
+        addr_port: Tuple[str, int],
+        msg: str,
+        timeout: Optional[float] = None,
+        priority: Optional[int] = None,
+        address: Optional[str] = None,
+    ) -> str:
+        """Sends a topic to a server.
+
+        Without an explicit `timeout` one is derived from the server's recent latency of the
+        same kind of topic, capped at `DEFAULT_TIMEOUT`. Raises `CircuitOpenError` right away
+        if the server has been failing consistently.
+
+        Requests to the same server are queued by `priority` (one of the `PRIORITY_*` constants),
+        by default relayed messages go first and everything else is a command. The timeout only
+        starts counting once the request leaves the queue. Coalesced requests are queued at the
+        highest priority of everyone waiting on them.
+
+        `address` pins the IP address to connect to, otherwise the host is resolved through
+        the address cache.
+        """
+        addr_port = tuple(addr_port)
+        topic_type = self.topic_type(msg)
+        if timeout is None:
+            timeout = self.health_of(addr_port).timeout(topic_type, self.DEFAULT_TIMEOUT)
+        if priority is None:
+            priority = self.default_priority(topic_type)
+        key = self.coalescing_key(addr_port, msg)
+        if key is None:
+            return await self._tracked_send(addr_port, msg, topic_type, timeout, priority, address)
+        task, request = self.in_flight.get(key, (None, None))
+        if task is None:
+            request = SlotRequest(priority)
+            task = asyncio.ensure_future(
+                self._tracked_send(addr_port, msg, topic_type, timeout, request, address)
+            )
+            self.in_flight[key] = (task, request)
+
+            def done_callback(task):
+                if self.in_flight.get(key, (None,))[0] is task:
+                    del self.in_flight[key]
+                if not task.cancelled():
+                    task.exception()  # mark as retrieved even if every waiter gave up
+
+            task.add_done_callback(done_callback)
+        else:
+            # don't leave someone waiting on a request queued behind background polls
+            request.raise_priority(priority)
+        # the request that started the task bounds how long it takes, queueing included
+        return await asyncio.shield(task)
+
+    async def _tracked_send(
+        self,
+        addr_port: Tuple[str, int],
+        msg: str,
+        topic_type: Optional[str],
+        timeout: float,
+        priority: Union[int, SlotRequest],
+        address: Optional[str],
+    ) -> str:
+        health = self.health_of(addr_port)
+        if self.is_circuit_open(addr_port):
+            raise self.circuit_open_error(addr_port, health)
+        async with self.scheduler_of(addr_port).slot(priority):
+            # the breaker may have opened while this request was queued
+            if not health.allow_request():
+                raise self.circuit_open_error(addr_port, health)
+            return await self._timed_send(addr_port, msg, topic_type, timeout, health, address)
+
+    async def _timed_send(
+        self,
+        addr_port: Tuple[str, int],
+        msg: str,
+        topic_type: Optional[str],
+        timeout: float,
+        health: ServerHealth,
+        address: Optional[str],
+    ) -> str:
+        start_time = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._send(addr_port, msg, address), timeout=timeout)
+        except (asyncio.TimeoutError, OSError):
+            health.record_failure()
+            raise
+        except asyncio.CancelledError:
+            health.record_abandoned()
+            raise
+        except Exception:
+            # the server answered, just not with anything we understand
+            health.record_success(topic_type)
+            raise
+        health.record_success(topic_type, time.monotonic() - start_time)
+        return result
+
+    async def _send(
+        self, addr_port: Tuple[str, int], msg: str, address: Optional[str] = None
+    ) -> str:
         addr, port = addr_port
 
+        if address is None:
+            connect_address = await self.addresses.resolve(addr, port)
+        else:
+            connect_address = address
+        try:
+            reader, writer = await asyncio.open_connection(connect_address, port)
+        except OSError as e:
+            if address is None:
+                self.addresses.connect_failed(addr, e)
+            raise
+        if address is None:
+            self.addresses.connect_succeeded(addr)
+        try:
+            writer.write(self.encode_packet(msg))
+            await writer.drain()
+            frame = await self.read_frame(reader)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+        return self.decode_frame(frame)
+
+    def encode_packet(self, msg: str) -> bytes:
         packet = bytearray(b"\x00" * 8)
         if not msg or msg[0] != "?":
             packet += b"?"
@@ -38,77 +281,62 @@ class WorldTopic(commands.Cog):
 
         packet[1] = 0x83
         length = len(packet) - 4
-        length_bytes = length.to_bytes(length=2, byteorder="big")
-        packet[2] = int(length_bytes[0])
-        packet[3] = int(length_bytes[1])
-
-        reader, writer = await asyncio.open_connection(addr, port)
-
-        writer.write(bytes(packet))
-        await writer.drain()
-
-        response = b""
-        target_length = 0
-        failures_left = self.MAX_RECEIVE_TRIES
-        while len(response) < 4 or len(response) < target_length:
-            new_bytes = await reader.read(0xFFFF)
-            if not new_bytes:
-                failures_left -= 1
-                if failures_left < 0:
-                    raise TimeoutError("Maximum receive tries exceeded.")
-            response += new_bytes
-            if not target_length and len(response) >= 4:
-                target_length = int.from_bytes(response[2:4], byteorder="big") + 4
-
-        writer.close()
-        await writer.wait_closed()
-
-        response_type_magic = response[4]
-
-        header_length = self.RESPONSE_HEADER_LENGTH
+        packet[2:4] = length.to_bytes(length=2, byteorder="big")
+        return bytes(packet)
+
+    async def read_frame(self, reader: asyncio.StreamReader) -> memoryview:
+        """Reads one length-prefixed response frame, returns its payload.
+
+        Frames announcing more than `max_frame_size` bytes are refused before their body is read.
+        """
+        try:
+            header = await reader.readexactly(self.FRAME_HEADER_LENGTH)
+        except asyncio.IncompleteReadError:
+            raise TimeoutError("Connection closed before the response header was received.")
+        length = int.from_bytes(header[2:4], byteorder="big")
+        if length > self.max_frame_size:
+            raise ValueError(
+                f"Response frame of {length} bytes exceeds the maximum of {self.max_frame_size} bytes."
+            )
+        try:
+            return memoryview(await reader.readexactly(length))
+        except asyncio.IncompleteReadError:
+            raise TimeoutError("Connection closed before the full response was received.")
+
+    def decode_frame(self, frame: memoryview):
+        if len(frame) == 0:
+            raise ValueError("Empty response frame.")
+        response_type_magic = frame[0]
+
+        offset = self.RESPONSE_HEADER_LENGTH - self.FRAME_HEADER_LENGTH
         if response_type_magic == 0x04:  # no idea
             response_type_magic = self.MAGIC_STRING
-            header_length = 17
+            offset = 17 - self.FRAME_HEADER_LENGTH
 
         if response_type_magic == self.MAGIC_STRING:
-            return response[header_length:].strip(b"\x00").decode("utf8")
+            start, end = offset, len(frame)
+            while start < end and frame[start] == 0:
+                start += 1
+            while end > start and frame[end - 1] == 0:
+                end -= 1
+            return str(frame[start:end], "utf8")
         elif response_type_magic == self.MAGIC_FLOAT:
-            return struct.unpack("f", response[header_length:])[0]
+            return struct.unpack_from("f", frame, offset)[0]
         elif response_type_magic == self.MAGIC_NULL:
             return None
         else:
             raise ValueError(
-                f"Unknown response type {hex(response_type_magic)}. Full hex dump: '{response.hex()}'."
+                f"Unknown response type {hex(response_type_magic)}. Full hex dump: '{frame.hex()}'."
             )
 
-    def params_to_dict(self, params: str):
-        result = OrderedDict()
-        for pair in params.split("&"):
-            key, *rest = pair.split("=")
-            value = urllib.parse.unquote_plus(rest[0]) if rest else None
-            result[key] = value
-        return result
+    def params_to_dict(self, params: str, lazy: bool = False):
+        return parse_params(params, lazy=lazy)
 
     def iterable_to_params(self, iterable):
-        if (
-            isinstance(iterable, str)
-            or isinstance(iterable, int)
-            or isinstance(iterable, float)
-        ):
-            return iterable
-        result_parts = []
-        for key in iterable:
-            value = None
-            if not isinstance(key, int):
-                try:
-                    value = iterable[key]
-                except (KeyError, IndexError, TypeError):
-                    pass
-            part = urllib.parse.quote_plus(str(key))
-            if value is not None:
-                part += "=" + urllib.parse.quote_plus(str(value))
-            result_parts.append(part)
-        return "&".join(result_parts)
+        return encode_params(iterable)
+
+    def indexed_values(self, params, prefix: str, count_key: Optional[str] = None):
+        return indexed_values(params, prefix, count_key)
 
     @commands.command()
     @checks.is_owner()
@@ -143,3 +371,45 @@ class WorldTopic(commands.Cog):
         response_message = f"Time: {elapsed * 1000:.2f}ms\nResponse: {response_message}"
         for page in pagify(response_message):
             await ctx.send(box(page))
+
+    @commands.command()
+    @checks.is_owner()
+    async def set_max_frame_size(self, ctx: commands.Context, size: Optional[int] = None):
+        """Sets the largest world topic response in bytes that is read, leave out the size to allow anything the protocol can carry."""
+        if size is None:
+            size = self.PROTOCOL_MAX_FRAME_SIZE
+        if not 1 <= size <= self.PROTOCOL_MAX_FRAME_SIZE:
+            return await ctx.send(f"Size has to be between 1 and {self.PROTOCOL_MAX_FRAME_SIZE} bytes.")
+        await self.config.max_frame_size.set(size)
+        self.max_frame_size = size
+        await ctx.send(f"World topic responses are limited to {size} bytes.")
+
+    @commands.command()
+    @checks.is_owner()
+    async def benchmark_world_topic(self, ctx: commands.Context, iterations: int = 100):
+        """Compares the framed response reader with the legacy one against a local fake server."""
+        async with ctx.typing():
+            results = await benchmark_frame_reader(self, iterations)
+        await ctx.send(box(format_frame_benchmark(results)))
+
+    @commands.command()
+    @checks.is_owner()
+    async def benchmark_topic_params(self, ctx: commands.Context, iterations: int = 1000):
+        """Compares the params codec with the legacy one on a full 80 player status response."""
+        async with ctx.typing():
+            results = benchmark_params_codec(iterations)
+        await ctx.send(box(format_params_benchmark(results)))
+
+    @commands.command()
+    @checks.is_owner()
+    async def loadtest_world_topic(
+        self, ctx: commands.Context, requests: int = 200, concurrency: int = 16
+    ):
+        """Load tests the world topic stack against local fake servers, reporting throughput and latency."""
+        async with ctx.typing():
+            results = await load_test_world_topic(self, requests, concurrency)
+            goonservers = self.bot.get_cog("GoonServers")
+            if goonservers is not None:
+                results += await load_test_goonservers(goonservers, self, requests, concurrency)
+        for page in pagify(format_load_results(results)):
+            await ctx.send(box(page))